@@ -0,0 +1,59 @@
+"""Completion latency by cursor context in a large build file.
+
+The generated file is analysed, then completion is asked for at the end of statements being typed after it: the
+keyword arguments of a call, the methods of a variable after `.`, and the variables visible at a new statement.
+Reported are the time taken by the workspace to answer and the number of candidates returned, next to the number of
+candidates a context-free completion would offer.
+
+Usage: python benchmarks/completion.py [--lines N] [--repeat N]"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from harness import NullEndpoint
+from positions import generate
+from scenarios import summary
+from mlsp.workspace import Workspace
+
+# The default `completionLimit`
+LIMIT = 50
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lines', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=200)
+    options = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        text = generate(options.lines)
+        (root / 'meson.build').write_text(text)
+        workspace = Workspace(root.as_uri(), NullEndpoint())
+        uri = (root / 'meson.build').as_uri()
+        line = text.count('\n')
+        contexts = dict(
+            kwargs="exe = executable('exe', sources_3, ",
+            method=f"x = lib_{options.lines // 3 * 3 - 2}.",
+            variables='y = sou',
+        )
+        workspace.update(dict(uri=uri, text=text + '\n'.join(contexts.values())))
+        workspace.scheduler.schedule(delay=0)
+        workspace.scheduler.wait()
+        everything = sum(len(index.items) for index in workspace.completion_indexes(uri))
+        print(f"{len(text)} bytes, {options.lines} lines, {everything} candidates without context")
+        print(f"{'context':>10} {'p50 (ms)':>9} {'p99 (ms)':>9} {'candidates':>11}")
+        for offset, (name, typed) in enumerate(contexts.items()):
+            samples = []
+            for _ in range(options.repeat):
+                start = time.perf_counter()
+                result = workspace.complete(uri, line + offset, len(typed), LIMIT)
+                samples.append((time.perf_counter() - start) * 1000)
+            stats = summary(samples)
+            print(f"{name:>10} {stats['p50_ms']:>9.2f} {stats['p99_ms']:>9.2f} {len(result['items']):>11}")
+        workspace.close()
+
+
+if __name__ == '__main__':
+    main()
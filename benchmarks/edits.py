@@ -0,0 +1,48 @@
+"""Throughput of a long typing session replayed through `Document.update`, checked against a plain string model.
+
+Usage: python benchmarks/edits.py [LINE_COUNT] [EDIT_COUNT]"""
+import random
+import sys
+import time
+
+from mlsp.document import Document
+from positions import generate
+
+
+def position(text: str, offset: int):
+    line = text.count('\n', 0, offset)
+    return dict(line=line, character=offset - text.rfind('\n', 0, offset) - 1)
+
+
+def session(text: str, edits: int, rng: random.Random):
+    """Simulates typing: the cursor jumps around now and then, inserts characters and sometimes deletes some."""
+    changes = []
+    cursor = rng.randrange(len(text))
+    for _ in range(edits):
+        if rng.random() < 0.02:
+            cursor = rng.randrange(len(text))
+        if rng.random() < 0.2 and cursor > 0:
+            start, end, insert = cursor - 1, cursor, ''
+        else:
+            start, end, insert = cursor, cursor, rng.choice('abcdefgh_(),\' \n')
+        changes.append(dict(range=dict(start=position(text, start), end=position(text, end)), text=insert))
+        text = text[:start] + insert + text[end:]
+        cursor = start + len(insert)
+    return changes, text
+
+
+def main(line_count: int, edit_count: int):
+    text = generate(line_count)
+    changes, expected = session(text, edit_count, random.Random(0))
+    doc = Document('file:///bench/meson.build', text)
+    start = time.perf_counter()
+    for change in changes:
+        doc.update(change)
+    elapsed = time.perf_counter() - start
+    assert doc.contents == expected, 'document contents diverged from the reference model'
+    print(f"{line_count} lines, {edit_count} edits: {edit_count / elapsed:,.0f} edits/s "
+          f"({elapsed / edit_count * 1e6:.1f} us/edit)")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000, int(sys.argv[2]) if len(sys.argv) > 2 else 20000)
@@ -0,0 +1,74 @@
+"""Disk probing during re-analysis, on a simulated slow mount or on a real one.
+
+Every `os.stat` of a file in the generated tree is delayed by `--latency-ms`, like a round trip to a network
+filesystem or a slow container mount would; `--root` generates the tree in a given directory instead, to measure a real
+one. Re-analysis after an edit of the root build file (a full build) and of a leaf (incremental) is timed with stat
+results kept between builds, as when the client reports file changes, and probed again on every build, as when it does
+not.
+
+Usage: python benchmarks/filesystem.py [--fan-out N] [--latency-ms MS] [--root DIR]"""
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Tuple
+
+from generator import TreeShape, generate
+from harness import NullEndpoint
+from mlsp.workspace import Workspace
+
+REPEAT = 5
+
+
+def slow_stat(root: str, latency: float):
+    stat = os.stat
+
+    def delayed(path, *args, **kwargs):
+        if str(path).startswith(root):
+            time.sleep(latency)
+        return stat(path, *args, **kwargs)
+
+    return delayed
+
+
+def measure(workspace: Workspace, path: Path, text: str) -> Tuple[float, float]:
+    """Returns the fastest re-analysis after an edit of `path`, in milliseconds, and the files probed per build."""
+    uri = path.as_uri()
+    timings = []
+    stats = workspace.fs.stats
+    for n in range(REPEAT):
+        edited = f"{text}# edit {n}\n"
+        workspace.update(dict(uri=uri, text=edited), dict(text=edited))
+        start = time.perf_counter()
+        workspace.build_ast()
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000, (workspace.fs.stats - stats) / REPEAT
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--fan-out', type=int, default=200)
+    parser.add_argument('--latency-ms', type=float, default=1., help='Delay added to every stat of a build file')
+    parser.add_argument('--root', type=Path, help='Directory to generate the tree in, on the filesystem to measure')
+    options = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=options.root) as tmp:
+        root = Path(tmp)
+        files = generate(root, TreeShape(depth=1, fan_out=options.fan_out, file_size=0))
+        if options.latency_ms:
+            os.stat = slow_stat(tmp, options.latency_ms / 1000)
+        print(f"{len(files)} build files, {options.latency_ms} ms per stat")
+        print(f"{'stat results':>13} {'full (ms)':>10} {'stats':>6} {'incremental (ms)':>17} {'stats':>6}")
+        for watched in (False, True):
+            workspace = Workspace(root.as_uri(), NullEndpoint(), watch_files=watched)
+            workspace.scheduler.wait()
+            full, full_stats = measure(workspace, files[0], files[0].read_text())
+            incremental, incremental_stats = measure(workspace, files[1], files[1].read_text())
+            workspace.close()
+            print(f"{'kept' if watched else 'per build':>13} {full:>10.1f} {full_stats:>6.0f} {incremental:>17.1f} "
+                  f"{incremental_stats:>6.0f}")
+
+
+if __name__ == '__main__':
+    main()
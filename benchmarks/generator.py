@@ -0,0 +1,89 @@
+"""Synthetic Meson trees for the benchmarks.
+
+Usage: python benchmarks/generator.py DIRECTORY [--depth N] [--fan-out N] [--file-size BYTES] [--variables N]
+                                                [--subprojects N]"""
+import argparse
+from pathlib import Path
+from typing import List, NamedTuple
+
+
+class TreeShape(NamedTuple):
+    depth: int = 2
+    fan_out: int = 4
+    file_size: int = 2000
+    variables: int = 20
+    subprojects: int = 0
+
+
+def build_file(name: str, shape: TreeShape, children: List[str], project: bool = False) -> str:
+    """Text of one build file: `variables` assignments reading each other, `subdir()` calls for the children, then
+    appends to the first variable until the file is about `file_size` bytes long."""
+    body = [f"project('{name}', 'c')"] if project else []
+    for j in range(shape.variables):
+        if j % 3 == 2:
+            body.append(f"{name}_{j} = static_library('{name}{j}', {name}_{j - 1})")
+        elif j % 3 == 1:
+            body.append(f"{name}_{j} = files('a{j}.c', 'b{j}.c') + {name}_{j - 1}")
+        else:
+            body.append(f"{name}_{j} = ['src{j}.c', 'src{j}.h']  # sources {j}")
+    body.extend(f"subdir('{child}')" for child in children)
+    if shape.variables:
+        size = sum(len(line) + 1 for line in body)
+        k = 0
+        while size < shape.file_size:
+            line = f"{name}_0 += ['extra{k}.c']"
+            body.append(line)
+            size += len(line) + 1
+            k += 1
+    return '\n'.join(body) + '\n'
+
+
+def _generate_dir(directory: Path, name: str, shape: TreeShape, depth: int, files: List[Path], project: bool = False):
+    children = [f'{name}_{i}' for i in range(shape.fan_out)] if depth > 0 else []
+    path = directory / 'meson.build'
+    path.write_text(build_file(name, shape, children, project))
+    files.append(path)
+    for child in children:
+        (directory / child).mkdir()
+        _generate_dir(directory / child, child, shape, depth - 1, files)
+
+
+def generate(root: Path, shape: TreeShape = TreeShape()) -> List[Path]:
+    """Writes a project of `fan_out ** depth`-ish build files under `root`; returns them in evaluation order.
+
+    Subprojects get the same shape one level shallower and are called from the end of the root build file."""
+    files = []
+    _generate_dir(root, 'root', shape, shape.depth, files, project=True)
+    if shape.subprojects:
+        calls = [f"sp{k}_dep = subproject('sp{k}')" for k in range(shape.subprojects)]
+        with open(root / 'meson.build', 'a') as f:
+            f.write('\n'.join(calls) + '\n')
+        for k in range(shape.subprojects):
+            directory = root / 'subprojects' / f'sp{k}'
+            directory.mkdir(parents=True)
+            _generate_dir(directory, f'sp{k}', shape._replace(depth=max(shape.depth - 1, 0)), shape.depth - 1, files,
+                          project=True)
+    return files
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    defaults = TreeShape()
+    parser.add_argument('--depth', type=int, default=defaults.depth, help='Levels of nested subdirs')
+    parser.add_argument('--fan-out', type=int, default=defaults.fan_out, help='Subdirs per build file')
+    parser.add_argument('--file-size', type=int, default=defaults.file_size, help='Approximate bytes per build file')
+    parser.add_argument('--variables', type=int, default=defaults.variables, help='Variables assigned per build file')
+    parser.add_argument('--subprojects', type=int, default=defaults.subprojects, help='Number of subprojects')
+
+
+def shape_from(namespace: argparse.Namespace) -> TreeShape:
+    return TreeShape(namespace.depth, namespace.fan_out, namespace.file_size, namespace.variables,
+                     namespace.subprojects)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('directory', type=Path)
+    add_arguments(parser)
+    namespace = parser.parse_args()
+    namespace.directory.mkdir(parents=True, exist_ok=True)
+    print(f"{len(generate(namespace.directory, shape_from(namespace)))} build files written")
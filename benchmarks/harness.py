@@ -0,0 +1,81 @@
+"""Drives `MesonLanguageServer` in-process through OS pipes, the same way an editor talks to it over stdio."""
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+from pyls_jsonrpc.streams import JsonRpcStreamReader, JsonRpcStreamWriter
+
+from mlsp.server import MesonLanguageServer
+
+
+class NullEndpoint:
+    def notify(self, method, params=None):
+        pass
+
+
+class Client:
+    """A JSON-RPC client connected to a server running on a background thread.
+
+    Requests are answered on the server's reader thread, so `request` measures the full round trip: serialization,
+    dispatch, the handler and the response."""
+    notifications: List[dict]
+
+    def __init__(self):
+        server_rx, client_tx = os.pipe()
+        client_rx, server_tx = os.pipe()
+        self.server = MesonLanguageServer(os.fdopen(server_rx, 'rb'), os.fdopen(server_tx, 'wb'))
+        self.writer = JsonRpcStreamWriter(os.fdopen(client_tx, 'wb'))
+        self.reader = JsonRpcStreamReader(os.fdopen(client_rx, 'rb'))
+        self.notifications = []
+        self._responses: Dict[int, dict] = dict()
+        self._received = threading.Condition()
+        self._next_id = 0
+        self._server_thread = threading.Thread(target=self.server.start, name='server', daemon=True)
+        self._server_thread.start()
+        self._reader_thread = threading.Thread(target=self.reader.listen, args=(self._consume,), name='client',
+                                               daemon=True)
+        self._reader_thread.start()
+
+    def request(self, method: str, params: Optional[dict] = None, timeout: float = 60) -> dict:
+        self._next_id += 1
+        request_id = self._next_id
+        self.writer.write(dict(jsonrpc='2.0', id=request_id, method=method, params=params or {}))
+        with self._received:
+            if not self._received.wait_for(lambda: request_id in self._responses, timeout):
+                raise TimeoutError(f'No response to {method}')
+            response = self._responses.pop(request_id)
+        if 'error' in response:
+            raise RuntimeError(f"{method} failed: {response['error']}")
+        return response.get('result')
+
+    def timed_request(self, method: str, params: Optional[dict] = None) -> float:
+        """Sends a request and returns its round trip time in milliseconds."""
+        start = time.perf_counter()
+        self.request(method, params)
+        return (time.perf_counter() - start) * 1000
+
+    def notify(self, method: str, params: Optional[dict] = None):
+        self.writer.write(dict(jsonrpc='2.0', method=method, params=params or {}))
+
+    def wait_for_analysis(self, timeout: float = 600) -> float:
+        """Waits until every scheduled build has finished; returns the time waited in milliseconds."""
+        start = time.perf_counter()
+        # Messages are handled in order, so once this is answered every notification sent before has been handled
+        self.request('$/mesonls/stats')
+        self.server.workspace.scheduler.wait(timeout)
+        return (time.perf_counter() - start) * 1000
+
+    def close(self):
+        self.request('shutdown')
+        self.notify('exit')
+        self.writer.close()
+        self._server_thread.join(5)
+
+    def _consume(self, message: dict):
+        if 'id' in message and 'method' not in message:
+            with self._received:
+                self._responses[message['id']] = message
+                self._received.notify_all()
+        else:
+            self.notifications.append(message)
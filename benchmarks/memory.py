@@ -0,0 +1,100 @@
+"""Memory retained by a workspace once its first build has finished, per build file.
+
+The total is measured with `tracemalloc`, from before the workspace is created to after the build and the completion
+index, with the collector run in between. It is then split by what keeps it alive: each object reachable from the
+workspace is counted once, for the first of the components below that reaches it.
+
+Usage: python benchmarks/memory.py [FAN_OUT...] [--depth N] [--open N]"""
+import argparse
+import gc
+import sys
+import tempfile
+import tracemalloc
+import types
+from pathlib import Path
+
+from generator import TreeShape, generate
+from harness import NullEndpoint
+from mlsp.workspace import Workspace
+
+VARIABLES_PER_FILE = 20
+FILE_SIZE = 2000
+# Shared by every workspace, so not part of what one of them retains
+SKIPPED = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType)
+
+
+def components(workspace: Workspace) -> dict:
+    snapshot = workspace.snapshot
+    return dict(
+        trees=snapshot.files,
+        parse_cache=workspace.parse_cache,
+        index=workspace.index,
+        interpreter=snapshot.interpreter,
+        graph=snapshot.graph,
+        symbols=snapshot.symbols,
+        completions=workspace._completions,
+        documents=(workspace.documents, workspace.texts),
+    )
+
+
+def retained_by(roots: dict, exclude: object) -> dict:
+    """Bytes of the objects reachable from each root and not from an earlier one."""
+    seen = {id(exclude), id(roots)}
+    sizes = dict()
+    for name, root in roots.items():
+        size = 0
+        stack = [root]
+        while stack:
+            obj = stack.pop()
+            if id(obj) in seen or isinstance(obj, SKIPPED):
+                continue
+            seen.add(id(obj))
+            size += sys.getsizeof(obj)
+            stack.extend(gc.get_referents(obj))
+        sizes[name] = size
+    return sizes
+
+
+def measure(shape: TreeShape, open_files: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        files = generate(root, shape)
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        workspace = Workspace(root.as_uri(), NullEndpoint())
+        for path in files[:open_files]:
+            workspace.update(dict(uri=path.as_uri(), text=path.read_text()))
+        workspace.scheduler.schedule(delay=0)
+        workspace.scheduler.wait()
+        workspace.completion_indexes()
+        workspace.close()
+        gc.collect()
+        total = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        report = dict(files=len(files), total=total, breakdown=retained_by(components(workspace), workspace))
+        del workspace
+        return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('fan_out', type=int, nargs='*', default=[10, 50, 200])
+    parser.add_argument('--depth', type=int, default=1)
+    parser.add_argument('--open', type=int, default=1, help='Number of build files open in the editor')
+    options = parser.parse_args()
+
+    names = None
+    for fan_out in options.fan_out:
+        shape = TreeShape(depth=options.depth, fan_out=fan_out, file_size=FILE_SIZE, variables=VARIABLES_PER_FILE)
+        report = measure(shape, options.open)
+        if names is None:
+            names = list(report['breakdown'])
+            print(f"{'files':>6} {'bytes/file':>11} " + ' '.join(f'{name:>12}' for name in names))
+        count = report['files']
+        print(f"{count:>6} {report['total'] // count:>11} " +
+              ' '.join(f"{report['breakdown'][name] // count:>12}" for name in names))
+
+
+if __name__ == '__main__':
+    main()
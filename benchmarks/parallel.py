@@ -0,0 +1,37 @@
+"""Cold analysis time of a synthetic tree with thousands of subdirs, against the number of parser processes.
+
+Usage: python benchmarks/parallel.py [FAN_OUT] [DEPTH]"""
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from generator import TreeShape, generate
+from harness import NullEndpoint
+from mlsp.workspace import Workspace
+
+VARIABLES_PER_FILE = 60
+
+
+def main(fan_out: int, depth: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        files = generate(root, TreeShape(depth=depth, fan_out=fan_out, file_size=0, variables=VARIABLES_PER_FILE))
+        print(f"{len(files)} build files, {os.cpu_count()} cores")
+        print(f"{'jobs':>5} {'cold build (s)':>15} {'speedup':>8}")
+        baseline = None
+        jobs = 1
+        while jobs <= max(os.cpu_count() or 1, 1) * 2:
+            workspace = Workspace(root.as_uri(), NullEndpoint(), jobs=jobs)
+            start = time.perf_counter()
+            workspace.scheduler.wait()
+            elapsed = time.perf_counter() - start
+            workspace.parser.shutdown()
+            baseline = baseline or elapsed
+            print(f"{jobs:>5} {elapsed:>15.2f} {baseline / elapsed:>7.1f}x")
+            jobs *= 2
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 12, int(sys.argv[2]) if len(sys.argv) > 2 else 3)
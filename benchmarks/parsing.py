@@ -0,0 +1,67 @@
+"""Parsing cost per keystroke while typing in a large build file, and what survives buffers that do not parse.
+
+A typing session is replayed and the buffer parsed after every keystroke, from scratch with Meson's parser and
+incrementally with the statement runs of `IncrementalParser`. For buffers that do not parse, Meson's parser loses
+every variable of the file, while the recovering parser keeps the ones outside the broken statement.
+
+Usage: python benchmarks/parsing.py [--file-size BYTES] [--edits N] [--seed N]"""
+import argparse
+import random
+import time
+
+from mesonbuild import mesonlib, mparser
+
+from edits import session
+from generator import TreeShape, build_file
+from mlsp.document import Document
+from mlsp.parser import IncrementalParser, errors
+from mlsp.visitors import NamesVisitor
+from scenarios import summary
+
+
+def defined(codeblock: mparser.CodeBlockNode) -> set:
+    visitor = NamesVisitor()
+    codeblock.accept(visitor)
+    return visitor.defined
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--file-size', type=int, default=20000)
+    parser.add_argument('--edits', type=int, default=300)
+    parser.add_argument('--seed', type=int, default=0)
+    options = parser.parse_args()
+
+    text = build_file('root', TreeShape(file_size=options.file_size, variables=40), ['a', 'b'], project=True)
+    variables = len(defined(mparser.Parser(text, '').parse()))
+    document = Document('file:///meson.build', text)
+    incremental = IncrementalParser('/meson.build', '')
+    incremental.parse(text)
+    full, partial, broken, kept = [], [], 0, 0
+    changes, _ = session(text, options.edits, random.Random(options.seed))
+    for change in changes:
+        document.update(change)
+        code = document.contents
+        start = time.perf_counter()
+        try:
+            mparser.Parser(code, '').parse()
+        except mesonlib.MesonException:
+            broken += 1
+        full.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        codeblock = incremental.parse(code)
+        partial.append((time.perf_counter() - start) * 1000)
+        if errors(codeblock):
+            kept += len(defined(codeblock))
+    print(f"{len(text)} bytes, {text.count(chr(10))} lines, {variables} variables, {options.edits} keystrokes")
+    print(f"{'parser':>12} {'p50 (ms)':>9} {'p99 (ms)':>9}")
+    for name, samples in (('from scratch', full), ('incremental', partial)):
+        stats = summary(samples)
+        print(f"{name:>12} {stats['p50_ms']:>9.2f} {stats['p99_ms']:>9.2f}")
+    if broken:
+        print(f"{broken} buffers did not parse; variables kept in them: 0 from scratch, "
+              f"{kept / broken:.0f} incrementally")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""Micro-benchmarks for position mapping and edits on a large generated build file.
+
+Usage: python benchmarks/positions.py [LINE_COUNT]"""
+import random
+import sys
+import timeit
+
+from mlsp.document import Document
+
+ITERATIONS = 10000
+
+
+def generate(lines: int) -> str:
+    body = ["project('bench', 'c')"]
+    for i in range(1, lines):
+        if i % 3 == 0:
+            body.append(f"sources_{i} = files('src/file_{i}.c', 'src/file_{i}.h')  # généré")
+        elif i % 3 == 1:
+            body.append(f"lib_{i} = static_library('lib{i}', sources_{i - 1}, install: true)")
+        else:
+            body.append(f"deps_{i} = [dependency('dep{i}'), declare_dependency(link_with: lib_{i - 1})]")
+    return '\n'.join(body) + '\n'
+
+
+def report(name: str, seconds: float):
+    print(f"{name:<28} {seconds / ITERATIONS * 1e6:>9.2f} us/op")
+
+
+def main(line_count: int):
+    doc = Document('file:///bench/meson.build', generate(line_count))
+    rng = random.Random(0)
+    size = len(doc.contents)
+    offsets = [rng.randrange(size) for _ in range(ITERATIONS)]
+    positions = [doc.get_char_count_position(o) for o in offsets]
+    print(f"{line_count} lines, {size} characters")
+
+    it = iter(offsets)
+    report('offset -> position', timeit.timeit(lambda: doc.get_char_count_position(next(it)), number=ITERATIONS))
+    it = iter(positions)
+    report('position -> offset', timeit.timeit(lambda: doc.get_position_character_count(*next(it)), number=ITERATIONS))
+    it = iter(positions)
+    report('word at position', timeit.timeit(lambda: doc.get_word_at_position(*next(it)), number=ITERATIONS))
+    it = iter(offsets)
+
+    def edit():
+        offset = min(next(it), len(doc.rope) - 1)
+        doc.update_range(offset, offset + 1, '\n')
+
+    report('replace character', timeit.timeit(edit, number=ITERATIONS))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
@@ -0,0 +1,50 @@
+"""Re-analysis latency after a single-file edit, as a function of the number of subdirs.
+
+Columns: a full build with empty caches, a full build reusing cached trees, and the incremental build that only
+evaluates the edited file and its dependents.
+
+Usage: python benchmarks/reanalysis.py [SUBDIR_COUNT...]"""
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from generator import TreeShape, generate
+from harness import NullEndpoint
+from mlsp.workspace import Workspace
+
+VARIABLES_PER_FILE = 20
+REPEAT = 5
+
+
+def measure(workspace: Workspace, leaf_uri: str, cold: bool = False, full: bool = False) -> float:
+    timings = []
+    for n in range(REPEAT):
+        workspace.update(dict(uri=leaf_uri), dict(text=f"edited = {n}\n"))
+        if cold:
+            workspace.parse_cache.invalidate()
+            workspace.index.entries.clear()
+        start = time.perf_counter()
+        workspace.build_ast(full=cold or full)
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+
+def main(counts):
+    print(f"{'subdirs':>8} {'cold (ms)':>10} {'full (ms)':>10} {'incremental (ms)':>17} {'speedup':>8}")
+    for count in counts:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            files = generate(root, TreeShape(depth=1, fan_out=count, file_size=0, variables=VARIABLES_PER_FILE))
+            workspace = Workspace(root.as_uri(), NullEndpoint())
+            workspace.scheduler.wait()
+            leaf_uri = files[1].as_uri()
+            workspace.update(dict(uri=leaf_uri, text="edited = 0\n"))
+            cold = measure(workspace, leaf_uri, cold=True)
+            full = measure(workspace, leaf_uri, full=True)
+            incremental = measure(workspace, leaf_uri)
+            print(f"{count:>8} {cold:>10.1f} {full:>10.1f} {incremental:>17.1f} {cold / incremental:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [10, 50, 100, 200, 400])
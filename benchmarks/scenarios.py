@@ -0,0 +1,182 @@
+"""End-to-end latency of the language server on a synthetic tree, driven over JSON-RPC.
+
+Scenarios: cold initialize (until the first analysis finished), didOpen (until re-analysed), typing bursts
+(completion after every keystroke, then the time for analysis to settle), then completion, hover, definition and
+references at random positions.
+Results are printed as one JSON document with p50/p99 latencies in milliseconds and peak RSS, so runs can be diffed.
+It also counts the analyses run per didOpen and per typing burst, and per didSave and edit that leave the text as it
+was, which should not run any.
+
+Usage: python benchmarks/scenarios.py [--depth N] [--fan-out N] [--file-size BYTES] [--variables N] [--subprojects N]
+                                      [--repeat N] [--output FILE]"""
+import argparse
+import json
+import logging
+import math
+import platform
+import random
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from generator import add_arguments, generate, shape_from
+from harness import Client
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[max(math.ceil(fraction * len(ordered)) - 1, 0)]
+
+
+def summary(samples: List[float]) -> dict:
+    """Latency percentiles, along with the peak RSS of the process so far."""
+    return dict(count=len(samples), p50_ms=percentile(samples, .5), p99_ms=percentile(samples, .99),
+                mean_ms=sum(samples) / len(samples), max_ms=max(samples), peak_rss_kb=peak_rss_kb())
+
+
+def peak_rss_kb() -> int:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+
+def position(text: str, offset: int) -> dict:
+    line = text.count('\n', 0, offset)
+    return dict(line=line, character=offset - text.rfind('\n', 0, offset) - 1)
+
+
+def initialize(root: Path, cache: Path, options: argparse.Namespace) -> Tuple[Client, float]:
+    client = Client()
+    start = time.perf_counter()
+    client.request('initialize', dict(rootUri=root.as_uri(), capabilities={}, initializationOptions=dict(
+        analysisDebounce=options.debounce, cacheDirectory=str(cache), jobs=options.jobs)))
+    client.notify('initialized')
+    client.wait_for_analysis()
+    return client, (time.perf_counter() - start) * 1000
+
+
+def builds(client: Client) -> int:
+    return client.server.workspace.snapshot.generation
+
+
+def run(root: Path, files: List[Path], options: argparse.Namespace) -> Dict[str, dict]:
+    rng = random.Random(options.seed)
+    results = dict()
+    counts = dict()
+
+    samples = []
+    for _ in range(options.repeat):
+        with tempfile.TemporaryDirectory() as cache:
+            client, elapsed = initialize(root, Path(cache), options)
+            samples.append(elapsed)
+            client.close()
+    results['initialize'] = summary(samples)
+
+    with tempfile.TemporaryDirectory() as cache:
+        client, _ = initialize(root, Path(cache), options)
+        texts = dict()
+        samples = []
+        before = builds(client)
+        for path in rng.sample(files, min(options.repeat, len(files))):
+            texts[path] = path.read_text()
+            start = time.perf_counter()
+            client.notify('textDocument/didOpen', dict(textDocument=dict(
+                uri=path.as_uri(), languageId='meson', version=1, text=texts[path])))
+            client.wait_for_analysis()
+            samples.append((time.perf_counter() - start) * 1000)
+        results['did_open'] = summary(samples)
+        counts['did_open'] = (builds(client) - before) / len(samples)
+
+        keystrokes, settle = [], []
+        before = builds(client)
+        for burst, path in enumerate(rng.choice(list(texts)) for _ in range(options.repeat)):
+            uri = path.as_uri()
+            text = texts[path]
+            version = 1 + burst * 100
+            offset = len(text)
+            for char in f"typed_{burst} = ":
+                version += 1
+                change = dict(range=dict(start=position(text, offset), end=position(text, offset)), text=char)
+                start = time.perf_counter()
+                client.notify('textDocument/didChange', dict(textDocument=dict(uri=uri, version=version),
+                                                             contentChanges=[change]))
+                text = text[:offset] + char + text[offset:]
+                offset += 1
+                client.request('textDocument/completion', dict(textDocument=dict(uri=uri),
+                                                               position=position(text, offset)))
+                keystrokes.append((time.perf_counter() - start) * 1000)
+            settle.append(client.wait_for_analysis())
+            texts[path] = text
+        results['typing'] = dict(keystroke=summary(keystrokes), settle=summary(settle))
+        counts['typing_burst'] = (builds(client) - before) / len(settle)
+
+        # Saving writes the buffers to the disk, after which the server reads them again: nothing changed
+        before = builds(client)
+        for path, text in texts.items():
+            path.write_text(text)
+            client.notify('textDocument/didSave', dict(textDocument=dict(uri=path.as_uri())))
+        client.wait_for_analysis()
+        counts['unchanged_save'] = (builds(client) - before) / len(texts)
+
+        # Typing a character and deleting it again gives the text the last analysis read; the typing bursts left the
+        # buffers with an assignment still missing its value, which cannot be evaluated
+        before = builds(client)
+        for path, text in texts.items():
+            uri = path.as_uri()
+            end = position(text, len(text))
+            after = dict(line=end['line'], character=end['character'] + 1)
+            client.notify('textDocument/didChange', dict(textDocument=dict(uri=uri), contentChanges=[
+                dict(range=dict(start=end, end=end), text='x'), dict(range=dict(start=end, end=after), text='')]))
+        client.wait_for_analysis()
+        counts['no_op_edit'] = (builds(client) - before) / len(texts)
+        results['builds'] = counts
+
+        for method, name in (('textDocument/completion', 'completion'), ('textDocument/hover', 'hover'),
+                             ('textDocument/definition', 'definition'), ('textDocument/references', 'references')):
+            samples = []
+            for _ in range(options.repeat * 20):
+                path = rng.choice(list(texts))
+                text = texts[path]
+                samples.append(client.timed_request(method, dict(textDocument=dict(uri=path.as_uri()),
+                                                                 position=position(text, rng.randrange(len(text))))))
+            results[name] = summary(samples)
+        client.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_arguments(parser)
+    parser.add_argument('--repeat', type=int, default=5, help='Samples per scenario (x20 for completion and hover)')
+    parser.add_argument('--debounce', type=int, default=200, help='analysisDebounce, in milliseconds')
+    parser.add_argument('--jobs', type=int, default=1, help='Parser processes')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', type=Path, help='Write the report to this file instead of stdout')
+    options = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    shape = shape_from(options)
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        files = generate(root, shape)
+        results = run(root, files, options)
+    report = dict(
+        shape=shape._asdict(),
+        build_files=len(files),
+        options=dict(repeat=options.repeat, debounce=options.debounce, jobs=options.jobs, seed=options.seed),
+        python=platform.python_version(),
+        platform=platform.platform(),
+        scenarios=results,
+        peak_rss_kb=peak_rss_kb()
+    )
+    text = json.dumps(report, indent=2)
+    if options.output:
+        options.output.write_text(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
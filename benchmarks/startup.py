@@ -0,0 +1,111 @@
+"""Startup cost of the server process, as paid every time an editor spawns it.
+
+Measures the time to start the interpreter and to import `mlsp`, then the time from spawning `python -m mlsp` to the
+`initialize` response and to the first completion response, which needs the analysis modules. Prints one JSON document with p50/p99 in milliseconds.
+
+Usage: python benchmarks/startup.py [--repeat N] [--output FILE]"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Tuple
+
+from generator import TreeShape, generate
+from scenarios import summary
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def message(request_id: int, method: str, params: dict) -> bytes:
+    body = json.dumps(dict(jsonrpc='2.0', id=request_id, method=method, params=params)).encode()
+    return b'Content-Length: %d\r\n\r\n' % len(body) + body
+
+
+def read_response(stream, request_id: int) -> dict:
+    while True:
+        length = None
+        while True:
+            line = stream.readline()
+            if not line:
+                raise EOFError('Server exited')
+            if line in (b'\r\n', b'\n'):
+                break
+            if line.lower().startswith(b'content-length:'):
+                length = int(line.split(b':')[1])
+        response = json.loads(stream.read(length))
+        if response.get('id') == request_id:
+            return response
+
+
+def environment() -> dict:
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [str(ROOT), env.get('PYTHONPATH')]))
+    return env
+
+
+def run_time(code: str) -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-c', code], check=True, env=environment())
+    return (time.perf_counter() - start) * 1000
+
+
+def session(root: Path, cache: Path) -> Tuple[float, float]:
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, '-m', 'mlsp'], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                               stderr=subprocess.DEVNULL, env=environment())
+    try:
+        process.stdin.write(message(1, 'initialize', dict(
+            rootUri=root.as_uri(), capabilities={}, initializationOptions=dict(cacheDirectory=str(cache), jobs=1))))
+        process.stdin.flush()
+        read_response(process.stdout, 1)
+        initialized = (time.perf_counter() - start) * 1000
+        process.stdin.write(message(2, 'textDocument/completion', dict(
+            textDocument=dict(uri=(root / 'meson.build').as_uri()), position=dict(line=0, character=0))))
+        process.stdin.flush()
+        read_response(process.stdout, 2)
+        completed = (time.perf_counter() - start) * 1000
+    finally:
+        process.kill()
+        process.wait()
+    return initialized, completed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--output', type=Path, help='Write the report to this file instead of stdout')
+    options = parser.parse_args()
+
+    interpreter, imports, initialize, completion = [], [], [], []
+    with tempfile.TemporaryDirectory() as tmp, tempfile.TemporaryDirectory() as cache:
+        root = Path(tmp)
+        generate(root, TreeShape(depth=1))
+        for _ in range(options.repeat):
+            interpreter.append(run_time('pass'))
+            imports.append(run_time('import mlsp'))
+            initialized, completed = session(root, Path(cache))
+            initialize.append(initialized)
+            completion.append(completed)
+    report = dict(
+        repeat=options.repeat,
+        python=sys.version.split()[0],
+        scenarios=dict(
+            python_startup=summary(interpreter),
+            import_mlsp=summary(imports),
+            initialize=summary(initialize),
+            first_completion=summary(completion)
+        )
+    )
+    text = json.dumps(report, indent=2)
+    if options.output:
+        options.output.write_text(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""Time to first results on a cold start, in a tree with subprojects vendored under `subprojects/`.
+
+Measures, from the creation of the workspace, how long it takes for symbols of the project to be available, with
+partial results streamed as subtrees of the root build file are evaluated and with them held back until the analysis
+has gone through, then how long it takes to analyse a subproject once one of its files is opened.
+
+Usage: python benchmarks/subprojects.py [--fan-out N] [--depth N] [--subprojects N]"""
+import argparse
+import math
+import tempfile
+import time
+from pathlib import Path
+
+from generator import TreeShape, generate
+from harness import NullEndpoint
+import mlsp.workspace
+from mlsp.workspace import Workspace
+
+
+def wait_for(condition, timeout: float = 120.) -> float:
+    start = time.perf_counter()
+    while not condition():
+        if time.perf_counter() - start > timeout:
+            raise TimeoutError()
+        time.sleep(0.001)
+    return time.perf_counter()
+
+
+def measure(root: Path, stream: bool) -> dict:
+    mlsp.workspace.STREAM_INTERVAL = 0.1 if stream else math.inf
+    with tempfile.TemporaryDirectory() as cache:
+        start = time.perf_counter()
+        workspace = Workspace(root.as_uri(), NullEndpoint(), cache_dir=Path(cache))
+        first = wait_for(lambda: workspace.snapshot.symbols.definitions)
+        done = wait_for(lambda: workspace.snapshot.generation)
+        files = len(workspace.snapshot.files)
+        path = root / 'subprojects' / 'sp0' / 'meson.build'
+        opened = time.perf_counter()
+        workspace.update(dict(uri=path.as_uri(), text=path.read_text()))
+        workspace.scheduler.schedule(delay=0)
+        loaded = wait_for(lambda: 'sp0' in workspace.snapshot.subprojects)
+        workspace.scheduler.wait()
+        workspace.close()
+    return dict(files=files, first=(first - start) * 1000, done=(done - start) * 1000,
+                subproject=(loaded - opened) * 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--fan-out', type=int, default=20)
+    parser.add_argument('--depth', type=int, default=2)
+    parser.add_argument('--subprojects', type=int, default=4)
+    options = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        shape = TreeShape(depth=options.depth, fan_out=options.fan_out, subprojects=options.subprojects)
+        total = len(generate(root, shape))
+        print(f"{total} build files, {options.subprojects} subprojects")
+        print(f"{'results':>10} {'project files':>14} {'first (ms)':>11} {'complete (ms)':>14} {'subproject (ms)':>16}")
+        for stream in (False, True):
+            report = measure(root, stream)
+            print(f"{'streamed' if stream else 'at the end':>10} {report['files']:>14} {report['first']:>11.0f} "
+                  f"{report['done']:>14.0f} {report['subproject']:>16.0f}")
+
+
+if __name__ == '__main__':
+    main()
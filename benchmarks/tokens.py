@@ -0,0 +1,61 @@
+"""Semantic tokens and folding ranges of a large build file, while typing in it.
+
+The file is lexed once from scratch, then a typing session is replayed; after every keystroke the tokens are brought
+up to date and sent as a delta against the previous result, and folding ranges are computed. Reported are the time
+taken and the size of the responses once encoded, next to the size of a full response.
+
+Usage: python benchmarks/tokens.py [--lines N] [--edits N] [--seed N]"""
+import argparse
+import json
+import random
+import time
+
+from edits import session
+from positions import generate
+from scenarios import summary
+from mlsp.document import Document
+from mlsp.tokens import DocumentTokens
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lines', type=int, default=20000)
+    parser.add_argument('--edits', type=int, default=300)
+    parser.add_argument('--seed', type=int, default=0)
+    options = parser.parse_args()
+
+    text = generate(options.lines)
+    document = Document('file:///meson.build', text)
+    tokens = DocumentTokens()
+    start = time.perf_counter()
+    tokens.update(document.contents, document.version)
+    full = tokens.full()
+    cold = (time.perf_counter() - start) * 1000
+    full_size = len(json.dumps(full))
+    print(f"{len(text)} bytes, {options.lines} lines, {len(full['data']) // 5} tokens")
+    print(f"from scratch: {cold:.1f} ms, {full_size} bytes")
+
+    changes, _ = session(text, options.edits, random.Random(options.seed))
+    delta, folding, sizes = [], [], []
+    result_id = full['resultId']
+    for change in changes:
+        document.update(change)
+        start = time.perf_counter()
+        tokens.update(document.contents, document.version)
+        response = tokens.delta(result_id)
+        delta.append((time.perf_counter() - start) * 1000)
+        result_id = response['resultId']
+        sizes.append(len(json.dumps(response)))
+        start = time.perf_counter()
+        tokens.folding_ranges()
+        folding.append((time.perf_counter() - start) * 1000)
+    print(f"{'per keystroke':>14} {'p50 (ms)':>9} {'p99 (ms)':>9}")
+    for name, samples in (('delta', delta), ('folding', folding)):
+        stats = summary(samples)
+        print(f"{name:>14} {stats['p50_ms']:>9.2f} {stats['p99_ms']:>9.2f}")
+    sizes.sort()
+    print(f"delta size: {sizes[len(sizes) // 2]} bytes median, {sizes[-1]} bytes max")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,38 +1,89 @@
 import argparse
+import json
 import logging
 import sys
+from contextlib import contextmanager
 from logging import Formatter
 
-from mlsp.log_handler import LanguageServerLoggingHandler
-from mlsp.server import new_with_stdio
+from mlsp.stats import STATS
 
 
 def setup_arguments():
     parser = argparse.ArgumentParser()
     parser.add_argument('--debug', action='store_true', default=False, help='Increase verbosity')
     parser.add_argument('--tcp', default=0, help='Specify TCP port to use (default: use stdio)', type=int)
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on with --tcp (default: 127.0.0.1)')
+    parser.add_argument('--client-log-level', default='INFO', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
+                        help='Minimum level of log records forwarded to the client (default: INFO)')
+    parser.add_argument('--client-log-interval', default=0.5, type=float,
+                        help='Seconds between batches of log records sent to the client (default: 0.5)')
+    parser.add_argument('--stats', action='store_true', default=False,
+                        help='Record request latencies and build timings, served by the $/mesonls/stats request')
+    parser.add_argument('--stats-dump', metavar='FILE',
+                        help='Write the recorded statistics to FILE as JSON on exit (implies --stats)')
+    parser.add_argument('--profile-rate', default=0., type=float,
+                        help='Fraction of requests to run under cProfile when recording statistics (default: 0)')
+    parser.add_argument('--slow-request-ms', default=100., type=float,
+                        help='Keep the profiles of sampled requests slower than this (default: 100)')
     return parser
 
 
+def setup_logging(namespace: argparse.Namespace) -> logging.Handler:
+    """Logs to stderr, warnings only unless debugging; returns the handler."""
+    sh = logging.StreamHandler(sys.stderr)
+    sh.setLevel(logging.DEBUG if namespace.debug else logging.WARNING)
+    logger = logging.getLogger()
+    logger.addHandler(sh)
+    # Records go through for whichever of stderr and the client wants them, each handler filters on its own level
+    logger.setLevel(min(sh.level, logging.getLevelName(namespace.client_log_level)))
+    return sh
+
+
+@contextmanager
+def client_logging(server: 'mlsp.server.MesonLanguageServer', namespace: argparse.Namespace, exclusive: bool = False):
+    """Forwards log records to the client of `server` for as long as the context lasts; `exclusive` limits them to the
+    records logged while handling that server's connection, when several share the process."""
+    from mlsp.log_handler import LanguageServerLoggingHandler
+    lsp_handler = LanguageServerLoggingHandler(server.endpoint, level=namespace.client_log_level,
+                                               interval=namespace.client_log_interval,
+                                               owner=server if exclusive else None)
+    lsp_handler.setFormatter(Formatter(fmt="[%(module)s - %(asctime)-8s] %(message)s", datefmt="%H:%M:%S"))
+    logging.getLogger().addHandler(lsp_handler)
+    try:
+        yield
+    finally:
+        logging.getLogger().removeHandler(lsp_handler)
+        lsp_handler.close()
+
+
 def main():
+    if sys.argv[1:2] == ['check']:
+        # Headless mode, `mlsp check <dirs...>`: the diagnostics of whole projects, without a client
+        from mlsp import check
+        sys.exit(check.main(sys.argv[2:]))
     parser = setup_arguments()
     namespace = parser.parse_args()
 
-    # Not supporting options for now
+    setup_logging(namespace)
     logger = logging.getLogger()
-    sh = logging.StreamHandler(sys.stderr)
-    sh.setLevel(0)
-    logger.addHandler(sh)
-    if namespace.debug:
-        logger.setLevel(logging.DEBUG)
-    else:
-        logger.setLevel(logging.WARNING)
-    server = new_with_stdio(namespace)
-    lsp_handler = LanguageServerLoggingHandler(server.endpoint)
-    lsp_handler.setFormatter(Formatter(fmt="[%(module)s - %(asctime)-8s] %(message)s", datefmt="%H:%M:%S"))
-    logger.addHandler(lsp_handler)
+    if namespace.stats or namespace.stats_dump:
+        STATS.enable(namespace.profile_rate, namespace.slow_request_ms)
+    # Imported once the arguments are known to be valid: `--help` and typos should not pay for the server's imports
+    from mlsp import server
 
     try:
-        server.start()
-    except Exception as ex:
+        if namespace.tcp:
+            server.serve_tcp(namespace.host, namespace.tcp,
+                             lambda connection: client_logging(connection, namespace, exclusive=True))
+        else:
+            stdio_server = server.new_with_stdio(namespace)
+            with client_logging(stdio_server, namespace):
+                stdio_server.start()
+    except KeyboardInterrupt:
+        pass
+    except Exception:
         logger.exception("Server exception")
+    finally:
+        if namespace.stats_dump:
+            with open(namespace.stats_dump, 'w') as f:
+                json.dump(STATS.to_dict(), f, indent=2)
@@ -1,34 +1,257 @@
 import logging
 import os
 from pathlib import Path
-from typing import Optional, List
+from typing import Callable, Collection, Dict, Iterable, Mapping, NamedTuple, Optional, List, Tuple
 from urllib import parse
 
 from mesonbuild import mparser, environment, mesonlib
 from mesonbuild.ast import AstInterpreter, AstVisitor
 # from .workspace import Workspace
+from mesonbuild.interpreterbase import InvalidArguments, InvalidCode
 from mesonbuild.mparser import ParseException
 
+from mlsp.cache import content_hash, parse_code
+from mlsp.parser import ErrorNode, errors
+from mlsp.scheduler import BuildCancelled
+
 logger = logging.getLogger(__name__)
 
+# Where `subproject()` looks for subprojects, relative to the root of the project calling it
+SUBPROJECT_DIR = 'subprojects'
+
+
+class BuildFile(NamedTuple):
+    """A build file entered during evaluation.
+
+    `order` holds the indices of the `subdir()` calls leading to the file, so sorting by it gives evaluation order.
+    `calls` holds the 0-based line and the column of each of these calls along with its index: a position in the file
+    prefixed with them sorts after whatever the files calling it evaluate before entering it, and before the rest.
+    `digest` identifies the text the file was parsed from; its tree is only kept while the file is open."""
+    subdir: str
+    parent: Optional[str]
+    order: Tuple[int, ...]
+    calls: Tuple[Tuple[int, int, int], ...]
+    digest: str
+    codeblock: Optional[mparser.CodeBlockNode]
+
+
+class ResolvedValue(mparser.ElementaryNode):
+    """Stands for the value assigned to a variable once its tree has been let go of, holding what the expression
+    resolved to instead; the AST interpreter resolves it like a literal."""
+
+    def __init__(self, value, ast_id: str):
+        self.value = value
+        self.ast_id = ast_id
+
 
 class LSPInterpreter(AstInterpreter):
-    def __init__(self, workspace: 'mlsp.workspace.Workspace', subdir: str, visitors: Optional[List[AstVisitor]] = None):
+    """Evaluates the build files of a project, the one at the root of the workspace unless `source_root` is given; open
+    documents are read from `documents`, by URI, and every other file from the disk.
+
+    `subproject()` calls are recorded in `subprojects` without entering them, as subprojects are analysed on their
+    own. `subtree_done` is called whenever a `subdir()` of the root build file has been evaluated."""
+    files: Dict[str, BuildFile]
+    documents: Mapping[str, str]
+    # Name of every subproject called, along with the first build file calling it
+    subprojects: Dict[str, str]
+    # Statements of each file that could not be parsed or evaluated, which are skipped
+    statement_errors: Dict[str, List[ErrorNode]]
+    subtree_done: Optional[Callable[[], None]]
+
+    def __init__(self, workspace: 'mlsp.workspace.Workspace', subdir: str, visitors: Optional[List[AstVisitor]] = None,
+                 documents: Optional[Mapping[str, str]] = None, cancelled: Optional[Callable[[], bool]] = None,
+                 source_root: Optional[str] = None):
         self.workspace = workspace
+        self.documents = documents if documents is not None else dict()
         self.ast = None
-        source_root = parse.unquote(parse.urlparse(workspace.root_uri).path)
+        self.cancelled = cancelled
+        self.subtree_done = None
+        self.files = dict()
+        self.subprojects = dict()
+        self.statement_errors = dict()
+        # Build files read from the disk and parsed, rather than taken from the index
+        self.files_parsed = 0
+        self.current_file = None
+        self._entered = dict()
+        if source_root is None:
+            source_root = parse.unquote(parse.urlparse(workspace.root_uri).path)
         super().__init__(source_root, subdir, visitors)
+        self.funcs['subproject'] = self.func_subproject
+
+    @property
+    def root_file(self) -> str:
+        return os.path.join(self.source_root, environment.build_filename)
 
     def load_root_meson_file(self):
-        meson_uri = os.path.join(self.workspace.root_uri, "meson.build")
-        logger.debug('%s - %s', self.workspace.documents, meson_uri)
+        mesonfile = self.root_file
+        meson_uri = Path(mesonfile).as_uri()
+        logger.debug('Loading %s', meson_uri)
 
-        if meson_uri in self.workspace.documents:
-            document = self.workspace.get_document(meson_uri)
-            self.ast = mparser.Parser(document.contents, '').parse()
-            self.visit()
+        if meson_uri in self.documents:
+            digest, self.ast = self.parse_file(mesonfile, self.documents[meson_uri], '')
         else:
-            super().load_root_meson_file()
+            if not self.workspace.fs.isfile(mesonfile):
+                raise InvalidArguments('Missing Meson file in %s' % mesonfile)
+            digest, self.ast = self.read_file(mesonfile, '')
+        self.files[mesonfile] = BuildFile('', None, (), (), digest, self.ast)
+        self._record_errors(mesonfile, self.ast)
+        self.current_file = mesonfile
+        self.visit()
+
+    def load_file(self, absname: str, subdir: str) -> Optional[Tuple[str, mparser.CodeBlockNode]]:
+        """Returns the digest of a build file along with its tree, or None if there is no such file."""
+        abs_uri = Path(absname).as_uri()
+        if abs_uri in self.documents:
+            return self.parse_file(absname, self.documents[abs_uri], subdir)
+        if not self.workspace.fs.isfile(absname):
+            return None
+        return self.read_file(absname, subdir)
+
+    def read_file(self, absname: str, subdir: str) -> Tuple[str, mparser.CodeBlockNode]:
+        stat = self.workspace.fs.stat(absname)
+        entry = self.workspace.index.lookup(absname, stat)
+        if entry is not None:
+            return entry.hash, entry.codeblock()
+        code = self.workspace.fs.read(absname)
+        assert (isinstance(code, str))
+        if not subdir and code.isspace():
+            raise InvalidCode('Builder file is empty.')
+        # The index keeps the tree from now on, the parse cache is for open documents only
+        digest, codeblock = self.parse_file(absname, code, subdir, cache=False)
+        self.files_parsed += 1
+        self.workspace.index.record(absname, stat, code, codeblock)
+        return digest, codeblock
+
+    def parse_file(self, absname: str, code: str, subdir: str,
+                   cache: bool = True) -> Tuple[str, mparser.CodeBlockNode]:
+        try:
+            if cache:
+                codeblock = self.workspace.parse_cache.parse(absname, code, subdir)
+            else:
+                codeblock = parse_code(absname, code, subdir)
+        except mesonlib.MesonException as me:
+            me.file = os.path.join(subdir, environment.build_filename)
+            raise me
+        return content_hash(code), codeblock
+
+    def fork(self, documents: Mapping[str, str], cancelled: Optional[Callable[[], bool]] = None) -> 'LSPInterpreter':
+        """Copies the state of a finished build, so that some of its files can be evaluated again."""
+        other = LSPInterpreter(self.workspace, self.subdir, self.visitors, documents, cancelled, self.source_root)
+        other.ast = self.ast
+        other.files = dict(self.files)
+        other.subprojects = dict(self.subprojects)
+        other.statement_errors = dict(self.statement_errors)
+        other.visited_subdirs = dict(self.visited_subdirs)
+        # `+=` appends to the lists in place
+        other.assignments = {name: list(values) for name, values in self.assignments.items()}
+        other.assign_vals = {name: list(values) for name, values in self.assign_vals.items()}
+        other.reverse_assignment = dict(self.reverse_assignment)
+        return other
+
+    def compact(self, keep: Collection[str]):
+        """Lets go of what a finished build no longer needs: the trees of the files not in `keep`, and everything about
+        assignments but the resolved value `subdir()` arguments are taken from."""
+        self.files = {name: build_file if name in keep or build_file.codeblock is None else
+                      build_file._replace(codeblock=None) for name, build_file in self.files.items()}
+        if self.root_file not in keep:
+            self.ast = None
+        # In evaluation order, so that variables read by an expression are already resolved by the time it is
+        assignments = self.assignments = {name: values[:1] for name, values in self.assignments.items() if values}
+        for values in assignments.values():
+            values[0] = self._resolved(values[0])
+        self.assign_vals = dict()
+        self.reverse_assignment = dict()
+        self._entered = dict()
+
+    def _resolved(self, node: mparser.BaseNode) -> ResolvedValue:
+        if isinstance(node, ResolvedValue):
+            return node
+        return ResolvedValue(self._value_of(node), node.ast_id)
+
+    def _value_of(self, node: mparser.BaseNode):
+        """Value of the strings and arrays of strings `subdir()` arguments are made of, as `resolve_node` would give
+        it; None for anything else, like function calls, which the AST interpreter cannot resolve either."""
+        if isinstance(node, (mparser.StringNode, mparser.NumberNode, mparser.BooleanNode)):
+            return node.value
+        if isinstance(node, mparser.IdNode):
+            values = self.assignments.get(node.value)
+            return values[0].value if values and isinstance(values[0], ResolvedValue) else None
+        if isinstance(node, mparser.ArrayNode):
+            return self._flatten(self._value_of(argument) for argument in node.args.arguments)
+        if isinstance(node, mparser.ArithmeticNode) and node.operation == 'add':
+            left, right = self._value_of(node.left), self._value_of(node.right)
+            if isinstance(left, str) and isinstance(right, str):
+                return left + right
+            return self._flatten([left, right])
+        if isinstance(node, mparser.MethodNode):
+            try:
+                return self.resolve_node(node)
+            except Exception:
+                return None
+        return None
+
+    @staticmethod
+    def _flatten(values: Iterable) -> list:
+        flat = []
+        for value in values:
+            if isinstance(value, list):
+                flat.extend(value)
+            elif value is not None:
+                flat.append(value)
+        return flat
+
+    def reevaluate(self, files: Iterable[str]):
+        """Evaluates files again, along with every subdir they enter, which must all be part of `files`.
+
+        Files are evaluated against the variables left by the previous build instead of the exact state at the point
+        they were entered, which is as much as the AST interpreter needs to resolve `subdir()` arguments."""
+        files = set(name for name in files if name in self.files)
+        tops = sorted((name for name in files if not self._has_ancestor_in(name, files)),
+                      key=lambda name: self.files[name].order)
+        previous = {name: self.files[name] for name in tops}
+        for name in files:
+            del self.files[name]
+            self.visited_subdirs.pop(name, None)
+            self.statement_errors.pop(name, None)
+        self.subprojects = {name: caller for name, caller in self.subprojects.items() if caller not in files}
+        for name in tops:
+            build_file = previous[name]
+            tree = self.load_file(name, build_file.subdir)
+            if tree is not None:
+                self.enter(name, build_file.subdir, build_file.parent, build_file.order, build_file.calls, *tree)
+
+    def _has_ancestor_in(self, name: str, files: set) -> bool:
+        parent = self.files[name].parent
+        while parent is not None and parent in self.files:
+            if parent in files:
+                return True
+            parent = self.files[parent].parent
+        return False
+
+    def enter(self, absname: str, subdir: str, parent: Optional[str], order: Tuple[int, ...],
+              calls: Tuple[Tuple[int, int, int], ...], digest: str, codeblock: mparser.CodeBlockNode):
+        self.visited_subdirs[absname] = True
+        self.files[absname] = BuildFile(subdir, parent, order, calls, digest, codeblock)
+        self._record_errors(absname, codeblock)
+        self._entered[absname] = 0
+        prev_subdir, prev_file = self.subdir, self.current_file
+        self.subdir, self.current_file = subdir, absname
+        try:
+            for visitor in self.visitors:
+                codeblock.accept(visitor)
+            self.evaluate_codeblock(codeblock)
+        except mesonlib.MesonException as me:
+            # Errors raised with a position but no file, like the ones from `func_subdir`, belong to this file
+            if not getattr(me, 'file', None):
+                me.file = os.path.join(subdir, environment.build_filename)
+            raise me
+        finally:
+            self.subdir, self.current_file = prev_subdir, prev_file
+
+    def _record_errors(self, absname: str, codeblock: mparser.CodeBlockNode):
+        found = errors(codeblock)
+        if found:
+            self.statement_errors[absname] = found
 
     def visit(self, extra_visitors: Optional[List[AstVisitor]] = None):
         all_visitors = (self.visitors or []) + (extra_visitors or [])
@@ -38,6 +261,20 @@ class LSPInterpreter(AstInterpreter):
         else:
             logger.warning("AST Not built!")
 
+    def evaluate_statement(self, cur):
+        if self.cancelled is not None and self.cancelled():
+            raise BuildCancelled()
+        if isinstance(cur, ErrorNode):
+            return None
+        try:
+            return super().evaluate_statement(cur)
+        except mesonlib.MesonException as me:
+            # Like `foo = ` while the value is being typed: the statement is skipped, not the rest of the project
+            where = me if getattr(me, 'lineno', None) else cur
+            self.statement_errors.setdefault(self.current_file, []).append(ErrorNode(
+                self.subdir, getattr(where, 'lineno', 1), getattr(where, 'colno', 0), str(me).split('\n')[0]))
+            return None
+
     def func_subdir(self, node, args, kwargs):
         args = self.flatten_args(args)
         if len(args) > 1:
@@ -47,37 +284,29 @@ class LSPInterpreter(AstInterpreter):
         if not isinstance(args[0], str):
             raise ParseException("`subdir` expects a string argument; found %s instead" % str(type(args[0])), "",
                                  node.lineno, node.colno)
-        prev_subdir = self.subdir
-        subdir = os.path.join(prev_subdir, args[0])
+        subdir = os.path.join(self.subdir, args[0])
         build_filename = os.path.join(subdir, environment.build_filename)
         absname = os.path.join(self.source_root, build_filename)
-        symlinkless_dir = os.path.join(self.source_root, build_filename)
-        if symlinkless_dir in self.visited_subdirs:
+        if absname in self.visited_subdirs:
             logger.info('Trying to enter %s which has already been visited --> skipping', args[0])
             return
-        self.visited_subdirs[symlinkless_dir] = True
-        abs_uri = Path(absname).as_uri()
-        if abs_uri not in self.workspace.documents:
-            if not os.path.isfile(absname):
-                logger.info('Unable to find build file %s --> skipping', build_filename)
-                return
-            with open(absname, encoding='utf8') as f:
-                code = f.read()
-            assert (isinstance(code, str))
-            try:
-                codeblock = mparser.Parser(code, subdir).parse()
-            except mesonlib.MesonException as me:
-                me.file = build_filename
-                raise me
-        else:
-            try:
-                document = self.workspace.get_document(abs_uri)
-                codeblock = mparser.Parser(document.contents).parse()
-            except mesonlib.MesonException as me:
-                me.file = build_filename
-                raise me
-        self.subdir = subdir
-        for visitor in self.visitors:
-            codeblock.accept(visitor)
-        self.evaluate_codeblock(codeblock)
-        self.subdir = prev_subdir
+        self.visited_subdirs[absname] = True
+        tree = self.load_file(absname, subdir)
+        if tree is None:
+            logger.info('Unable to find build file %s --> skipping', build_filename)
+            return
+        parent = self.current_file
+        index = self._entered.get(parent, 0)
+        self._entered[parent] = index + 1
+        caller = self.files.get(parent)
+        order = (caller.order if caller is not None else ()) + (index,)
+        calls = (caller.calls if caller is not None else ()) + ((node.lineno - 1, node.colno, index),)
+        self.enter(absname, subdir, parent, order, calls, *tree)
+        if parent == self.root_file and self.subtree_done is not None:
+            self.subtree_done()
+
+    def func_subproject(self, node, args, kwargs):
+        args = self.flatten_args(args)
+        if args and isinstance(args[0], str):
+            self.subprojects.setdefault(args[0], self.current_file)
+        return True
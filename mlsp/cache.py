@@ -0,0 +1,116 @@
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+from mesonbuild import mesonlib, mparser
+
+from mlsp.parser import IncrementalParser
+from mlsp.visitors import FileIDGenerator
+
+logger = logging.getLogger(__name__)
+
+
+def content_hash(code: str) -> str:
+    return hashlib.sha1(code.encode('utf8')).hexdigest()
+
+
+def parse_code(filename: str, code: str, subdir: str) -> mparser.CodeBlockNode:
+    """Parses a build file; if it has errors, the statements that are valid are kept along with `ErrorNode`s."""
+    logger.debug('Parsing %s', filename)
+    try:
+        codeblock = mparser.Parser(code, subdir).parse()
+    except mesonlib.MesonException:
+        return IncrementalParser(filename, subdir).parse(code)
+    codeblock.accept(FileIDGenerator(filename))
+    return codeblock
+
+
+class LRUCache:
+    """Mapping keeping the `limit` entries used last, and counting the ones it evicts."""
+    entries: 'OrderedDict[str, object]'
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.entries = OrderedDict()
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.entries
+
+    def get(self, key: str, default=None):
+        if key not in self.entries:
+            return default
+        self.entries.move_to_end(key)
+        return self.entries[key]
+
+    def pop(self, key: str, default=None):
+        return self.entries.pop(key, default)
+
+    def put(self, key: str, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.limit:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+
+class ParseCache:
+    """Parsed documents, keyed by file name and invalidated by content hash; trees of files read from the disk are
+    kept by the workspace index instead.
+
+    Each document keeps an `IncrementalParser`, so that after an edit only the statements around it are parsed again.
+    Besides the open documents, the trees of the `max_closed` documents used last are kept, for when they are opened
+    again. Trees handed out by the cache are shared between builds and must be treated as read-only."""
+    entries: 'OrderedDict[str, Tuple[str, mparser.CodeBlockNode]]'
+    parsers: Dict[str, IncrementalParser]
+
+    def __init__(self, max_closed: int = 64):
+        self.entries = OrderedDict()
+        self.parsers = dict()
+        self.max_closed = max_closed
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def parse(self, filename: str, code: str, subdir: str) -> mparser.CodeBlockNode:
+        digest = content_hash(code)
+        entry = self.entries.get(filename)
+        if entry is not None and entry[0] == digest:
+            self.hits += 1
+            self.entries.move_to_end(filename)
+            return entry[1]
+        self.misses += 1
+        parser = self.parsers.get(filename)
+        if parser is None or parser.subdir != subdir:
+            parser = self.parsers[filename] = IncrementalParser(filename, subdir)
+        logger.debug('Parsing %s', filename)
+        codeblock = parser.parse(code)
+        self.entries[filename] = (digest, codeblock)
+        self.entries.move_to_end(filename)
+        return codeblock
+
+    def get(self, filename: str) -> Optional[mparser.CodeBlockNode]:
+        entry = self.entries.get(filename)
+        return entry[1] if entry is not None else None
+
+    def invalidate(self, filename: Optional[str] = None):
+        if filename is None:
+            self.entries.clear()
+            self.parsers.clear()
+        else:
+            self.entries.pop(filename, None)
+            self.parsers.pop(filename, None)
+
+    def retain(self, filenames: Iterable[str]):
+        """Drops the trees of every file but `filenames` and the `max_closed` other files used last."""
+        keep = set(filenames)
+        closed = [filename for filename in self.entries if filename not in keep]
+        for filename in closed[:max(len(closed) - self.max_closed, 0)]:
+            del self.entries[filename]
+            self.evictions += 1
+        for filename in [filename for filename in self.parsers if filename not in self.entries]:
+            del self.parsers[filename]
@@ -0,0 +1,177 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from concurrent import futures
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional, TextIO
+
+from mesonbuild import environment, mlog
+
+from mlsp import consts
+from mlsp.config import default_cache_dir
+from mlsp.workspace import Workspace
+
+logger = logging.getLogger(__name__)
+
+SARIF_SCHEMA = 'https://json.schemastore.org/sarif-2.1.0.json'
+SARIF_LEVELS = {'error': 'error', 'warning': 'warning', 'information': 'note', 'hint': 'note'}
+SEVERITY_NAMES = {
+    consts.DiagnosticSeverity.Error: 'error',
+    consts.DiagnosticSeverity.Warning: 'warning',
+    consts.DiagnosticSeverity.Information: 'information',
+    consts.DiagnosticSeverity.Hint: 'hint',
+}
+
+
+class Report(NamedTuple):
+    """What checking a project found: diagnostics by file path, or why the project could not be checked."""
+    project: str
+    diagnostics: Dict[str, List[dict]]
+    files: int
+    seconds: float
+    error: Optional[str] = None
+
+
+class SilentEndpoint:
+    """Stands for the client of a workspace analysed without one."""
+
+    def notify(self, method, params=None):
+        pass
+
+
+def setup_arguments() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='mlsp check', description='Reports the diagnostics of Meson projects')
+    parser.add_argument('directories', nargs='+', metavar='DIR', help='Source roots of the projects to check')
+    parser.add_argument('--format', default='jsonl', choices=['jsonl', 'sarif'],
+                        help='Output one JSON object per diagnostic as they are found, or a SARIF log at the end '
+                             '(default: jsonl)')
+    parser.add_argument('--output', '-o', metavar='FILE', help='Write the results to FILE (default: stdout)')
+    parser.add_argument('--jobs', '-j', type=int, default=os.cpu_count() or 1,
+                        help='Number of projects checked in parallel (default: number of CPUs)')
+    parser.add_argument('--cache-dir', type=Path, default=default_cache_dir(),
+                        help='Workspace indexes reused and updated across runs, shared with the server '
+                             '(default: %(default)s)')
+    parser.add_argument('--no-cache', action='store_true', default=False, help='Neither read nor write indexes')
+    parser.add_argument('--debug', action='store_true', default=False, help='Increase verbosity')
+    return parser
+
+
+def check_project(directory: str, cache_dir: Optional[Path], jobs: int = 1) -> Report:
+    """Analyses a project the way the server does, along with every subproject it calls; runs in worker processes."""
+    start = time.perf_counter()
+    root = Path(directory).resolve()
+    if not (root / environment.build_filename).is_file():
+        return Report(str(root), dict(), 0, 0., f'No {environment.build_filename} in {root}')
+    # Meson logs what the interpreter does to stdout, which holds the results
+    mlog.disable()
+    workspace = Workspace(root.as_uri(), SilentEndpoint(), debounce=0, cache_dir=cache_dir, jobs=jobs)
+    try:
+        workspace.scheduler.wait()
+        # The server only analyses subprojects once something asks for them
+        while workspace.request_subprojects(workspace.known_subprojects()):
+            workspace.scheduler.schedule(delay=0)
+            workspace.scheduler.wait()
+        snapshot = workspace.snapshot
+    finally:
+        workspace.close()
+    files = sum(len(project.files) for project in snapshot.projects())
+    diagnostics = {Workspace.path_for(uri): found for uri, found in snapshot.all_diagnostics().items()}
+    return Report(str(root), diagnostics, files, time.perf_counter() - start)
+
+
+def check(directories: List[str], cache_dir: Optional[Path], jobs: int) -> Iterator[Report]:
+    """Checks projects across a process pool, yielding their reports as they finish."""
+    if jobs <= 1 or len(directories) == 1:
+        # A single project is parsed in parallel by its own workspace instead
+        for directory in directories:
+            yield _guarded(directory, cache_dir, jobs)
+        return
+    with futures.ProcessPoolExecutor(max_workers=min(jobs, len(directories))) as executor:
+        pending = {executor.submit(check_project, directory, cache_dir): directory for directory in directories}
+        for future in futures.as_completed(pending):
+            try:
+                yield future.result()
+            except Exception as ex:
+                logger.debug('Checking %s failed', pending[future], exc_info=True)
+                yield Report(str(Path(pending[future]).resolve()), dict(), 0, 0., f'Could not check project: {ex}')
+
+
+def _guarded(directory: str, cache_dir: Optional[Path], jobs: int) -> Report:
+    try:
+        return check_project(directory, cache_dir, jobs)
+    except Exception as ex:
+        logger.debug('Checking %s failed', directory, exc_info=True)
+        return Report(str(Path(directory).resolve()), dict(), 0, 0., f'Could not check project: {ex}')
+
+
+def _results(report: Report) -> Iterator[dict]:
+    """Diagnostics of a report, flattened, with lines and columns counted from 1."""
+    if report.error is not None:
+        yield dict(project=report.project, path=report.project, line=None, column=None, severity='error',
+                   message=report.error)
+    for path, diagnostics in sorted(report.diagnostics.items()):
+        for diagnostic in diagnostics:
+            start = diagnostic['range']['start']
+            yield dict(project=report.project, path=path, line=start['line'] + 1, column=start['character'] + 1,
+                       severity=SEVERITY_NAMES.get(diagnostic.get('severity'), 'error'),
+                       message=diagnostic['message'])
+
+
+def _sarif(results: List[dict]) -> dict:
+    def location(result: dict) -> dict:
+        physical = dict(artifactLocation=dict(uri=Path(result['path']).as_uri()))
+        if result['line'] is not None:
+            physical['region'] = dict(startLine=result['line'], startColumn=result['column'])
+        return dict(physicalLocation=physical)
+
+    return {
+        '$schema': SARIF_SCHEMA,
+        'version': '2.1.0',
+        'runs': [{
+            'tool': {'driver': {'name': 'mlsp', 'informationUri': 'https://github.com/solarliner/meson-lsp'}},
+            'results': [{
+                'level': SARIF_LEVELS[result['severity']],
+                'message': {'text': result['message']},
+                'locations': [location(result)],
+            } for result in results],
+        }],
+    }
+
+
+def run(namespace: argparse.Namespace, out: TextIO) -> int:
+    """Checks the projects and writes the results; returns the exit code, 1 if any error was found."""
+    cache_dir = None if namespace.no_cache else namespace.cache_dir
+    start = time.perf_counter()
+    results = []
+    files = projects = errors = 0
+    for report in check(namespace.directories, cache_dir, namespace.jobs):
+        projects += 1
+        files += report.files
+        for result in _results(report):
+            errors += result['severity'] == 'error'
+            if namespace.format == 'jsonl':
+                out.write(json.dumps(result) + '\n')
+            else:
+                results.append(result)
+        out.flush()
+    if namespace.format == 'sarif':
+        json.dump(_sarif(results), out, indent=2)
+        out.write('\n')
+    elapsed = time.perf_counter() - start
+    print(f'Checked {files} build files in {projects} projects in {elapsed:.2f} s '
+          f'({files / elapsed if elapsed else 0:.1f} files/s), {errors} errors', file=sys.stderr)
+    return 1 if errors else 0
+
+
+def main(args: List[str]) -> int:
+    namespace = setup_arguments().parse_args(args)
+    logger = logging.getLogger()
+    logger.addHandler(logging.StreamHandler(sys.stderr))
+    logger.setLevel(logging.DEBUG if namespace.debug else logging.WARNING)
+    if namespace.output is None:
+        return run(namespace, sys.stdout)
+    with open(namespace.output, 'w', encoding='utf8') as out:
+        return run(namespace, out)
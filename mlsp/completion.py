@@ -0,0 +1,159 @@
+import pkgutil
+import sys
+from bisect import bisect_left
+from functools import lru_cache
+from importlib.util import find_spec
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from mlsp import consts, signatures
+
+
+@lru_cache(maxsize=None)
+def meson_modules() -> List[dict]:
+    """Modules importable from build files, found by listing `mesonbuild.modules` without importing it, which would
+    pull in most of Meson."""
+    return [
+        dict(
+            name=m.name.replace('unstable_', ''),
+            deprecated=m.name.startswith('unstable')
+        ) for m in pkgutil.iter_modules(
+            find_spec('mesonbuild.modules').submodule_search_locations
+        )
+    ]
+
+
+class CompletionItem:
+    """A completion item as kept by an index; only turned into a dict for the items actually sent to the client."""
+    __slots__ = ('label', 'kind', 'detail', 'documentation', 'insert_text', 'deprecated')
+    label: str
+    kind: int
+    detail: Optional[str]
+    documentation: Optional[str]
+    insert_text: Optional[str]
+    deprecated: Optional[bool]
+
+    def __init__(self, label: str, kind: int, detail: Optional[str] = None, documentation: Optional[str] = None,
+                 insert_text: Optional[str] = None, deprecated: Optional[bool] = None):
+        self.label = sys.intern(label)
+        self.kind = kind
+        self.detail = detail
+        self.documentation = documentation
+        self.insert_text = insert_text
+        self.deprecated = deprecated
+
+    def to_dict(self) -> dict:
+        item = dict(label=self.label, kind=self.kind)
+        if self.detail is not None:
+            item['detail'] = self.detail
+        if self.documentation is not None:
+            item['documentation'] = self.documentation
+        if self.insert_text is not None:
+            item['insertText'] = self.insert_text
+        if self.deprecated is not None:
+            item['deprecated'] = self.deprecated
+        return item
+
+
+class CompletionIndex:
+    """Completion items sorted by label, so that all items matching a prefix form a contiguous run."""
+    items: List[CompletionItem]
+    labels: List[str]
+
+    def __init__(self, items: Iterable[CompletionItem], version: int = 0):
+        self.items = sorted(items, key=lambda item: item.label)
+        self.labels = [item.label for item in self.items]
+        self.version = version
+
+    def lookup(self, prefix: str, limit: int) -> Tuple[List[dict], bool]:
+        """Returns at most `limit` items starting with `prefix`, and whether more items matched."""
+        start = bisect_left(self.labels, prefix)
+        end = start
+        while end < len(self.labels) and end - start <= limit and self.labels[end].startswith(prefix):
+            end += 1
+        return [item.to_dict() for item in self.items[start:min(end, start + limit)]], end - start > limit
+
+
+class FilteredIndex:
+    """The items of an index that `accept` lets through."""
+
+    def __init__(self, index: CompletionIndex, accept: Callable[[CompletionItem], bool]):
+        self.index = index
+        self.accept = accept
+
+    def lookup(self, prefix: str, limit: int) -> Tuple[List[dict], bool]:
+        found = []
+        for i in range(bisect_left(self.index.labels, prefix), len(self.index.labels)):
+            if len(found) > limit or not self.index.labels[i].startswith(prefix):
+                break
+            if self.accept(self.index.items[i]):
+                found.append(self.index.items[i])
+        return [item.to_dict() for item in found[:limit]], len(found) > limit
+
+
+def complete(indexes: Iterable[CompletionIndex], prefix: str, limit: int) -> dict:
+    """At most `limit` items starting with `prefix`, taken from the indexes in order, so that the first ones rank
+    first; `sortText` keeps that order on the client, which sorts by label otherwise."""
+    items = []
+    incomplete = False
+    for rank, index in enumerate(indexes):
+        found, truncated = index.lookup(prefix, limit - len(items))
+        for item in found:
+            item['sortText'] = f"{rank:02d}{item['label']}"
+        items += found
+        incomplete = incomplete or truncated
+    return dict(isIncomplete=incomplete, items=items)
+
+
+@lru_cache(maxsize=None)
+def static_index(functions: Tuple[str, ...]) -> CompletionIndex:
+    """Keywords, modules and interpreter functions, which never change during the lifetime of the server."""
+    from mesonbuild.mparser import Lexer
+    lexer = Lexer("")
+    keywords = [
+                   CompletionItem(label=k, kind=consts.CompletionItemKind.Keyword)
+                   for k in lexer.keywords
+               ] + [
+                   CompletionItem(
+                       label=k,
+                       kind=consts.CompletionItemKind.Keyword,
+                       deprecated=True) for k in lexer.future_keywords
+               ]
+    modules = [
+        CompletionItem(
+            label=k['name'],
+            detail=f"{k['name']} module (unstable)"
+            if k['deprecated'] else f"{k['name']} module",
+            deprecated=k['deprecated'],
+            insert_text=f"import('{k['name']}')",
+            kind=consts.CompletionItemKind.Module) for k in meson_modules()
+    ]
+    functions = [
+        CompletionItem(
+            label=k,
+            kind=consts.CompletionItemKind.Function,
+            documentation="TODO",
+            detail='Function') for k in functions
+    ]
+    return CompletionIndex(keywords + modules + functions)
+
+
+@lru_cache(maxsize=None)
+def kwargs_index(function: str, object_type: Optional[str] = None, method: bool = False) -> CompletionIndex:
+    """Keyword arguments of an interpreter function, or of a method of `object_type` when `method` is set."""
+    kwargs = (signatures.methods_of(object_type) if method else signatures.function_kwargs()).get(function, ())
+    return CompletionIndex(
+        CompletionItem(
+            label=k,
+            kind=consts.CompletionItemKind.Property,
+            detail=f"{function}() keyword argument",
+            insert_text=f"{k}: ") for k in kwargs)
+
+
+@lru_cache(maxsize=None)
+def methods_index(object_type: Optional[str]) -> CompletionIndex:
+    """Methods of an object type, or of every type if it is not known."""
+    return CompletionIndex(
+        CompletionItem(
+            label=k,
+            kind=consts.CompletionItemKind.Method,
+            detail='Method') for k in signatures.methods_of(object_type))
@@ -1,8 +1,14 @@
 import logging
+import os
+from pathlib import Path
 
 logger = logging.getLogger(__name__)
 
 
+def default_cache_dir() -> Path:
+    return Path(os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache') / 'mlsp'
+
+
 class Config:
     def __init__(self, root_uri, init_opts, proc_id, capabilities):
         logger.debug(
@@ -12,3 +18,28 @@ class Config:
         self.init_options = init_opts
         self.process_id = proc_id
         self.capabilities = capabilities
+        # Delay (in milliseconds) between the last edit and the start of an analysis run
+        self.analysis_debounce = self.init_options.get('analysisDebounce', 200) / 1000
+        # Maximum number of items in a completion response; clients ask again as the prefix grows
+        self.completion_limit = self.init_options.get('completionLimit', 50)
+        # Where the workspace index is persisted between runs; `null` disables persistence
+        cache_dir = self.init_options.get('cacheDirectory', default_cache_dir())
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else None
+        # Number of processes parsing build files in parallel; 1 parses them one by one during evaluation
+        self.jobs = self.init_options.get('jobs') or os.cpu_count() or 1
+        # Whether the client can be asked to report changes to build files, in which case stat results are kept
+        # between analysis runs instead of probing every file again
+        watched_files = ((capabilities or {}).get('workspace') or {}).get('didChangeWatchedFiles') or {}
+        self.watch_files = bool(watched_files.get('dynamicRegistration'))
+        # Whether long analyses, like the first one, can be reported to the client as they go
+        self.work_done_progress = bool(((capabilities or {}).get('window') or {}).get('workDoneProgress'))
+        # Roots of multi-root workspaces analysed at the same time; the least recently used root without open
+        # documents is closed beyond that, and analysed again once needed
+        self.max_roots = self.init_options.get('maxRoots', 8)
+        # Closed documents whose tokens and trees are kept per root, for when they are opened again
+        self.max_closed_documents = self.init_options.get('maxClosedDocuments', 32)
+        # Maximum number of symbols in a `workspace/symbol` response; clients ask again as the query grows
+        self.symbol_limit = self.init_options.get('workspaceSymbolLimit', 50)
+        # Whether `workspace/symbol` has the subprojects analysed, once; otherwise the ones not loaded are searched
+        # in the persisted index only
+        self.symbol_subprojects = bool(self.init_options.get('workspaceSymbolSubprojects', False))
@@ -48,6 +48,12 @@ class DiagnosticSeverity(object):
     Hint = 4
 
 
+class FoldingRangeKind(object):
+    Comment = 'comment'
+    Imports = 'imports'
+    Region = 'region'
+
+
 class InsertTextFormat(object):
     PlainText = 1
     Snippet = 2
@@ -93,3 +99,9 @@ class TextDocumentSyncKind(object):
     NONE = 0
     FULL = 1
     INCREMENTAL = 2
+
+
+# Legend of the semantic tokens sent by the server, indexed by the encoded tokens
+SEMANTIC_TOKEN_TYPES = ['keyword', 'variable', 'function', 'method', 'parameter', 'string', 'number', 'comment',
+                        'operator']
+SEMANTIC_TOKEN_MODIFIERS = ['defaultLibrary']
@@ -0,0 +1,166 @@
+import logging
+import re
+from typing import FrozenSet, NamedTuple, Optional, Tuple
+
+from mlsp.parser import MASKED, mask, starts_statement
+
+logger = logging.getLogger(__name__)
+
+# Where a cursor can be, as far as completion is concerned
+EXPRESSION = 'expression'
+# Where an argument of a call starts, so that its keyword arguments can be written there
+ARGUMENTS = 'arguments'
+# Right after the `.` of a method call
+METHOD = 'method'
+# In a string or a comment
+NOTHING = 'nothing'
+
+KEYWORDS = frozenset(('and', 'break', 'continue', 'elif', 'else', 'endforeach', 'endif', 'false', 'foreach', 'if',
+                      'in', 'not', 'or', 'true'))
+# Keywords that can start a value, the only ones allowed where an argument starts
+VALUE_KEYWORDS = frozenset(('false', 'not', 'true'))
+KWARG = re.compile(r'([A-Za-z_][A-Za-z_0-9]*)\s*:')
+CLOSED_STRING = re.compile(r"'(?:\\.|[^'\\\n])*'")
+
+
+class CursorContext(NamedTuple):
+    """What the text before a cursor says about what can be completed there.
+
+    `receiver` describes the value a method is called on, the way `describe` does for trees, so that its type can be
+    looked up from the symbols; it is empty if the value cannot be described, and None for function calls. `function`
+    is the call the cursor is in the arguments of, and `used` the keyword arguments given to it before the cursor."""
+    kind: str
+    prefix: str = ''
+    function: Optional[str] = None
+    receiver: Optional[str] = None
+    used: FrozenSet[str] = frozenset()
+
+
+def _in_string(code: str) -> bool:
+    """Whether the end of `code` is inside a string or a comment."""
+    last = None
+    for last in MASKED.finditer(code):
+        pass
+    if last is None or last.end() != len(code):
+        return False
+    text = last.group()
+    if text[0] == '#':
+        return True
+    if text.startswith("'''"):
+        return len(text) < 6 or not text.endswith("'''")
+    return CLOSED_STRING.fullmatch(text) is None
+
+
+def _skip_spaces(masked: str, end: int) -> int:
+    """Index of the last character before `end` that is not whitespace, -1 if there is none."""
+    i = end - 1
+    while i >= 0 and masked[i].isspace():
+        i -= 1
+    return i
+
+
+def _word_before(masked: str, end: int) -> Tuple[int, str]:
+    """Identifier or number right before `end`, along with where it starts."""
+    i = end
+    while i > 0 and (masked[i - 1].isalnum() or masked[i - 1] == '_'):
+        i -= 1
+    return i, masked[i:end]
+
+
+def _matching(masked: str, close: int) -> int:
+    """Index of the bracket opening the one at `close`, -1 if there is none."""
+    depth = 0
+    for i in range(close, -1, -1):
+        if masked[i] in ')]}':
+            depth += 1
+        elif masked[i] in '([{':
+            depth -= 1
+            if depth == 0:
+                return i
+    return -1
+
+
+def _opening(masked: str, end: int) -> int:
+    """Index of the innermost bracket left open before `end` in the statement it is in, -1 if there is none."""
+    depth = 0
+    for i in range(end - 1, -1, -1):
+        c = masked[i]
+        if c in ')]}':
+            depth += 1
+        elif c in '([{':
+            if depth == 0:
+                return i
+            depth -= 1
+        elif c == '\n' and depth == 0:
+            line_end = masked.find('\n', i + 1)
+            if starts_statement(masked[i + 1:line_end if line_end >= 0 else len(masked)]):
+                return -1
+    return -1
+
+
+def _describe(masked: str, end: int) -> Optional[str]:
+    """Describes the value whose text ends right before `end`, like `describe` does for trees."""
+    i = _skip_spaces(masked, end)
+    if i < 0:
+        return None
+    c = masked[i]
+    if c == "'":
+        return 'str'
+    if c == '}':
+        return 'dict'
+    if c == ']':
+        start = _matching(masked, i)
+        if start < 0:
+            return None
+        before = _skip_spaces(masked, start)
+        _, word = _word_before(masked, before + 1)
+        # Brackets right after a value index it
+        if before >= 0 and (masked[before] in ')]}\'' or (word and word not in KEYWORDS)):
+            return None
+        return 'array'
+    if c == ')':
+        start = _matching(masked, i)
+        if start < 0:
+            return None
+        name_start, name = _word_before(masked, _skip_spaces(masked, start) + 1)
+        if not name or name in KEYWORDS:
+            return None
+        dot = _skip_spaces(masked, name_start)
+        if dot >= 0 and masked[dot] == '.':
+            receiver = _describe(masked, dot)
+            return f'{receiver}.{name}()' if receiver else None
+        return f'{name}()'
+    start, word = _word_before(masked, i + 1)
+    if not word:
+        return None
+    if word.isdigit():
+        return 'int'
+    if word in ('true', 'false'):
+        return 'bool'
+    dot = _skip_spaces(masked, start)
+    if word in KEYWORDS or (dot >= 0 and masked[dot] == '.'):
+        return None
+    return word
+
+
+def context_at(code: str) -> CursorContext:
+    """Finds what can be completed at the end of `code`, the text before a cursor from some lines above it on; the
+    text does not need to parse."""
+    if _in_string(code):
+        return CursorContext(NOTHING)
+    masked = mask(code)
+    start, prefix = _word_before(masked, len(masked))
+    before = _skip_spaces(masked, start)
+    if before >= 0 and masked[before] == '.':
+        return CursorContext(METHOD, prefix, receiver=_describe(masked, before) or '')
+    opening = _opening(masked, start)
+    if opening < 0 or masked[opening] != '(' or masked[before] not in '(,':
+        return CursorContext(EXPRESSION, prefix)
+    name_start, name = _word_before(masked, _skip_spaces(masked, opening) + 1)
+    if not name or name in KEYWORDS:
+        return CursorContext(EXPRESSION, prefix)
+    used = frozenset(KWARG.findall(masked, opening + 1, start))
+    dot = _skip_spaces(masked, name_start)
+    if dot >= 0 and masked[dot] == '.':
+        return CursorContext(ARGUMENTS, prefix, name, _describe(masked, dot) or '', used)
+    return CursorContext(ARGUMENTS, prefix, name, None, used)
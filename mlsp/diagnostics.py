@@ -0,0 +1,62 @@
+import logging
+import os
+from typing import Dict, List, Tuple
+
+from mesonbuild import mesonlib
+
+from mlsp import consts
+
+logger = logging.getLogger(__name__)
+
+
+def from_exception(source_root: str, exception: mesonlib.MesonException) -> Tuple[str, dict]:
+    """Turns an exception raised while parsing or evaluating into the path of the offending file and a diagnostic."""
+    path = os.path.join(source_root, getattr(exception, 'file', None) or 'meson.build')
+    return path, diagnostic(getattr(exception, 'lineno', 1), getattr(exception, 'colno', 0),
+                            str(exception).split('\n')[0])
+
+
+def diagnostic(lineno: int, column: int, message: str) -> dict:
+    # Meson counts lines from 1 and columns from 0
+    line = max(lineno - 1, 0)
+    return {
+        'source': 'meson',
+        'range': {
+            'start': {
+                'line': line,
+                'character': column
+            },
+            'end': {
+                'line': line,
+                'character': column + 1
+            }
+        },
+        'message': message,
+        'severity': consts.DiagnosticSeverity.Error,
+        'code': '-1'
+    }
+
+
+class DiagnosticsPublisher:
+    """Publishes diagnostics per file, only notifying the client about files whose diagnostics changed."""
+    published: Dict[str, List[dict]]
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.published = dict()
+
+    def publish(self, diagnostics: Dict[str, List[dict]]):
+        """Replaces all published diagnostics; `diagnostics` maps document URIs to their diagnostics."""
+        for uri in set(self.published) | set(diagnostics):
+            current = diagnostics.get(uri, [])
+            if self.published.get(uri, []) == current:
+                continue
+            logger.debug('Publishing %d diagnostics for %s', len(current), uri)
+            self.endpoint.notify('textDocument/publishDiagnostics', params={
+                'uri': uri,
+                'diagnostics': current
+            })
+            if current:
+                self.published[uri] = current
+            else:
+                self.published.pop(uri, None)
@@ -1,72 +1,121 @@
 import re
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Tuple
 from urllib import parse
 
+from mlsp.rope import Rope
+
+WORD_BEFORE = re.compile(r'\w*$')
+WORD_AFTER = re.compile(r'\w*')
+
+
+def utf16_length(text: str) -> int:
+    if text.isascii():
+        return len(text)
+    return len(text) + sum(1 for c in text if ord(c) > 0xFFFF)
+
+
+def utf16_to_index(text: str, units: int) -> int:
+    """Converts a UTF-16 code unit count into an index into `text`, clamped to its length."""
+    if text.isascii():
+        return min(units, len(text))
+    count = 0
+    for i, c in enumerate(text):
+        if count >= units:
+            return i
+        count += 2 if ord(c) > 0xFFFF else 1
+    return len(text)
+
 
 class Document:
+    """Text of an open build file, stored in a rope so that range edits don't copy the whole buffer.
+
+    Lines are separated by '\n' (optionally preceded by '\r'), like the Meson lexer does."""
     uri: str
-    contents: Optional[str]
     version: int
+    rope: Rope
 
     def __init__(self, uri, contents=None, version=0):
         self.uri = uri
         self.contents = contents
         self.version = version
 
+    @property
+    def contents(self) -> Optional[str]:
+        # The contiguous string is only rebuilt when somebody (usually the parser) asks for it
+        if self._stale:
+            self._text = str(self.rope)
+            self._stale = False
+        return self._text
+
+    @contents.setter
+    def contents(self, value: Optional[str]):
+        self.rope = Rope.from_text(value or '')
+        self._text = value
+        self._stale = False
+
     @property
     def lines(self):
         return self.contents.splitlines(True)
 
+    def line_span(self, line: int) -> Tuple[int, int]:
+        """Offsets of the start and end (excluding the line terminator) of a line."""
+        start = self.rope.line_start(line)
+        if line >= self.rope.newlines:
+            return start, len(self.rope)
+        end = self.rope.line_start(line + 1) - 1
+        if end > start and self.rope.slice(end - 1, end) == '\r':
+            end -= 1
+        return start, end
+
     def get_position_character_count(self, line=0, character=0):
-        if line > len(self.lines):
-            return len(self.contents)
-        ccount = 0
-        for i, lcontent in enumerate(self.lines):
-            if i == line:
-                if character > len(lcontent):
-                    ccount += len(lcontent)
-                else:
-                    ccount += character
-                return ccount
-            ccount += len(lcontent)
+        """Converts an LSP position (line, UTF-16 column) into an offset into the contents."""
+        if line > self.rope.newlines:
+            return len(self.rope)
+        start, end = self.line_span(line)
+        return start + utf16_to_index(self.rope.slice(start, end), character)
 
     def get_char_count_position(self, ccount=0):
-        count = 0
-        for i, content in enumerate(self.lines):
-            linelen = len(content)
-            if count + linelen > ccount:
-                return i, (ccount - count)
-            count += linelen
-        return len(self.lines), len(self.lines[-1])
+        """Converts an offset into the contents into an LSP position (line, UTF-16 column)."""
+        ccount = max(0, min(ccount, len(self.rope)))
+        line = self.rope.line_of(ccount)
+        return line, utf16_length(self.rope.slice(self.rope.line_start(line), ccount))
 
     def update(self, changes):
-        if not 'change_range' in changes:
+        if 'range' not in changes:
             self.contents = changes.get("text")
             self.version += 1
             return
-        start_pos = self.get_position_character_count(changes.get("start").get("line"),
-                                                      changes.get("start").get("character"))
-        end_pos = self.get_position_character_count(changes.get("end").get("line"), changes.get("end").get("character"))
+        start = changes["range"]["start"]
+        end = changes["range"]["end"]
+        start_pos = self.get_position_character_count(start.get("line"), start.get("character"))
+        end_pos = self.get_position_character_count(end.get("line"), end.get("character"))
         self.update_range(start_pos, end_pos, changes.get("text"))
 
     def update_range(self, start_pos, end_pos, contents):
-        self.contents = self.contents[start_pos:] + contents + self.contents[:end_pos]
+        self.rope = self.rope.replace(start_pos, end_pos, contents)
+        self._stale = True
         self.version += 1
 
-    def refresh(self):
+    def refresh(self) -> bool:
+        """Reads the document again from the disk; returns whether its text changed."""
         path = parse.unquote(parse.urlparse(self.uri).path)
-        self.contents = Path(path).read_text()
+        text = Path(path).read_text()
+        if text == self.contents:
+            return False
+        self.contents = text
         self.version += 1
+        return True
+
+    def text_before(self, line: int, character: int, lines: int) -> str:
+        """Text from the start of the line `lines` lines above a position, up to the position."""
+        start = self.rope.line_start(max(min(line, self.rope.newlines) - lines, 0))
+        return self.rope.slice(start, self.get_position_character_count(line, character))
 
     def get_word_at_position(self, line=0, character=0):
-        start_pos = end_pos = cpos = self.get_position_character_count(line, character)
-        for i in range(cpos, 0, -1):
-            if re.match(r'\W', self.contents[i]):
-                start_pos = i
-                break
-        for i in range(cpos, len(self.contents)):
-            if re.match(r'\W', self.contents[i]):
-                end_pos = i
-                break
-        return start_pos, end_pos, self.contents[start_pos:end_pos]
+        line_start, line_end = self.line_span(min(line, self.rope.newlines))
+        text = self.rope.slice(line_start, line_end)
+        cpos = min(self.get_position_character_count(line, character), line_end) - line_start
+        start = cpos - len(WORD_BEFORE.search(text, 0, cpos).group())
+        end = WORD_AFTER.match(text, cpos).end()
+        return line_start + start, line_start + end, text[start:end]
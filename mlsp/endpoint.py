@@ -0,0 +1,203 @@
+import asyncio
+import contextvars
+import json
+import logging
+import sys
+import threading
+from concurrent import futures
+from typing import Dict, List, Optional, Set
+
+from pyls_jsonrpc.dispatchers import MethodDispatcher
+from pyls_jsonrpc.exceptions import (JsonRpcException, JsonRpcInternalError, JsonRpcMethodNotFound,
+                                     JsonRpcRequestCancelled)
+
+from mlsp.stats import STATS
+
+logger = logging.getLogger(__name__)
+
+JSONRPC_VERSION = '2.0'
+CANCEL_METHOD = '$/cancelRequest'
+
+
+async def read_message(reader: asyncio.StreamReader) -> Optional[dict]:
+    """Reads one message framed by a `Content-Length` header; returns None once the stream is closed."""
+    while True:
+        length = None
+        while True:
+            line = await reader.readline()
+            if not line:
+                return None
+            line = line.strip()
+            if not line:
+                if length is None:
+                    continue
+                break
+            name, _, value = line.partition(b':')
+            if name.strip().lower() == b'content-length':
+                length = int(value)
+        try:
+            body = await reader.readexactly(length)
+        except asyncio.IncompleteReadError:
+            return None
+        try:
+            return json.loads(body)
+        except ValueError:
+            logger.warning('Ignoring message that is not valid JSON')
+
+
+class AsyncEndpoint:
+    """JSON-RPC endpoint running on an asyncio event loop.
+
+    Messages are handled in the order they arrive, each in its own task, with handlers running inline on the loop: they
+    are expected to answer from data prepared by the analysis, which runs on its own executor. Handlers returning a
+    callable have it run on a small thread pool instead. A `$/cancelRequest` is handled as soon as it is read, so
+    requests still waiting behind others, or on the pool, are answered with a cancellation error without running.
+
+    `notify` may be called from any thread; messages sent before the endpoint is connected are held back until then."""
+    requests: Dict[object, asyncio.Task]
+    tasks: Set[asyncio.Task]
+
+    def __init__(self, dispatcher: MethodDispatcher, max_workers: int = 4):
+        self.dispatcher = dispatcher
+        self.requests = dict()
+        self.tasks = set()
+        self.closed = False
+        self._executor = futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='request')
+        self._loop = None
+        self._thread = None
+        self._reader = None
+        self._writer = None
+        self._backlog: List[dict] = []
+        self._lock = threading.Lock()
+        self._next_id = 0
+
+    async def run(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Handles messages until the stream is closed or `close` is called."""
+        with self._lock:
+            self._loop = asyncio.get_running_loop()
+            self._thread = threading.get_ident()
+            self._reader, self._writer = reader, writer
+            backlog, self._backlog = self._backlog, []
+        for message in backlog:
+            self._write(message)
+        try:
+            while True:
+                message = await read_message(reader)
+                if message is None:
+                    break
+                self.consume(message)
+            # Let the messages read so far finish, as the last of them is usually `exit`
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+        finally:
+            self.close()
+            with self._lock:
+                self._writer = None
+            writer.close()
+
+    def close(self):
+        """Stops reading messages; must be called from the loop, typically by the `exit` handler."""
+        if not self.closed:
+            self.closed = True
+            self._executor.shutdown(wait=False)
+            if self._reader is not None:
+                self._reader.feed_eof()
+
+    def notify(self, method: str, params=None):
+        message = dict(jsonrpc=JSONRPC_VERSION, method=method)
+        if params is not None:
+            message['params'] = params
+        self.send(message)
+
+    def request(self, method: str, params=None):
+        """Sends a request to the client; its response is ignored."""
+        with self._lock:
+            self._next_id += 1
+            msg_id = f'mlsp-{self._next_id}'
+        message = dict(jsonrpc=JSONRPC_VERSION, id=msg_id, method=method)
+        if params is not None:
+            message['params'] = params
+        self.send(message)
+
+    def send(self, message: dict):
+        with self._lock:
+            if self._loop is None:
+                self._backlog.append(message)
+                return
+            if self._writer is None:
+                return
+            if threading.get_ident() != self._thread:
+                self._loop.call_soon_threadsafe(self._write, message)
+                return
+        self._write(message)
+
+    def consume(self, message: dict):
+        if message.get('jsonrpc') != JSONRPC_VERSION:
+            logger.warning('Unknown message type %s', message)
+            return
+        if 'method' not in message:
+            logger.debug('Ignoring response %s', message)
+        elif message['method'] == CANCEL_METHOD:
+            self._cancel((message.get('params') or {}).get('id'))
+        elif 'id' in message:
+            self.requests[message['id']] = self._spawn(
+                self._handle_request(message['id'], message['method'], message.get('params')))
+        else:
+            self._spawn(self._handle_notification(message['method'], message.get('params')))
+
+    def _spawn(self, coroutine) -> asyncio.Task:
+        task = self._loop.create_task(coroutine)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    async def _handle_notification(self, method: str, params):
+        try:
+            handler = self.dispatcher[method]
+        except KeyError:
+            logger.warning('Ignoring notification for unknown method %s', method)
+            return
+        try:
+            result = handler(params)
+            if callable(result):
+                await self._loop.run_in_executor(self._executor, contextvars.copy_context().run, result)
+        except Exception:
+            logger.exception('Failed to handle notification %s', method)
+
+    async def _handle_request(self, msg_id, method: str, params):
+        response = dict(jsonrpc=JSONRPC_VERSION, id=msg_id)
+        try:
+            try:
+                handler = self.dispatcher[method]
+            except KeyError:
+                raise JsonRpcMethodNotFound.of(method)
+            result = handler(params)
+            if callable(result):
+                result = await self._loop.run_in_executor(self._executor, contextvars.copy_context().run, result)
+            response['result'] = result
+        except asyncio.CancelledError:
+            return  # Answered by `_cancel`
+        except JsonRpcException as e:
+            response['error'] = e.to_dict()
+        except Exception:
+            logger.exception('Failed to handle request %s', msg_id)
+            response['error'] = JsonRpcInternalError.of(sys.exc_info()).to_dict()
+        # Whoever takes the request out of the table answers it
+        if self.requests.pop(msg_id, None) is not None:
+            self._write(response)
+            if self._writer is not None:
+                await self._writer.drain()
+
+    def _cancel(self, msg_id):
+        task = self.requests.pop(msg_id, None)
+        if task is None:
+            return
+        task.cancel()
+        logger.debug('Cancelled request %s', msg_id)
+        self._write(dict(jsonrpc=JSONRPC_VERSION, id=msg_id, error=JsonRpcRequestCancelled().to_dict()))
+
+    def _write(self, message: dict):
+        if self._writer is None or self._writer.is_closing():
+            return
+        with STATS.phase('jsonrpc_write'):
+            body = json.dumps(message).encode('utf8')
+            self._writer.write(b'Content-Length: %d\r\n\r\n' % len(body) + body)
@@ -0,0 +1,78 @@
+import logging
+import os
+import threading
+from stat import S_ISREG
+from typing import Dict, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class FileStat(NamedTuple):
+    """What identifies a version of a file on the disk."""
+    mtime: int
+    size: int
+    inode: int
+
+
+class FileSystem:
+    """Disk access of the analysis, with stat results memoized by path.
+
+    When the client reports file changes through `workspace/didChangeWatchedFiles`, `watched` is set and results are
+    kept until `invalidate` is called for the file; otherwise they are only kept for the duration of one build, so
+    that the files probed by both the pre-parse and the evaluation are only probed once. Contents are read fresh, and
+    cached in parsed form by the workspace index under the same `FileStat`."""
+    entries: Dict[str, Optional[FileStat]]
+
+    def __init__(self, watched: bool = False):
+        self.watched = watched
+        self.entries = dict()
+        self.stats = 0
+        self.hits = 0
+        self.reads = 0
+        self._lock = threading.Lock()
+
+    def stat(self, path: str) -> Optional[FileStat]:
+        """Returns None if there is no regular file at `path`."""
+        with self._lock:
+            if path in self.entries:
+                self.hits += 1
+                return self.entries[path]
+            self.stats += 1
+        try:
+            result = os.stat(path)
+        except OSError:
+            stat = None
+        else:
+            stat = FileStat(result.st_mtime_ns, result.st_size, result.st_ino) if S_ISREG(result.st_mode) else None
+        with self._lock:
+            self.entries[path] = stat
+        return stat
+
+    def isfile(self, path: str) -> bool:
+        return self.stat(path) is not None
+
+    def read(self, path: str) -> str:
+        with self._lock:
+            self.reads += 1
+        with open(path, encoding='utf8') as f:
+            return f.read()
+
+    def invalidate(self, path: Optional[str] = None):
+        """Forgets about a file, or everything below a directory; about everything without `path`."""
+        with self._lock:
+            if path is None:
+                self.entries.clear()
+                return
+            prefix = path.rstrip(os.sep) + os.sep
+            for name in [name for name in self.entries if name == path or name.startswith(prefix)]:
+                del self.entries[name]
+
+    def revalidate(self):
+        """Called at the start of a build: without change notifications, nothing is known to be unchanged."""
+        if not self.watched:
+            self.invalidate()
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return dict(watched=self.watched, cached=len(self.entries), stats=self.stats, hits=self.hits,
+                        reads=self.reads)
@@ -0,0 +1,64 @@
+import logging
+import sys
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Set, Tuple
+
+from mlsp.ast import BuildFile
+from mlsp.visitors import NamesVisitor
+
+logger = logging.getLogger(__name__)
+
+
+class FileNames(NamedTuple):
+    digest: str
+    defined: FrozenSet[str]
+    used: FrozenSet[str]
+
+
+class DependencyGraph:
+    """File-level dependencies between the build files of a finished build.
+
+    A file depends on the file whose `subdir()` call entered it, and on every file evaluated before it that assigns a
+    variable it reads. Names are only collected again for files whose text changed since the last update."""
+    order: Dict[str, Tuple[int, ...]]
+    names: Dict[str, FileNames]
+    children: Dict[str, List[str]]
+    readers: Dict[str, List[str]]
+
+    def __init__(self):
+        self.order = dict()
+        self.names = dict()
+        self.children = dict()
+        self.readers = dict()
+
+    def updated(self, files: Dict[str, BuildFile]) -> 'DependencyGraph':
+        graph = DependencyGraph()
+        names, children, readers = graph.names, graph.children, graph.readers
+        for name, build_file in files.items():
+            entry = self.names.get(name)
+            if entry is None or entry.digest != build_file.digest:
+                visitor = NamesVisitor()
+                build_file.codeblock.accept(visitor)
+                entry = FileNames(build_file.digest, frozenset(map(sys.intern, visitor.defined)),
+                                  frozenset(map(sys.intern, visitor.used)))
+            names[name] = entry
+            if build_file.parent is not None:
+                children.setdefault(build_file.parent, []).append(name)
+            for variable in entry.used:
+                readers.setdefault(variable, []).append(name)
+        graph.order = {name: build_file.order for name, build_file in files.items()}
+        return graph
+
+    def dependents(self, changed: Iterable[str]) -> Set[str]:
+        """Returns the changed files along with every file downstream of them."""
+        affected = set()
+        stack = [name for name in changed if name in self.order]
+        while stack:
+            name = stack.pop()
+            if name in affected:
+                continue
+            affected.add(name)
+            stack.extend(self.children.get(name, ()))
+            order = self.order[name]
+            for variable in self.names[name].defined:
+                stack.extend(reader for reader in self.readers.get(variable, ()) if self.order[reader] > order)
+        return affected
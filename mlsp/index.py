@@ -0,0 +1,108 @@
+import hashlib
+import logging
+import os
+import pickle
+import sys
+import zlib
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from mesonbuild import coredata, mparser
+
+from mlsp.cache import content_hash
+from mlsp.fs import FileStat
+from mlsp.visitors import SubdirsVisitor, VariablesVisitor
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 4
+# Trees are pickled Meson objects, only valid for the Meson and Python versions that wrote them
+HEADER = (FORMAT_VERSION, coredata.version, tuple(sys.version_info[:2]))
+
+
+class IndexEntry(NamedTuple):
+    stat: FileStat
+    hash: str
+    # The parsed tree, pickled and compressed: a few kilobytes instead of a hundred or so as live nodes
+    tree: bytes
+    assignments: List[Tuple[str, int, int]]
+    subdirs: List[str]
+
+    def codeblock(self) -> mparser.CodeBlockNode:
+        """A fresh copy of the tree, about ten times cheaper than parsing the file again."""
+        return pickle.loads(zlib.decompress(self.tree))
+
+
+class WorkspaceIndex:
+    """Per-file analysis results of a workspace, persisted between server runs.
+
+    Entries are keyed by absolute path and considered fresh as long as the file's mtime, size and inode are unchanged,
+    so that unchanged files are neither read nor parsed again after a restart. Callers pass the stat results in, as
+    memoized by `mlsp.fs.FileSystem`."""
+    entries: Dict[str, IndexEntry]
+
+    def __init__(self, root_uri: str, cache_dir: Optional[Path] = None):
+        self.path = None
+        if cache_dir is not None:
+            self.path = Path(cache_dir) / (hashlib.sha1(root_uri.encode('utf8')).hexdigest() + '.pickle')
+        self.entries = dict()
+        self.dirty = False
+
+    def load(self) -> bool:
+        if self.path is None or not self.path.is_file():
+            return False
+        try:
+            with self.path.open('rb') as f:
+                # Read on its own first, the entries may not even load with other versions
+                header = pickle.load(f)
+                if header != HEADER:
+                    logger.info('Ignoring workspace index %s written with %s', self.path, header)
+                    return False
+                entries = pickle.load(f)
+        except Exception:
+            logger.exception('Could not load workspace index %s', self.path)
+            return False
+        self.entries = entries
+        logger.info('Loaded %d entries from workspace index %s', len(entries), self.path)
+        return True
+
+    def save(self):
+        if self.path is None or not self.dirty:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix('.tmp')
+        with tmp.open('wb') as f:
+            pickle.dump(HEADER, f, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(self.entries, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self.path)
+        self.dirty = False
+
+    def lookup(self, path: str, stat: Optional[FileStat]) -> Optional[IndexEntry]:
+        """Returns the entry for a file if it is still fresh, dropping it otherwise."""
+        entry = self.entries.get(path)
+        if entry is None:
+            return None
+        if stat is not None and stat == entry.stat:
+            return entry
+        del self.entries[path]
+        self.dirty = True
+        return None
+
+    def record(self, path: str, stat: Optional[FileStat], code: str, codeblock: mparser.CodeBlockNode):
+        if stat is None:
+            return
+        digest = content_hash(code)
+        entry = self.entries.get(path)
+        if entry is not None and entry.hash == digest and entry.stat == stat:
+            return
+        variables = VariablesVisitor()
+        subdirs = SubdirsVisitor()
+        codeblock.accept(variables)
+        codeblock.accept(subdirs)
+        self.entries[path] = IndexEntry(
+            stat, digest,
+            zlib.compress(pickle.dumps(codeblock, protocol=pickle.HIGHEST_PROTOCOL), 1),
+            [(sys.intern(v.var_name), v.lineno, v.colno) for v in variables.variables],
+            subdirs.subdirs
+        )
+        self.dirty = True
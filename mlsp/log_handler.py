@@ -1,28 +1,91 @@
 import logging
+import queue
+import threading
+from contextvars import ContextVar
 from logging import LogRecord
+from typing import Optional
 
-from pyls_jsonrpc.endpoint import Endpoint
+from mlsp.consts import MessageType
+
+# Server on whose behalf the current code runs, set for each connection and carried over to the threads working for it
+current_server: ContextVar = ContextVar('current_server', default=None)
 
 
 class LanguageServerLoggingHandler(logging.Handler):
-    def __init__(self, endpoint: Endpoint, level=logging.NOTSET):
+    """Forwards log records to the client in batches, from a background thread.
+
+    Records are queued without blocking the logging thread and sent every `interval` seconds as one
+    `window/logMessage` per message type. When the queue is full, records are dropped and the number of dropped
+    records is reported with the next batch. Errors are additionally shown to the user with `window/showMessage`.
+
+    With an `owner`, only the records logged on behalf of that server are forwarded, for clients sharing the process."""
+
+    def __init__(self, endpoint: 'mlsp.endpoint.AsyncEndpoint', level=logging.NOTSET, interval: float = 0.5,
+                 capacity: int = 1000, owner: 'Optional[mlsp.server.MesonLanguageServer]' = None):
         self.endpoint = endpoint
+        self.owner = owner
+        self.interval = interval
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=capacity)
+        self._stopped = threading.Event()
         super().__init__(level)
+        self._thread = threading.Thread(target=self._run, name='lsp-log', daemon=True)
+        self._thread.start()
 
     def emit(self, record: LogRecord):
         if record.module.endswith("endpoint"):
             return  # Prevent notification loops
-        self.endpoint.notify("window/showMessage", {
-            'type': self._get_message_level(record.levelno),
-            'message': self.format(record)
-        })
+        if self.owner is not None and current_server.get() is not self.owner:
+            return
+        try:
+            message = self.format(record)
+        except Exception:
+            self.handleError(record)
+            return
+        try:
+            self._queue.put_nowait((record.levelno, message))
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self):
+        records = []
+        while True:
+            try:
+                records.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        dropped, self.dropped = self.dropped, 0
+        if not records and not dropped:
+            return
+        batches = {}
+        for levelno, message in records:
+            batches.setdefault(self._get_message_level(levelno), []).append(message)
+            if levelno >= logging.ERROR:
+                self.endpoint.notify("window/showMessage", {'type': MessageType.Error, 'message': message})
+        if dropped:
+            batches.setdefault(MessageType.Warning, []).append(f"{dropped} log records dropped")
+        for message_type in sorted(batches):
+            self.endpoint.notify("window/logMessage", {
+                'type': message_type,
+                'message': '\n'.join(batches[message_type])
+            })
+
+    def close(self):
+        self._stopped.set()
+        self._thread.join(self.interval * 2)
+        super().close()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.flush()
+        self.flush()
 
     @staticmethod
     def _get_message_level(level):
-        if level > logging.ERROR:
-            return 1
-        if level > logging.WARNING:
-            return 2
-        if level > logging.INFO:
-            return 3
-        return 4
+        if level >= logging.ERROR:
+            return MessageType.Error
+        if level >= logging.WARNING:
+            return MessageType.Warning
+        if level >= logging.INFO:
+            return MessageType.Info
+        return MessageType.Log
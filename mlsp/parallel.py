@@ -0,0 +1,103 @@
+import logging
+import os
+from concurrent import futures
+from pathlib import Path
+from typing import Callable, List, Mapping, Optional, Tuple
+
+from mesonbuild import environment, mesonlib, mparser
+
+from mlsp.cache import parse_code
+from mlsp.visitors import SubdirsVisitor
+
+logger = logging.getLogger(__name__)
+
+
+def parse_build_file(absname: str, subdir: str) -> Tuple[str, str, Optional[str], Optional[mparser.CodeBlockNode],
+                                                           List[str]]:
+    """Reads and parses a build file in a worker process."""
+    try:
+        with open(absname, encoding='utf8') as f:
+            code = f.read()
+    except OSError:
+        return absname, subdir, None, None, []
+    codeblock = parse_code(absname, code, subdir)
+    visitor = SubdirsVisitor()
+    codeblock.accept(visitor)
+    return absname, subdir, code, codeblock, visitor.subdirs
+
+
+class ParallelParser:
+    """Pre-parses the `subdir()` tree of a workspace across a process pool.
+
+    The tree is discovered from the literal arguments of `subdir()` calls, and the subdirectories of a file are
+    submitted as soon as it has been parsed. Fresh files are taken from the workspace index and open documents from
+    the parse cache; every other file is parsed by the pool and recorded into the index, where the interpreter then
+    picks it up during the ordered evaluation."""
+    executor: Optional[futures.ProcessPoolExecutor]
+
+    def __init__(self, workspace: 'mlsp.workspace.Workspace', workers: int):
+        self.workspace = workspace
+        self.workers = workers
+        self.executor = None
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+    def prefetch(self, source_root: str, documents: Mapping[str, str],
+                 cancelled: Optional[Callable[[], bool]] = None) -> int:
+        """Parses every stale build file reachable from the root, except the open `documents`; returns the number of
+        files parsed."""
+        if self.workers <= 1:
+            return 0
+        queue = ['']
+        seen = set()
+        pending = set()
+        parsed = 0
+        while queue or pending:
+            while queue:
+                subdir = queue.pop()
+                absname = os.path.join(source_root, subdir, environment.build_filename)
+                if absname in seen:
+                    continue
+                seen.add(absname)
+                children = self._known_subdirs(absname, subdir, documents)
+                if children is not None:
+                    queue.extend(os.path.join(subdir, child) for child in children)
+                elif self.workspace.fs.isfile(absname):
+                    if self.executor is None:
+                        self.executor = futures.ProcessPoolExecutor(max_workers=self.workers)
+                    pending.add(self.executor.submit(parse_build_file, absname, subdir))
+            if not pending:
+                break
+            if cancelled is not None and cancelled():
+                for future in pending:
+                    future.cancel()
+                break
+            done, pending = futures.wait(pending, return_when=futures.FIRST_COMPLETED)
+            for future in done:
+                absname, subdir, code, codeblock, children = future.result()
+                if codeblock is None:
+                    continue
+                parsed += 1
+                self.workspace.index.record(absname, self.workspace.fs.stat(absname), code, codeblock)
+                queue.extend(os.path.join(subdir, child) for child in children)
+        logger.debug('Pre-parsed %d build files', parsed)
+        return parsed
+
+    def _known_subdirs(self, absname: str, subdir: str, documents: Mapping[str, str]) -> Optional[List[str]]:
+        text = documents.get(Path(absname).as_uri())
+        if text is not None:
+            try:
+                codeblock = self.workspace.parse_cache.parse(absname, text, subdir)
+            except mesonlib.MesonException:
+                return []
+        else:
+            entry = self.workspace.index.lookup(absname, self.workspace.fs.stat(absname))
+            if entry is None:
+                return None
+            return entry.subdirs
+        visitor = SubdirsVisitor()
+        codeblock.accept(visitor)
+        return visitor.subdirs
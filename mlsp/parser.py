@@ -0,0 +1,301 @@
+import itertools
+import logging
+import re
+import zlib
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from mesonbuild import mparser, mesonlib
+
+from mlsp.visitors import FileIDGenerator
+
+logger = logging.getLogger(__name__)
+
+# Strings and comments, which may hold brackets and keywords that mean nothing. Strings left open are taken to end
+# with their line, so that a quote being typed does not change how the rest of the file is split
+MASKED = re.compile(r"'''[\s\S]*?(?:'''|\Z)|'(?:\\.|[^'\\\n])*(?:'|$)|#[^\n]*", re.MULTILINE)
+# Strings as the lexer finds them, which may span lines
+STRINGS = re.compile(r"'''[\s\S]*?'''|'(?:\\.|[^'\\])*'|#[^\n]*")
+BLOCK_START = {'if', 'foreach'}
+BLOCK_END = {'endif', 'endforeach'}
+BLOCK_KEYWORDS = BLOCK_START | BLOCK_END | {'elif', 'else'}
+FIRST_WORD = re.compile(r'\s*([A-Za-z_][A-Za-z_0-9]*)')
+ASSIGNMENT = re.compile(r'\s*[A-Za-z_][A-Za-z_0-9]*\s*\+?=(?!=)')
+# Statements are parsed in runs of about this many, ending after a statement whose hash is a multiple of it, so that
+# the runs an edit does not touch keep their boundaries
+RUN_LENGTH = 16
+TREE = (mparser.BaseNode, mparser.Token)
+
+
+class ErrorNode(mparser.BaseNode):
+    """Stands for statements that could not be parsed; the statements around it are parsed on their own."""
+
+    def __init__(self, subdir: str, lineno: int, colno: int, message: str):
+        self.subdir = subdir
+        self.lineno = lineno
+        self.colno = colno
+        self.message = message
+
+
+def _mask(match) -> str:
+    """Blanks a string or a comment, keeping the quote a string starts with."""
+    text = match.group()
+    kept = 0 if text[0] == '#' else 1
+    if '\n' not in text:
+        return text[:kept] + ' ' * (len(text) - kept)
+    return text[:kept] + '\n'.join(' ' * len(line) for line in text[kept:].split('\n'))
+
+
+def _depth(line: str) -> int:
+    """How many more brackets a line opens than it closes."""
+    return (line.count('(') + line.count('[') + line.count('{') -
+            line.count(')') - line.count(']') - line.count('}'))
+
+
+def mask(code: str) -> str:
+    """Code with strings and comments blanked, so that every character keeps its position."""
+    return MASKED.sub(_mask, code)
+
+
+def _lines(code: str) -> Tuple[List[str], List[str]]:
+    """Lines of a build file, with their line endings, along with the same lines with strings and comments blanked."""
+    lines = [line + '\n' for line in code.split('\n')]
+    lines[-1] = lines[-1][:-1]
+    return lines, mask(code).split('\n')
+
+
+def _first_word(line: str) -> str:
+    match = FIRST_WORD.match(line)
+    return match.group(1) if match is not None else ''
+
+
+def starts_statement(line: str) -> bool:
+    """Whether a line can only be the start of a statement, being an assignment or starting with a block keyword."""
+    return ASSIGNMENT.match(line) is not None or _first_word(line) in BLOCK_KEYWORDS
+
+
+def _continued(line: str) -> bool:
+    return line.rstrip().endswith('\\')
+
+
+def split_statements(code: str) -> Iterator[Tuple[int, str]]:
+    """Splits a build file into its top-level statements, each with the 0-based line it starts on; blocks are one
+    statement. Valid files are split where the parser would split them, unless they have strings spanning lines."""
+    lines, masked = _lines(code)
+    start = 0
+    depth = 0
+    blocks = 0
+    for i, line in enumerate(masked):
+        # Brackets left open while typing would otherwise run to the end of the file: an assignment or a block keyword
+        # cannot be inside brackets, so it starts a new statement
+        if depth and starts_statement(line):
+            depth = 0
+            if blocks == 0:
+                yield start, ''.join(lines[start:i])
+                start = i
+        if depth == 0:
+            word = _first_word(line)
+            if word in BLOCK_START:
+                blocks += 1
+            elif word in BLOCK_END and blocks:
+                blocks -= 1
+        depth = max(depth + _depth(line), 0)
+        if depth == 0 and blocks == 0 and not _continued(line):
+            yield start, ''.join(lines[start:i + 1])
+            start = i + 1
+    if start < len(lines) and ''.join(lines[start:]):
+        yield start, ''.join(lines[start:])
+
+
+def split_runs(code: str) -> Iterator[Tuple[int, str]]:
+    """Groups the statements of a build file in runs of about `RUN_LENGTH`, each with the line it starts on."""
+    start = None
+    run = []
+    for line, text in split_statements(code):
+        if start is None:
+            start = line
+        run.append(text)
+        if zlib.crc32(text.encode('utf8')) % RUN_LENGTH == 0:
+            yield start, ''.join(run)
+            start, run = None, []
+    if run:
+        yield start, ''.join(run)
+
+
+def _loose_statements(code: str) -> Iterator[Tuple[int, str]]:
+    """Splits lines that do not parse into the simple statements they seem to hold, ignoring block keywords and
+    bracket runs left open: a line indented no more than the first line of an open run starts a new statement."""
+    lines, masked = _lines(code)
+    start = None
+    indent = 0
+    depth = 0
+    for i, line in enumerate(masked):
+        stripped = line.lstrip()
+        if not stripped:
+            continue
+        if start is not None and len(line) - len(stripped) <= indent:
+            yield start, ''.join(lines[start:i])
+            start = None
+        if start is None:
+            if _first_word(stripped) in BLOCK_KEYWORDS:
+                continue
+            start, indent, depth = i, len(line) - len(stripped), 0
+        depth += _depth(line)
+        if depth <= 0 and not _continued(line):
+            yield start, ''.join(lines[start:i + 1])
+            start = None
+    if start is not None:
+        yield start, ''.join(lines[start:])
+
+
+def _spanning(code: str) -> Set[str]:
+    """Strings spanning lines in a file, which the lexer still accepts, if it has no quote left open."""
+    found = set()
+    for match in STRINGS.finditer(code):
+        text = match.group()
+        if text[0] == "'" and not text.startswith("'''") and '\n' in text:
+            found.add(text)
+    if found and "'" in STRINGS.sub('', code):
+        return set()
+    return found
+
+
+def _move(node, lines: int):
+    """Moves a tree that was just parsed down by `lines`."""
+    node.lineno += lines
+    for value in vars(node).values():
+        if isinstance(value, TREE):
+            _move(value, lines)
+        elif isinstance(value, (list, dict)):
+            for item in (value.values() if isinstance(value, dict) else value):
+                if isinstance(item, TREE):
+                    _move(item, lines)
+
+
+def _shifted(node, lines: int, prefix: str):
+    """Copy of a tree moved down by `lines`, with its `ast_id`s stamped again under `prefix`."""
+    state = dict(vars(node))
+    state['lineno'] += lines
+    ast_id = state.get('ast_id')
+    if ast_id is not None:
+        # Keeps the line the statements were first parsed from and the counter per node type, which tell nodes apart
+        state['ast_id'] = ':'.join([prefix] + ast_id.rsplit(':', 2)[-2:])
+    for name, value in state.items():
+        if isinstance(value, TREE):
+            state[name] = _shifted(value, lines, prefix)
+        elif isinstance(value, list):
+            state[name] = [_shifted(item, lines, prefix) if isinstance(item, TREE) else item for item in value]
+        elif isinstance(value, dict):
+            state[name] = {key: _shifted(item, lines, prefix) if isinstance(item, TREE) else item
+                           for key, item in value.items()}
+    copy = object.__new__(type(node))
+    copy.__dict__ = state
+    return copy
+
+
+class Statements:
+    """Parsed run of top-level statements of a build file, or what could be recovered of it."""
+    __slots__ = ('line', 'nodes')
+
+    def __init__(self, line: int, nodes: List[mparser.BaseNode]):
+        self.line = line
+        self.nodes = nodes
+
+
+class IncrementalParser:
+    """Parses a build file in runs of top-level statements, so that an error only loses the statement it is in, and
+    parsing it again after an edit only parses the runs whose text changed.
+
+    A run that does not parse is replaced by an `ErrorNode` holding the error, followed by whatever simple statements
+    it can be split into that do, which are reused across edits the same way. Unchanged runs are reused as they are,
+    or copied if lines were inserted or removed above them. `ast_id`s are stamped under a prefix unique to each parse
+    or copy of a run, so that they stay unique within the file across reuses."""
+    runs: Dict[str, Statements]
+    pieces: Dict[str, Statements]
+
+    def __init__(self, filename: str, subdir: str):
+        self.filename = filename
+        self.subdir = subdir
+        self.runs = dict()
+        self.pieces = dict()
+        self.parsed = 0
+        self.reused = 0
+        self._ids = itertools.count()
+        self._previous_pieces = dict()
+        self._spanning = None
+
+    def parse(self, code: str) -> mparser.CodeBlockNode:
+        codeblock = mparser.CodeBlockNode(mparser.Token('eof', self.subdir, 0, 1, 0, (0, 0), ''))
+        codeblock.ast_id = f'{self.filename}:CodeBlockNode#0'
+        previous, self.runs = self.runs, dict()
+        self._previous_pieces, self.pieces = self.pieces, dict()
+        for line, text in split_runs(code):
+            if not text.isspace():
+                codeblock.lines.extend(self._reuse(previous, self.runs, line, text, self._parse_run))
+        self._previous_pieces = dict()
+        if not any(isinstance(node, ErrorNode) for node in codeblock.lines):
+            return codeblock
+        # A quote being typed pairs with the next one as a string spanning lines, so the file is only parsed as a
+        # whole again for such strings that were in the last version of it that parsed that way
+        spanning = _spanning(code) if self._spanning != set() else set()
+        if spanning and (self._spanning is None or spanning & self._spanning):
+            try:
+                block = mparser.Parser(code, self.subdir).parse()
+            except mesonlib.MesonException:
+                if self._spanning is None:
+                    self._spanning = set()
+                return codeblock
+            self._spanning = spanning
+            block.accept(FileIDGenerator(self._prefix()))
+            return block
+        return codeblock
+
+    def _reuse(self, previous: Dict[str, Statements], current: Dict[str, Statements], line: int, text: str,
+               parse: Callable[[int, str], List[mparser.BaseNode]]) -> List[mparser.BaseNode]:
+        """Nodes of `text` starting on `line`, from what the previous parse made of the same text if it can."""
+        statements = previous.get(text)
+        if statements is None:
+            statements = Statements(line, parse(line, text))
+            self.parsed += 1
+        else:
+            if statements.line != line:
+                prefix = self._prefix()
+                statements = Statements(line, [_shifted(node, line - statements.line, prefix)
+                                               for node in statements.nodes])
+            self.reused += 1
+        current.setdefault(text, statements)
+        return statements.nodes
+
+    def _prefix(self) -> str:
+        return f'{self.filename}:{next(self._ids)}'
+
+    def _parse_run(self, line: int, text: str) -> List[mparser.BaseNode]:
+        try:
+            return self._parse_lines(line, text)
+        except mesonlib.MesonException as me:
+            error = ErrorNode(self.subdir, getattr(me, 'lineno', 1) + line, getattr(me, 'colno', 0),
+                              str(me).split('\n')[0])
+        nodes = [error]
+        for offset, lines in _loose_statements(text):
+            nodes.extend(self._reuse(self._previous_pieces, self.pieces, line + offset, lines, self._parse_piece))
+        return nodes
+
+    def _parse_piece(self, line: int, text: str) -> List[mparser.BaseNode]:
+        try:
+            return self._parse_lines(line, text)
+        except mesonlib.MesonException:
+            return []
+
+    def _parse_lines(self, line: int, text: str) -> List[mparser.BaseNode]:
+        block = mparser.Parser(text, self.subdir).parse()
+        block.accept(FileIDGenerator(f'{self._prefix()}:{line}'))
+        if line:
+            for node in block.lines:
+                _move(node, line)
+        return block.lines
+
+
+def errors(codeblock: Optional[mparser.CodeBlockNode]) -> List[ErrorNode]:
+    """Statements of a tree that could not be parsed."""
+    if codeblock is None:
+        return []
+    return [node for node in codeblock.lines if isinstance(node, ErrorNode)]
@@ -0,0 +1,34 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Progress:
+    """Reports a long analysis to the client as work done progress, if it supports it (`window.workDoneProgress`);
+    only one is reported at a time."""
+
+    def __init__(self, endpoint, enabled: bool = False):
+        self.endpoint = endpoint
+        self.enabled = enabled
+        self.token = None
+        self._count = 0
+
+    def begin(self, title: str, message: str = ''):
+        if not self.enabled or self.token is not None:
+            return
+        self._count += 1
+        self.token = f'mesonls-analysis-{self._count}'
+        self.endpoint.request('window/workDoneProgress/create', dict(token=self.token))
+        self._notify(dict(kind='begin', title=title, message=message))
+
+    def report(self, message: str):
+        if self.token is not None:
+            self._notify(dict(kind='report', message=message))
+
+    def end(self):
+        if self.token is not None:
+            self._notify(dict(kind='end'))
+            self.token = None
+
+    def _notify(self, value: dict):
+        self.endpoint.notify('$/progress', dict(token=self.token, value=value))
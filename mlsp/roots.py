@@ -0,0 +1,124 @@
+import logging
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, List, Optional
+from urllib import parse
+
+logger = logging.getLogger(__name__)
+
+
+def _path(uri: str) -> str:
+    return parse.unquote(parse.urlparse(uri).path)
+
+
+class Roots:
+    """Workspaces of the folders open in the client, each with its own analysis, by root URI.
+
+    A folder's workspace is created when a document in it is opened or a request asks for it. Once more than
+    `max_roots` are active, the least recently used one without open documents is closed; its folder stays known, and
+    its workspace is created again from the persisted index when needed. Documents outside every folder belong to the
+    first one."""
+    folders: List[str]
+    active: 'OrderedDict[str, mlsp.workspace.Workspace]'
+
+    def __init__(self, factory: Callable[[str], 'mlsp.workspace.Workspace'], max_roots: int = 8):
+        self.factory = factory
+        self.max_roots = max(max_roots, 1)
+        self.folders = []
+        self.active = OrderedDict()
+        self.evictions = 0
+        # Evictions counted by the workspaces closed so far
+        self.retired = dict()
+        self._lock = threading.RLock()
+
+    def add(self, root_uri: str):
+        """Adds a folder, analysed right away as long as there is room for it."""
+        with self._lock:
+            if root_uri in self.folders:
+                return
+            self.folders.append(root_uri)
+            if len(self.active) < self.max_roots:
+                self.get(root_uri)
+
+    def remove(self, root_uri: str):
+        """Removes a folder; its open documents move to the workspaces of the folders they belong to now."""
+        with self._lock:
+            if root_uri in self.folders:
+                self.folders.remove(root_uri)
+            workspace = self.active.pop(root_uri, None)
+            if workspace is None:
+                return
+            for document in list(workspace.documents.values()):
+                owner = self.for_document(document.uri)
+                owner.put_document(document)
+                owner.scheduler.schedule()
+        self._close(workspace)
+
+    def root_for(self, uri: str) -> str:
+        """The innermost folder a document is in."""
+        path = _path(uri)
+        with self._lock:
+            inside = [root for root in self.folders if (path + os.sep).startswith(_path(root).rstrip(os.sep) + os.sep)]
+            if inside:
+                return max(inside, key=len)
+            if self.folders:
+                return self.folders[0]
+            root = Path(path).parent.as_uri()
+            self.folders.append(root)
+            return root
+
+    def for_document(self, uri: str) -> 'mlsp.workspace.Workspace':
+        return self.get(self.root_for(uri))
+
+    def first(self) -> Optional['mlsp.workspace.Workspace']:
+        with self._lock:
+            return self.get(self.folders[0]) if self.folders else None
+
+    def get(self, root_uri: str) -> 'mlsp.workspace.Workspace':
+        """The workspace of a folder, created if it is not active."""
+        with self._lock:
+            workspace = self.active.get(root_uri)
+            if workspace is None:
+                logger.info('Activating root %s', root_uri)
+                workspace = self.active[root_uri] = self.factory(root_uri)
+            self.active.move_to_end(root_uri)
+            self._evict()
+            return workspace
+
+    def workspaces(self) -> List['mlsp.workspace.Workspace']:
+        with self._lock:
+            return list(self.active.values())
+
+    def close(self):
+        with self._lock:
+            workspaces, self.active = list(self.active.values()), OrderedDict()
+        for workspace in workspaces:
+            workspace.close()
+
+    def _evict(self):
+        # The root used last is the one being asked for
+        idle = [root for root, workspace in list(self.active.items())[:-1] if not workspace.documents]
+        for root in idle[:max(len(self.active) - self.max_roots, 0)]:
+            logger.info('Closing idle root %s', root)
+            self.evictions += 1
+            self._close(self.active.pop(root))
+
+    def _close(self, workspace: 'mlsp.workspace.Workspace'):
+        for kind, count in workspace.evictions().items():
+            self.retired[kind] = self.retired.get(kind, 0) + count
+        # The client would otherwise keep showing what the workspace published, with nobody left to update it
+        workspace.diagnostics.publish(dict())
+        workspace.close()
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            evictions = dict(self.retired, roots=self.evictions)
+            workspaces = dict()
+            for root, workspace in self.active.items():
+                for kind, count in workspace.evictions().items():
+                    evictions[kind] = evictions.get(kind, 0) + count
+                workspaces[root] = dict(documents=len(workspace.documents), closed=len(workspace.closed),
+                                        trees=len(workspace.parse_cache.entries), filesystem=workspace.fs.to_dict())
+            return dict(folders=list(self.folders), active=workspaces, evictions=evictions)
@@ -0,0 +1,145 @@
+from typing import Iterator, List, Optional, Tuple
+
+LEAF_SIZE = 1024
+
+
+class Rope:
+    """Immutable rope over text chunks, kept height-balanced like an AVL tree.
+
+    Every node caches its length and the number of '\\n' it contains, so offset and line lookups, slicing and edits
+    only walk a single path of the tree. Edits return a new rope sharing all untouched nodes with the old one."""
+    __slots__ = ('left', 'right', 'text', 'length', 'newlines', 'depth')
+
+    left: Optional['Rope']
+    right: Optional['Rope']
+    text: Optional[str]
+
+    def __init__(self, text: Optional[str] = None, left: 'Rope' = None, right: 'Rope' = None):
+        self.text = text
+        self.left = left
+        self.right = right
+        if text is not None:
+            self.length = len(text)
+            self.newlines = text.count('\n')
+            self.depth = 0
+        else:
+            self.length = left.length + right.length
+            self.newlines = left.newlines + right.newlines
+            self.depth = max(left.depth, right.depth) + 1
+
+    @classmethod
+    def from_text(cls, text: str) -> 'Rope':
+        return _balanced([cls(text[i:i + LEAF_SIZE]) for i in range(0, len(text), LEAF_SIZE)])
+
+    def __len__(self):
+        return self.length
+
+    def __str__(self):
+        return ''.join(self.leaves())
+
+    def leaves(self) -> Iterator[str]:
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if node.text is not None:
+                yield node.text
+            else:
+                stack.append(node.right)
+                stack.append(node.left)
+
+    def split(self, index: int) -> Tuple['Rope', 'Rope']:
+        if self.text is not None:
+            return Rope(self.text[:index]), Rope(self.text[index:])
+        if index <= self.left.length:
+            left, right = self.left.split(index)
+            return left, _join(right, self.right)
+        left, right = self.right.split(index - self.left.length)
+        return _join(self.left, left), right
+
+    def replace(self, start: int, end: int, text: str) -> 'Rope':
+        head, rest = self.split(start)
+        _, tail = rest.split(end - start)
+        return _join(_join(head, Rope.from_text(text)), tail)
+
+    def slice(self, start: int, end: int) -> str:
+        chunks = []
+        stack = [(self, 0)]
+        while stack:
+            node, offset = stack.pop()
+            if end <= offset or offset + node.length <= start:
+                continue
+            if node.text is not None:
+                chunks.append(node.text[max(start - offset, 0):end - offset])
+            else:
+                stack.append((node.right, offset + node.left.length))
+                stack.append((node.left, offset))
+        return ''.join(chunks)
+
+    def line_start(self, line: int) -> int:
+        """Offset of the first character of a line, lines being separated by '\\n'."""
+        if line <= 0:
+            return 0
+        if line > self.newlines:
+            return self.length
+        node, offset = self, 0
+        while node.text is None:
+            if line <= node.left.newlines:
+                node = node.left
+            else:
+                line -= node.left.newlines
+                offset += node.left.length
+                node = node.right
+        index = -1
+        for _ in range(line):
+            index = node.text.index('\n', index + 1)
+        return offset + index + 1
+
+    def line_of(self, offset: int) -> int:
+        """Number of the line containing an offset."""
+        node, line = self, 0
+        while node.text is None:
+            if offset < node.left.length:
+                node = node.left
+            else:
+                offset -= node.left.length
+                line += node.left.newlines
+                node = node.right
+        return line + node.text.count('\n', 0, offset)
+
+
+def _join(left: Rope, right: Rope) -> Rope:
+    if not left.length:
+        return right
+    if not right.length:
+        return left
+    if left.text is not None and right.text is not None and left.length + right.length <= LEAF_SIZE:
+        return Rope(left.text + right.text)
+    if left.depth > right.depth + 1:
+        return _rebalance(left.left, _join(left.right, right))
+    if right.depth > left.depth + 1:
+        return _rebalance(_join(left, right.left), right.right)
+    return Rope(left=left, right=right)
+
+
+def _rebalance(left: Rope, right: Rope) -> Rope:
+    # Single or double rotation, for subtrees whose depths differ by at most two
+    if left.depth > right.depth + 1:
+        if left.left.depth >= left.right.depth:
+            return Rope(left=left.left, right=Rope(left=left.right, right=right))
+        return Rope(left=Rope(left=left.left, right=left.right.left),
+                    right=Rope(left=left.right.right, right=right))
+    if right.depth > left.depth + 1:
+        if right.right.depth >= right.left.depth:
+            return Rope(left=Rope(left=left, right=right.left), right=right.right)
+        return Rope(left=Rope(left=left, right=right.left.left),
+                    right=Rope(left=right.left.right, right=right.right))
+    return Rope(left=left, right=right)
+
+
+def _balanced(leaves: List[Rope], start: int = 0, end: Optional[int] = None) -> Rope:
+    if end is None:
+        end = len(leaves)
+    if end - start <= 1:
+        return leaves[start] if end > start else Rope('')
+    middle = (start + end) // 2
+    return Rope(left=_balanced(leaves, start, middle), right=_balanced(leaves, middle, end))
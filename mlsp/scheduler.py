@@ -0,0 +1,89 @@
+import contextvars
+import functools
+import logging
+import threading
+import time
+from concurrent import futures
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class BuildCancelled(Exception):
+    """Raised from inside a build once a newer build has been requested."""
+
+
+class AnalysisScheduler:
+    """Debounces build requests and runs them one at a time on a dedicated thread.
+
+    Every call to `schedule` bumps the generation; a pending build only starts once no newer request arrived during
+    the debounce window, and a running build is told to stop through its `cancelled` callback as soon as it is
+    superseded. Superseded requests return from the queue without waiting."""
+
+    def __init__(self, build: Callable[[Callable[[], bool]], None], debounce: float = 0.2):
+        self.build = build
+        self.debounce = debounce
+        self.generation = 0
+        self.deadline = 0.
+        self.executor = futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='analysis')
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._pending = 0
+
+    def schedule(self, delay: Optional[float] = None):
+        with self._lock:
+            self.generation += 1
+            self.deadline = time.monotonic() + (self.debounce if delay is None else delay)
+            context = contextvars.copy_context()
+            try:
+                future = self.executor.submit(context.run, self._run, self.generation)
+            except RuntimeError:
+                return  # Shut down
+            # In the same context, so that the failure is logged to the client the build was for
+            future.add_done_callback(functools.partial(context.run, self._report))
+            self._pending += 1
+            # Wakes up the request waiting out its debounce window, now superseded
+            self._idle.notify_all()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Blocks until every scheduled build has either run or been superseded."""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._pending == 0, timeout)
+
+    def cancel(self):
+        with self._lock:
+            self.generation += 1
+            self._idle.notify_all()
+
+    def shutdown(self):
+        """Cancels pending and running builds; the scheduler cannot be used afterwards."""
+        with self._lock:
+            self.generation += 1
+            self.executor.shutdown(wait=False)
+            self._idle.notify_all()
+
+    @staticmethod
+    def _report(future: futures.Future):
+        """Logs the exception a build failed with, which its future would otherwise keep to itself."""
+        if not future.cancelled() and future.exception() is not None:
+            logger.error('Build failed', exc_info=future.exception())
+
+    def _is_superseded(self, generation: int) -> bool:
+        return self.generation != generation
+
+    def _run(self, generation: int):
+        try:
+            with self._idle:
+                while not self._is_superseded(generation) and time.monotonic() < self.deadline:
+                    self._idle.wait(self.deadline - time.monotonic())
+            if self._is_superseded(generation):
+                logger.debug('Skipping superseded build %d', generation)
+                return
+            try:
+                self.build(lambda: self._is_superseded(generation))
+            except BuildCancelled:
+                logger.debug('Build %d cancelled', generation)
+        finally:
+            with self._idle:
+                self._pending -= 1
+                self._idle.notify_all()
@@ -1,47 +1,142 @@
 import argparse
+import asyncio
+import contextvars
 import logging
+import os
 import sys
+import threading
 from pathlib import Path
-from typing import Optional
+from typing import BinaryIO, Callable, ContextManager, List, Optional
 
 from pyls_jsonrpc.dispatchers import MethodDispatcher
-from pyls_jsonrpc.endpoint import Endpoint
-from pyls_jsonrpc.streams import JsonRpcStreamReader, JsonRpcStreamWriter
 
-from . import consts
+from . import consts, signatures
 from .config import Config
-from .workspace import Workspace
+from .endpoint import AsyncEndpoint
+from .log_handler import current_server
+from .roots import Roots
+from .stats import STATS
 
 logger = logging.getLogger(__name__)
 
+# Files the client is asked to report changes to, when it can
+WATCHED_FILES = ['**/meson.build']
+
 
 def new_with_stdio(options: argparse.Namespace):
     logger.info('Starting Meson LS using stdin/stdout (%s)', repr(options))
     return MesonLanguageServer(sys.stdin.buffer, sys.stdout.buffer)
 
 
+def serve_tcp(host: str, port: int,
+              session: Optional[Callable[['MesonLanguageServer'], ContextManager]] = None):
+    """Serves every connection on its own server, with its own workspaces, until interrupted.
+
+    `session` gives a context wrapped around each connection, to attach per-client resources like logging."""
+
+    async def connected(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        logger.info('Connection from %s', writer.get_extra_info('peername'))
+        server = MesonLanguageServer()
+        if session is None:
+            await server.serve(reader, writer)
+        else:
+            with session(server):
+                await server.serve(reader, writer)
+        logger.info('Connection from %s closed', writer.get_extra_info('peername'))
+
+    async def listen():
+        tcp_server = await asyncio.start_server(connected, host, port)
+        logger.warning('Listening on %s', ', '.join(str(s.getsockname()) for s in tcp_server.sockets))
+        async with tcp_server:
+            await tcp_server.serve_forever()
+
+    asyncio.run(listen())
+
+
 class MesonLanguageServer(MethodDispatcher):
-    workspace: Optional[Workspace]
     config: Optional[Config]
 
-    def __init__(self, rx, tx):
-        self.workspace = None
+    def __init__(self, rx: Optional[BinaryIO] = None, tx: Optional[BinaryIO] = None):
+        self._roots = None
+        self._workspace_ready = threading.Event()
         self.config = None
 
-        self.rpc_reader = JsonRpcStreamReader(rx)
-        self.rpc_writer = JsonRpcStreamWriter(tx)
-        self.endpoint = Endpoint(self, self.rpc_writer.write, max_workers=64)
+        self.rx, self.tx = rx, tx
+        self.endpoint = AsyncEndpoint(self)
         self.shutdown = False
 
+    def __getitem__(self, item):
+        handler = super().__getitem__(item)
+        if not STATS.enabled:
+            return handler
+
+        def measured(params):
+            with STATS.request(item):
+                return handler(params)
+
+        return measured
+
+    @property
+    def roots(self) -> Optional[Roots]:
+        """The workspaces, waiting for them to be created if `initialize` has been answered already."""
+        if self.config is not None:
+            self._workspace_ready.wait()
+        return self._roots
+
+    @property
+    def workspace(self) -> Optional['mlsp.workspace.Workspace']:
+        """The workspace of the first folder."""
+        roots = self.roots
+        return roots.first() if roots is not None else None
+
+    def workspace_for(self, textDocument: dict) -> 'mlsp.workspace.Workspace':
+        """The workspace of the folder a document is in."""
+        return self.roots.for_document(textDocument['uri'])
+
     def start(self):
+        """Serves the streams the server was created with until the client exits."""
         logger.info('Starting')
-        self.rpc_reader.listen(self.endpoint.consume)
+        asyncio.run(self._serve_streams())
+
+    async def _serve_streams(self):
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader()
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), self.rx)
+        transport, protocol = await loop.connect_write_pipe(asyncio.streams.FlowControlMixin, self.tx)
+        await self.serve(reader, asyncio.StreamWriter(transport, protocol, reader, loop))
+
+    async def serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        # Every connection runs in its own task, so this only marks what runs on behalf of this one
+        current_server.set(self)
+        try:
+            await self.endpoint.run(reader, writer)
+        finally:
+            self.close()
+
+    def close(self):
+        self.endpoint.close()
+        if self._roots is not None:
+            self._roots.close()
 
     @staticmethod
     def capabilities():
         capabilities = {
-            'completionProvider': True,
-            'textDocumentSync': consts.TextDocumentSyncKind.INCREMENTAL
+            'completionProvider': {'triggerCharacters': ['.']},
+            'definitionProvider': True,
+            'documentSymbolProvider': True,
+            'foldingRangeProvider': True,
+            'hoverProvider': True,
+            'referencesProvider': True,
+            'semanticTokensProvider': {
+                'legend': {
+                    'tokenTypes': consts.SEMANTIC_TOKEN_TYPES,
+                    'tokenModifiers': consts.SEMANTIC_TOKEN_MODIFIERS
+                },
+                'full': {'delta': True}
+            },
+            'workspaceSymbolProvider': True,
+            'textDocumentSync': consts.TextDocumentSyncKind.INCREMENTAL,
+            'workspace': {'workspaceFolders': {'supported': True, 'changeNotifications': True}}
         }
         return capabilities
 
@@ -49,61 +144,192 @@ class MesonLanguageServer(MethodDispatcher):
         if logger.isEnabledFor(logging.DEBUG):
             logger.debug("Initializing: %s", repr(kwargs))
         else:
-            logger.info('Server initializing', repr(kwargs))
-        if 'rootUri' not in kwargs:
-            root_uri = Path(kwargs.get('rootPath')).as_uri()
-        else:
+            logger.info('Server initializing')
+        folders = [folder['uri'] for folder in kwargs.get('workspaceFolders') or []]
+        if kwargs.get('rootUri'):
             root_uri = kwargs.get('rootUri')
-        self.workspace = Workspace(root_uri, self.endpoint)
-        self.config = Config(root_uri, kwargs.get('initializationOptions', {}),
+        elif folders:
+            root_uri = folders[0]
+        else:
+            root_uri = Path(kwargs.get('rootPath')).as_uri()
+        self.config = Config(root_uri, kwargs.get('initializationOptions') or {},
                              kwargs.get('processId'),
                              kwargs.get('capabilities'))
+        folders = folders or [root_uri]
+        # Importing Meson takes longer than everything else at startup, so the response does not wait for it. The thread
+        # runs in the connection's context, so that what the workspaces log only reaches this client
+        threading.Thread(target=contextvars.copy_context().run, args=(self._create_workspaces, folders),
+                         name='workspace', daemon=True).start()
         return dict(capabilities=self.capabilities())
 
+    def _create_workspace(self, root_uri: str) -> 'mlsp.workspace.Workspace':
+        from .workspace import Workspace
+        return Workspace(root_uri, self.endpoint, debounce=self.config.analysis_debounce,
+                         cache_dir=self.config.cache_dir, jobs=self.config.jobs, watch_files=self.config.watch_files,
+                         progress=self.config.work_done_progress,
+                         max_closed_documents=self.config.max_closed_documents)
+
+    def _create_workspaces(self, folders: List[str]):
+        try:
+            roots = Roots(self._create_workspace, self.config.max_roots)
+            for root_uri in folders:
+                roots.add(root_uri)
+            self._roots = roots
+            if self.endpoint.closed:
+                roots.close()
+            else:
+                # Reading the signature tables imports Meson's interpreter, which the first completion would wait for
+                signatures.warm_up()
+        except:
+            logger.exception('Could not create the workspace')
+        finally:
+            self._workspace_ready.set()
+
     def m_initialized(self, **_kwargs):
-        pass
+        if self.config is not None and self.config.watch_files:
+            self.endpoint.request('client/registerCapability', dict(registrations=[dict(
+                id='mesonls-watched-files', method='workspace/didChangeWatchedFiles', registerOptions=dict(
+                    watchers=[dict(globPattern=pattern) for pattern in WATCHED_FILES]))]))
 
     def m_text_document__did_open(self, textDocument: dict):
-        self.workspace.update(
+        workspace = self.workspace_for(textDocument)
+        workspace.update(
             textDocument,
             dict(
                 text=textDocument.get('text'),
                 version=textDocument.get('version')))
-        self.workspace.build_ast()
+        workspace.scheduler.schedule()
 
     def m_text_document__did_close(self, textDocument):
-        self.workspace.pop_document(textDocument)
-        self.workspace.build_ast()
+        workspace = self.workspace_for(textDocument)
+        if workspace.pop_document(textDocument['uri']) is not None:
+            workspace.scheduler.schedule()
 
     def m_text_document__did_change(self, textDocument, contentChanges):
+        workspace = self.workspace_for(textDocument)
         for change in contentChanges:
-            self.workspace.update(textDocument, change)
-        self.workspace.build_ast()
+            workspace.update(textDocument, change)
+        workspace.scheduler.schedule()
 
     def m_text_document__did_save(self, textDocument):
-        self.workspace.documents.get(textDocument.get('uri')).refresh()
+        workspace = self.workspace_for(textDocument)
+        if workspace.refresh(textDocument.get('uri')):
+            workspace.scheduler.schedule()
 
     def m_workspace__did_change_watched_files(self, changes):
-        self.workspace.build_ast()
+        # Roots that are not active read the disk again once they are
+        active = dict(self.roots.active)
+        scheduled = set()
+        for change in changes:
+            workspace = active.get(self.roots.root_for(change.get('uri')))
+            if workspace is not None:
+                workspace.mark_changed(change.get('uri'))
+                scheduled.add(workspace)
+        for workspace in scheduled:
+            workspace.scheduler.schedule()
+
+    def m_workspace__did_change_workspace_folders(self, event):
+        for folder in event.get('removed') or []:
+            self.roots.remove(folder['uri'])
+        for folder in event.get('added') or []:
+            self.roots.add(folder['uri'])
 
     def m_text_document__hover(self, textDocument, position):
-        doc = self.workspace.get_document(textDocument.get('uri'))
-        start_pos, end_pos, word = doc.get_word_at_position(**position)
-        start_posd = doc.get_char_count_position(start_pos)
-        end_posd = doc.get_char_count_position(end_pos)
-        return dict(
-            contents=
-            f"{word} (from {start_posd[0]}:{start_posd[1]} to {end_posd[0]}:{end_posd[1]})"
-        )
-
-    def m_text_document__completion(self, **kwargs):
-        return self.workspace.symbols
+        workspace = self.workspace_for(textDocument)
+        symbols = self._symbols(workspace, textDocument)
+        symbol = self._symbol_at(workspace, symbols, textDocument, position)
+        if symbol is None:
+            return None
+        lines = [f"{symbol.name} = {definition.detail or '...'}  # {self._relative(workspace, definition.path)}:"
+                 f"{definition.line + 1}" for definition in symbols.definitions_of(symbol)[-5:]]
+        return dict(contents=dict(kind='markdown', value='```meson\n' + '\n'.join(lines) + '\n```'))
+
+    def m_text_document__definition(self, textDocument, position):
+        workspace = self.workspace_for(textDocument)
+        symbols = self._symbols(workspace, textDocument)
+        symbol = self._symbol_at(workspace, symbols, textDocument, position)
+        if symbol is None:
+            return None
+        return [workspace.location(definition) for definition in symbols.definitions_of(symbol)]
+
+    def m_text_document__references(self, textDocument, position, context=None):
+        workspace = self.workspace_for(textDocument)
+        symbols = self._symbols(workspace, textDocument)
+        symbol = self._symbol_at(workspace, symbols, textDocument, position)
+        if symbol is None:
+            return None
+        include_declaration = (context or {}).get('includeDeclaration', True)
+        return [workspace.location(reference)
+                for reference in symbols.references(symbol.name, include_declaration)]
+
+    def m_text_document__document_symbol(self, textDocument):
+        workspace = self.workspace_for(textDocument)
+        symbols = self._symbols(workspace, textDocument)
+        return [self._symbol_information(workspace, symbol)
+                for symbol in symbols.document_symbols(workspace.path_for(textDocument['uri']))]
+
+    def m_workspace__symbol(self, query):
+        limit = self.config.symbol_limit
+        found = []
+        # Roots that are not active are left alone, searching them would analyse every folder of the client
+        for workspace in self.roots.workspaces():
+            # Clients query again as the user types, so subprojects are requested for the first query after the
+            # first build only, and only when asked to
+            if self.config.symbol_subprojects and not workspace.symbol_subprojects and workspace.snapshot.generation:
+                workspace.symbol_subprojects = True
+                if workspace.request_subprojects(workspace.known_subprojects()):
+                    workspace.scheduler.schedule(delay=0)
+            found += [(workspace, symbol) for symbol in workspace.search_symbols(query, limit - len(found))]
+        return [self._symbol_information(workspace, symbol) for workspace, symbol in found[:limit]]
+
+    @staticmethod
+    def _symbols(workspace: 'mlsp.workspace.Workspace', textDocument: dict) -> 'mlsp.symbols.SymbolTable':
+        """Symbols of the project a document belongs to."""
+        return workspace.snapshot.for_path(workspace.path_for(textDocument['uri'])).symbols
+
+    @staticmethod
+    def _symbol_at(workspace: 'mlsp.workspace.Workspace', symbols: 'mlsp.symbols.SymbolTable', textDocument: dict,
+                   position: dict) -> Optional['mlsp.symbols.Symbol']:
+        return symbols.at(workspace.path_for(textDocument['uri']), position['line'], position['character'])
+
+    def _symbol_information(self, workspace: 'mlsp.workspace.Workspace', symbol: 'mlsp.symbols.Symbol') -> dict:
+        return dict(name=symbol.name, kind=consts.SymbolKind.Variable, location=workspace.location(symbol),
+                    containerName=self._relative(workspace, symbol.path))
+
+    @staticmethod
+    def _relative(workspace: 'mlsp.workspace.Workspace', path: str) -> str:
+        return os.path.relpath(path, workspace.source_root)
+
+    def m_text_document__completion(self, textDocument, position, **_kwargs):
+        return self.workspace_for(textDocument).complete(textDocument.get('uri'), position['line'],
+                                                         position['character'], self.config.completion_limit)
+
+    def m_text_document__semantic_tokens__full(self, textDocument):
+        tokens = self.workspace_for(textDocument).document_tokens(textDocument['uri'])
+        return tokens.full() if tokens is not None else None
+
+    def m_text_document__semantic_tokens__full__delta(self, textDocument, previousResultId):
+        tokens = self.workspace_for(textDocument).document_tokens(textDocument['uri'])
+        return tokens.delta(previousResultId) if tokens is not None else None
+
+    def m_text_document__folding_range(self, textDocument):
+        tokens = self.workspace_for(textDocument).document_tokens(textDocument['uri'])
+        return tokens.folding_ranges() if tokens is not None else None
+
+    def m___mesonls__stats(self, **_kwargs):
+        """`$/mesonls/stats`: the instrumentation collected so far, see `--stats`, with the state of the roots and what
+        their caches evicted."""
+        stats = STATS.to_dict()
+        if self._roots is not None:
+            stats['roots'] = self._roots.to_dict()
+            first = self._roots.active.get(self._roots.folders[0]) if self._roots.folders else None
+            if first is not None:
+                stats['filesystem'] = first.fs.to_dict()
+        return stats
 
     def m_shutdown(self, **_kwargs):
         logger.warning('Shutting down')
         self.shutdown = True
 
     def m_exit(self, **_kwargs):
-        self.endpoint.shutdown()
-        self.rpc_reader.close()
-        self.rpc_writer.close()
+        self.close()
@@ -0,0 +1,185 @@
+import ast
+import inspect
+import logging
+import textwrap
+from functools import lru_cache
+from typing import Callable, Dict, FrozenSet, Optional
+
+logger = logging.getLogger(__name__)
+
+# Interpreter functions implemented by a method not named after them
+FUNCTION_ALIASES = {
+    'shared_library': 'shared_lib',
+    'static_library': 'static_lib',
+    'both_libraries': 'both_lib',
+}
+# Objects the interpreter defines before evaluating the root build file, by the holder class of their value
+BUILTIN_OBJECTS = {
+    'meson': 'MesonMain',
+    'build_machine': 'MachineHolder',
+    'host_machine': 'MachineHolder',
+    'target_machine': 'MachineHolder',
+}
+# Methods of values that are not held by an interpreter object, which Meson dispatches by name in `interpreterbase`
+PRIMITIVE_METHODS = {
+    'str': ('contains', 'endswith', 'format', 'join', 'split', 'startswith', 'strip', 'to_int', 'to_lower',
+            'to_upper', 'underscorify', 'version_compare'),
+    'int': ('is_even', 'is_odd', 'to_string'),
+    'bool': ('to_int', 'to_string'),
+    'array': ('contains', 'get', 'length'),
+    'dict': ('get', 'has_key', 'keys'),
+}
+# What calls evaluate to: a primitive type, or the holder class of the object
+FUNCTION_TYPES = {
+    'both_libraries': 'BothLibrariesHolder',
+    'build_target': 'BuildTargetHolder',
+    'configuration_data': 'ConfigurationDataHolder',
+    'configure_file': 'ConfigureFileHolder',
+    'custom_target': 'CustomTargetHolder',
+    'declare_dependency': 'DependencyHolder',
+    'dependency': 'DependencyHolder',
+    'environment': 'EnvironmentVariablesHolder',
+    'executable': 'ExecutableHolder',
+    'files': 'array',
+    'find_program': 'ExternalProgramHolder',
+    'generator': 'GeneratorHolder',
+    'include_directories': 'IncludeDirsHolder',
+    'is_disabler': 'bool',
+    'is_variable': 'bool',
+    'jar': 'JarHolder',
+    'join_paths': 'str',
+    'library': 'BuildTargetHolder',
+    'run_command': 'RunProcess',
+    'run_target': 'RunTargetHolder',
+    'shared_library': 'SharedLibraryHolder',
+    'shared_module': 'SharedModuleHolder',
+    'static_library': 'StaticLibraryHolder',
+    'subproject': 'SubprojectHolder',
+    'vcs_tag': 'CustomTargetHolder',
+}
+METHOD_TYPES = {
+    ('BothLibrariesHolder', 'get_shared_lib'): 'SharedLibraryHolder',
+    ('BothLibrariesHolder', 'get_static_lib'): 'StaticLibraryHolder',
+    ('CompilerHolder', 'find_library'): 'ExternalLibraryHolder',
+    ('CompilerHolder', 'run'): 'TryRunResultHolder',
+    ('DependencyHolder', 'partial_dependency'): 'DependencyHolder',
+    ('MesonMain', 'get_compiler'): 'CompilerHolder',
+    ('array', 'length'): 'int',
+    ('dict', 'keys'): 'array',
+    ('int', 'to_string'): 'str',
+    ('bool', 'to_string'): 'str',
+    ('bool', 'to_int'): 'int',
+    ('str', 'split'): 'array',
+    ('str', 'to_int'): 'int',
+}
+METHOD_TYPES.update({('str', name): 'str' for name in ('format', 'join', 'strip', 'to_lower', 'to_upper',
+                                                       'underscorify')})
+METHOD_TYPES.update({('str', name): 'bool' for name in ('contains', 'endswith', 'startswith', 'version_compare')})
+# Longest chain of variables followed to find the type of a value
+MAX_DEPTH = 8
+
+
+def _permitted(method) -> FrozenSet[str]:
+    """Keyword arguments accepted by an interpreter method, as declared by its `permittedKwargs` decorator."""
+    from mesonbuild.interpreterbase import permittedKwargs
+    while method is not None:
+        for cell in method.__closure__ or ():
+            if isinstance(cell.cell_contents, permittedKwargs):
+                return frozenset(cell.cell_contents.permitted)
+        method = getattr(method, '__wrapped__', None)
+    return frozenset()
+
+
+@lru_cache(maxsize=None)
+def function_kwargs() -> Dict[str, FrozenSet[str]]:
+    """Keyword arguments of every interpreter function, read once from Meson's interpreter."""
+    from mesonbuild import interpreter
+    kwargs = {name: frozenset(permitted) for name, permitted in interpreter.permitted_kwargs.items()}
+    for attribute in dir(interpreter.Interpreter):
+        if attribute.startswith('func_'):
+            kwargs.setdefault(attribute[len('func_'):], _permitted(getattr(interpreter.Interpreter, attribute)))
+    for name, alias in FUNCTION_ALIASES.items():
+        kwargs[name] = kwargs.get(name) or kwargs.get(alias, frozenset())
+    return kwargs
+
+
+def _method_names(holder: type) -> Dict[str, str]:
+    """Methods of an interpreter object class, mapped to the attribute implementing them, as registered with
+    `self.methods.update({...})` by the constructors of the class and its bases."""
+    names = dict()
+    for cls in reversed(holder.__mro__):
+        init = cls.__dict__.get('__init__')
+        if init is None or not hasattr(init, '__code__'):
+            continue
+        try:
+            tree = ast.parse(textwrap.dedent(inspect.getsource(init)))
+        except (OSError, TypeError, SyntaxError):
+            continue
+        for node in ast.walk(tree):
+            if (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr == 'update'
+                    and isinstance(node.func.value, ast.Attribute) and node.func.value.attr == 'methods'
+                    and node.args and isinstance(node.args[0], ast.Dict)):
+                for key, value in zip(node.args[0].keys, node.args[0].values):
+                    name = _string(key)
+                    if name is not None and isinstance(value, ast.Attribute):
+                        names[name] = value.attr
+    return names
+
+
+def _string(node: Optional[ast.AST]) -> Optional[str]:
+    """Value of a string literal: an `ast.Str` before Python 3.8, with the value in `s`, an `ast.Constant` since."""
+    value = getattr(node, 'value', getattr(node, 's', None))
+    return value if isinstance(value, str) else None
+
+
+@lru_cache(maxsize=None)
+def object_methods() -> Dict[str, Dict[str, FrozenSet[str]]]:
+    """Methods of every object type, with their keyword arguments, read once from Meson's interpreter."""
+    from mesonbuild import interpreter
+    from mesonbuild.interpreterbase import InterpreterObject
+    methods = {name: {method: frozenset() for method in names} for name, names in PRIMITIVE_METHODS.items()}
+    for name in dir(interpreter):
+        holder = getattr(interpreter, name)
+        if isinstance(holder, type) and issubclass(holder, InterpreterObject):
+            methods[name] = {method: _permitted(getattr(holder, attribute, None))
+                             for method, attribute in _method_names(holder).items()}
+    return methods
+
+
+def methods_of(object_type: Optional[str]) -> Dict[str, FrozenSet[str]]:
+    """Methods of an object type, with their keyword arguments; of every type if it is not known."""
+    methods = object_methods()
+    return methods[object_type] if object_type in methods else _every_method()
+
+
+@lru_cache(maxsize=None)
+def _every_method() -> Dict[str, FrozenSet[str]]:
+    every = dict()
+    for methods in object_methods().values():
+        for name, kwargs in methods.items():
+            every[name] = every.get(name, frozenset()) | kwargs
+    return every
+
+
+def type_of(detail: str, resolve: Callable[[str], Optional[str]], depth: int = 0) -> Optional[str]:
+    """Type of a value described like `SymbolsVisitor` describes them, `resolve` giving the description of the
+    value of a variable."""
+    if depth > MAX_DEPTH or not detail:
+        return None
+    if detail in PRIMITIVE_METHODS:
+        return detail
+    if not detail.endswith('()'):
+        if detail in BUILTIN_OBJECTS:
+            return BUILTIN_OBJECTS[detail]
+        return type_of(resolve(detail), resolve, depth + 1)
+    receiver, _, method = detail[:-2].rpartition('.')
+    if not receiver:
+        return FUNCTION_TYPES.get(method)
+    return METHOD_TYPES.get((type_of(receiver, resolve, depth + 1), method))
+
+
+def warm_up():
+    """Reads the tables, which imports most of Meson's interpreter."""
+    function_kwargs()
+    object_methods()
+
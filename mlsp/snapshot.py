@@ -0,0 +1,49 @@
+import os
+from typing import Iterator, List, Mapping, NamedTuple
+
+from mlsp.ast import BuildFile, LSPInterpreter
+from mlsp.graph import DependencyGraph
+from mlsp.symbols import SymbolTable
+
+
+class Snapshot(NamedTuple):
+    """Everything a finished analysis produced.
+
+    Nothing reachable from a snapshot is modified once it has been published, so readers take `Workspace.snapshot`
+    once per request and use it without locking, while the next analysis builds its own."""
+    generation: int
+    # Workspace generation the analysis started from; as long as it is the current one, nothing changed since
+    inputs: int
+    # Versions of the open documents the analysis read, by URI
+    versions: Mapping[str, int]
+    files: Mapping[str, BuildFile]
+    interpreter: LSPInterpreter
+    graph: DependencyGraph
+    symbols: SymbolTable
+    # Diagnostics by URI, only for files that have some
+    diagnostics: Mapping[str, List[dict]]
+    # Whether the analysis went through every file, so that the next one can start from it
+    complete: bool
+    # Analyses of the subprojects loaded so far, by name; those have none of their own
+    subprojects: Mapping[str, 'Snapshot']
+
+    @staticmethod
+    def empty(interpreter: LSPInterpreter) -> 'Snapshot':
+        return Snapshot(0, -1, dict(), dict(), interpreter, DependencyGraph(), SymbolTable(), dict(), False, dict())
+
+    def projects(self) -> Iterator['Snapshot']:
+        yield self
+        yield from self.subprojects.values()
+
+    def for_path(self, path: str) -> 'Snapshot':
+        """Analysis of the project a file belongs to."""
+        for subproject in self.subprojects.values():
+            if path.startswith(subproject.interpreter.source_root + os.sep):
+                return subproject
+        return self
+
+    def all_diagnostics(self) -> Mapping[str, List[dict]]:
+        diagnostics = dict()
+        for project in self.projects():
+            diagnostics.update(project.diagnostics)
+        return diagnostics
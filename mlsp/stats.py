@@ -0,0 +1,155 @@
+import io
+import logging
+import random
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the latency histogram buckets, in milliseconds
+BUCKETS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, float('inf')]
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.total = 0.
+        self.max = 0.
+
+    def add(self, milliseconds: float):
+        self.counts[bisect_left(BUCKETS, milliseconds)] += 1
+        self.count += 1
+        self.total += milliseconds
+        self.max = max(self.max, milliseconds)
+
+    def percentile(self, fraction: float) -> float:
+        """Upper bound of the bucket holding the given fraction of the samples (capped by the maximum)."""
+        threshold = fraction * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            if seen >= threshold:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self) -> dict:
+        return dict(
+            count=self.count,
+            mean_ms=self.total / self.count if self.count else 0.,
+            p50_ms=self.percentile(.5),
+            p99_ms=self.percentile(.99),
+            max_ms=self.max,
+            buckets={str(bound): count for bound, count in zip(BUCKETS, self.counts) if count}
+        )
+
+
+class Stats:
+    """Opt-in latency instrumentation: per-method and per-build-phase histograms, plus build counters.
+
+    When `profile_rate` is set, that fraction of requests runs under cProfile, and the profiles of those slower than
+    `slow_threshold` milliseconds are kept."""
+    methods: Dict[str, Histogram]
+    phases: Dict[str, Histogram]
+    profiles: Deque[dict]
+
+    def __init__(self):
+        self.enabled = False
+        self.profile_rate = 0.
+        self.slow_threshold = 100.
+        self.reset()
+        self._lock = threading.Lock()
+        self._profiling = threading.Lock()
+
+    def reset(self):
+        self.methods = dict()
+        self.phases = dict()
+        self.builds = 0
+        self.builds_skipped = 0
+        self.files_parsed = 0
+        self.last_files_parsed = 0
+        self.profiles = deque(maxlen=10)
+
+    def enable(self, profile_rate: float = 0., slow_threshold: float = 100.):
+        self.enabled = True
+        self.profile_rate = profile_rate
+        self.slow_threshold = slow_threshold
+
+    @contextmanager
+    def phase(self, name: str):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._record(self.phases, name, (time.perf_counter() - start) * 1000)
+
+    @contextmanager
+    def request(self, method: str):
+        if not self.enabled:
+            yield
+            return
+        profiler = None
+        if self.profile_rate and random.random() < self.profile_rate and self._profiling.acquire(blocking=False):
+            import cProfile
+            profiler = cProfile.Profile()
+            profiler.enable()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            self._record(self.methods, method, elapsed)
+            if profiler is not None:
+                profiler.disable()
+                self._profiling.release()
+                if elapsed >= self.slow_threshold:
+                    self._keep_profile(method, elapsed, profiler)
+
+    def build_finished(self, files_parsed: int):
+        if self.enabled:
+            with self._lock:
+                self.builds += 1
+                self.files_parsed += files_parsed
+                self.last_files_parsed = files_parsed
+
+    def build_skipped(self):
+        if self.enabled:
+            with self._lock:
+                self.builds_skipped += 1
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return dict(
+                enabled=self.enabled,
+                builds=self.builds,
+                builds_skipped=self.builds_skipped,
+                files_parsed=self.files_parsed,
+                last_files_parsed=self.last_files_parsed,
+                methods={name: histogram.to_dict() for name, histogram in self.methods.items()},
+                phases={name: histogram.to_dict() for name, histogram in self.phases.items()},
+                slow_profiles=list(self.profiles)
+            )
+
+    def _record(self, histograms: Dict[str, Histogram], name: str, milliseconds: float):
+        with self._lock:
+            if name not in histograms:
+                histograms[name] = Histogram()
+            histograms[name].add(milliseconds)
+
+    def _keep_profile(self, method: str, milliseconds: float, profiler: 'cProfile.Profile'):
+        import pstats
+        output = io.StringIO()
+        pstats.Stats(profiler, stream=output).sort_stats('cumulative').print_stats(25)
+        logger.info('Slow request %s took %.1f ms', method, milliseconds)
+        with self._lock:
+            self.profiles.append(dict(method=method, duration_ms=milliseconds, profile=output.getvalue()))
+
+
+STATS = Stats()
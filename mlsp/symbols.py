@@ -0,0 +1,154 @@
+import logging
+import sys
+from array import array
+from bisect import bisect_right
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from mesonbuild import mparser
+
+from mlsp.ast import BuildFile
+from mlsp.visitors import SymbolsVisitor
+
+logger = logging.getLogger(__name__)
+
+
+# Positions are packed into one integer as `line * COLUMNS + column`
+COLUMNS = 1 << 24
+
+
+class Symbol:
+    """An assignment or a read of a variable; `line` and the columns are 0-based, `end` is exclusive.
+
+    There are a few of these per line of every build file, so names, paths and details are interned."""
+    __slots__ = ('name', 'path', 'line', 'start', 'end', 'definition', 'detail')
+    name: str
+    path: str
+    line: int
+    start: int
+    end: int
+    definition: bool
+    detail: str
+
+    def __init__(self, name: str, path: str, line: int, start: int, end: int, definition: bool, detail: str):
+        self.name = sys.intern(name)
+        self.path = sys.intern(path)
+        self.line = line
+        self.start = start
+        self.end = end
+        self.definition = definition
+        self.detail = sys.intern(detail)
+
+    def __repr__(self):
+        return f'Symbol({self.name!r}, {self.path!r}, {self.line}, {self.start}, {self.end}, {self.definition})'
+
+
+class FileSymbols:
+    """Symbols of one build file, sorted by position so that the one under a cursor is found by bisection."""
+    digest: str
+    symbols: List[Symbol]
+    positions: array
+
+    def __init__(self, path: str, digest: str, codeblock: mparser.CodeBlockNode):
+        self.digest = digest
+        visitor = SymbolsVisitor()
+        codeblock.accept(visitor)
+        self.symbols = sorted((Symbol(name, path, lineno - 1, colno, colno + len(name), definition, detail)
+                               for name, lineno, colno, definition, detail in visitor.symbols),
+                              key=lambda symbol: (symbol.line, symbol.start))
+        self.positions = array('q', (symbol.line * COLUMNS + symbol.start for symbol in self.symbols))
+
+    def at(self, line: int, character: int) -> Optional[Symbol]:
+        i = bisect_right(self.positions, line * COLUMNS + min(character, COLUMNS - 1)) - 1
+        if i < 0:
+            return None
+        symbol = self.symbols[i]
+        # A cursor right after the last character of a name still designates it
+        if symbol.line == line and character <= symbol.end:
+            return symbol
+        return None
+
+
+class SymbolTable:
+    """Variable definitions and uses of a finished build, indexed by name and by file.
+
+    Definitions and uses of a name are kept in evaluation order. Files whose text did not change since the last update
+    keep their symbols. Evaluation order is approximated by position, a file's positions coming right after the
+    `subdir()` calls leading to it."""
+    files: Dict[str, FileSymbols]
+    # The positions of the `subdir()` calls leading to each file, as in `BuildFile.calls`
+    order: Dict[str, Tuple[Tuple[int, ...], ...]]
+    definitions: Dict[str, List[Symbol]]
+    uses: Dict[str, List[Symbol]]
+
+    def __init__(self):
+        self.files = dict()
+        self.order = dict()
+        self.definitions = dict()
+        self.uses = dict()
+
+    def updated(self, files: Dict[str, BuildFile]) -> 'SymbolTable':
+        table = SymbolTable()
+        for path, build_file in sorted(files.items(), key=lambda item: item[1].order):
+            entry = self.files.get(path)
+            if entry is None or entry.digest != build_file.digest:
+                entry = FileSymbols(path, build_file.digest, build_file.codeblock)
+            table.files[path] = entry
+            table.order[path] = build_file.calls
+            for symbol in entry.symbols:
+                index = table.definitions if symbol.definition else table.uses
+                index.setdefault(symbol.name, []).append(symbol)
+        # Files come one after the other, while the symbols of a subdir belong in the middle of its parent's
+        for index in (table.definitions, table.uses):
+            for symbols in index.values():
+                if len(symbols) > 1:
+                    symbols.sort(key=table._key)
+        return table
+
+    def at(self, path: str, line: int, character: int) -> Optional[Symbol]:
+        entry = self.files.get(path)
+        return entry.at(line, character) if entry is not None else None
+
+    def definitions_of(self, symbol: Symbol) -> List[Symbol]:
+        """Assignments a read may see: every definition evaluated before it, or all of them if there is none."""
+        definitions = self.definitions.get(symbol.name, [])
+        if symbol.definition:
+            return [symbol]
+        key = self._key(symbol)
+        before = [definition for definition in definitions if self._key(definition) < key]
+        return before or list(definitions)
+
+    def defined_before(self, name: str, path: str, line: int, character: int) -> Optional[Symbol]:
+        """Last definition of `name` evaluated before a position."""
+        key = self.order.get(path, ()) + ((line, character),)
+        for definition in reversed(self.definitions.get(name, ())):
+            if self._key(definition) < key:
+                return definition
+        return None
+
+    def references(self, name: str, include_declaration: bool = True) -> List[Symbol]:
+        uses = self.uses.get(name, [])
+        if not include_declaration:
+            return list(uses)
+        return sorted(self.definitions.get(name, []) + uses, key=self._key)
+
+    def document_symbols(self, path: str) -> List[Symbol]:
+        entry = self.files.get(path)
+        return [symbol for symbol in entry.symbols if symbol.definition] if entry is not None else []
+
+    def search(self, query: str, limit: int) -> List[Symbol]:
+        """Definitions whose name contains `query`, ignoring case; the first one of each name only."""
+        query = query.lower()
+        found = []
+        for name, definitions in self.definitions.items():
+            if query in name.lower():
+                found.append(definitions[0])
+                if len(found) >= limit:
+                    break
+        return found
+
+    def variables(self) -> Iterable[Tuple[str, Symbol]]:
+        """Every defined name along with its last definition."""
+        return ((name, definitions[-1]) for name, definitions in self.definitions.items())
+
+    def _key(self, symbol: Symbol) -> Tuple[Tuple[int, ...], ...]:
+        return self.order.get(symbol.path, ()) + ((symbol.line, symbol.start),)
@@ -0,0 +1,296 @@
+import itertools
+import logging
+import operator
+import re
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+from mesonbuild import mparser
+
+from mlsp import consts
+from mlsp.document import utf16_length
+from mlsp.signatures import BUILTIN_OBJECTS
+
+logger = logging.getLogger(__name__)
+
+OPERATORS = {'plusassign', 'plus', 'dash', 'star', 'percent', 'fslash', 'equal', 'nequal', 'assign', 'le', 'lt', 'ge',
+             'gt', 'questionmark'}
+# Tokens that open and close folding ranges
+OPENING = {'lparen': 'rparen', 'lbracket': 'rbracket', 'lcurl': 'rcurl', 'if': 'endif', 'foreach': 'endforeach'}
+CLOSING = set(OPENING.values())
+STRUCTURE = set(OPENING) | CLOSING | {'elif', 'else'}
+# Results kept per document for `semanticTokens/full/delta` to be computed against
+KEPT_RESULTS = 2
+DATA = operator.attrgetter('data')
+
+
+def _specification() -> Tuple['re.Pattern', frozenset]:
+    """The token specification of Meson's lexer as one pattern matching a token within a line, tried in the same
+    order, followed by strings left open and by any character the lexer would reject."""
+    lexer = mparser.Lexer('')
+    patterns = []
+    for tid, regex in lexer.token_specification:
+        if tid in ('eol', 'eol_cont', 'multiline_string'):
+            continue
+        patterns.append(f'(?P<{tid}>{regex.pattern})')
+        if tid == 'string':
+            patterns.append(r"(?P<open_string>'.*)")
+    patterns.append(r'(?P<error>.)')
+    return re.compile('|'.join(patterns)), frozenset(lexer.keywords)
+
+
+TOKEN, KEYWORDS = _specification()
+
+
+class State(NamedTuple):
+    """Where the lexer is at the start of a line: in a multiline string or not, and the last token it found, which
+    tells keyword arguments apart from other names."""
+    in_string: bool
+    previous: Optional[str]
+
+
+START = State(False, None)
+
+
+class LineTokens:
+    """Tokens of a line, lexed from a given `State`. Lines do not depend on the lines above them for anything but that
+    state, so the tokens of unchanged lines are reused after an edit.
+
+    `data` is encoded as in `semanticTokens/full` responses, with the first token moved down by 0 lines, so that it
+    holds no reference to other lines; `structure` lists the tokens that open and close folding ranges."""
+    __slots__ = ('data', 'structure', 'comment', 'end')
+    data: List[int]
+    structure: List[str]
+    comment: bool
+    end: State
+
+    def __init__(self, line: str, state: State):
+        tokens = []
+        pos = 0
+        in_string = state.in_string
+        if in_string:
+            end = line.find("'''")
+            pos = len(line) if end < 0 else end + 3
+            in_string = end < 0
+            tokens.append((0, pos, 'string'))
+        while pos < len(line):
+            if line.startswith("'''", pos):
+                end = line.find("'''", pos + 3)
+                in_string = end < 0
+                end = len(line) if in_string else end + 3
+                tokens.append((pos, end, 'string'))
+                pos = end
+                continue
+            match = TOKEN.match(line, pos)
+            tid = match.lastgroup
+            if tid == 'id' and match.group() in KEYWORDS:
+                tid = match.group()
+            if tid not in ('ignore', 'error', 'dblquote'):
+                tokens.append((pos, match.end(), 'string' if tid == 'open_string' else tid))
+            pos = match.end()
+        self.comment = len(tokens) == 1 and tokens[0][2] == 'comment'
+        self.structure = [tid for _, _, tid in tokens if tid in STRUCTURE]
+        self.data = self._encode(line, tokens, state.previous)
+        previous = state.previous
+        for _, _, tid in tokens:
+            if tid != 'comment':
+                previous = tid
+        self.end = State(in_string, previous)
+
+    @staticmethod
+    def _encode(line: str, tokens: List[Tuple[int, int, str]], previous: Optional[str]) -> List[int]:
+        data = []
+        last = 0
+        ascii = line.isascii()
+        for i, (start, end, tid) in enumerate(tokens):
+            modifiers = 0
+            if tid == 'id':
+                following = tokens[i + 1][2] if i + 1 < len(tokens) else None
+                if following == 'lparen':
+                    kind = 'method' if previous == 'dot' else 'function'
+                elif following == 'colon' and previous in ('lparen', 'comma'):
+                    kind = 'parameter'
+                else:
+                    kind = 'variable'
+                    if line[start:end] in BUILTIN_OBJECTS:
+                        modifiers = 1
+            elif tid in KEYWORDS:
+                kind = 'keyword'
+            elif tid in OPERATORS:
+                kind = 'operator'
+            elif tid in ('string', 'number', 'comment'):
+                kind = tid
+            else:
+                kind = None
+            previous = tid
+            if kind is None:
+                continue
+            if not ascii:
+                start, end = utf16_length(line[:start]), utf16_length(line[:end])
+            data += [0, start - last, end - start, consts.SEMANTIC_TOKEN_TYPES.index(kind), modifiers]
+            last = start
+        return data
+
+    def folds(self, other: 'LineTokens') -> bool:
+        """Whether both lines open and close the same folding ranges."""
+        return (self.structure == other.structure and self.comment == other.comment
+                and self.end.in_string == other.end.in_string)
+
+
+class Result(NamedTuple):
+    """Tokens sent for a version of a document, by line."""
+    result_id: str
+    lines: List[LineTokens]
+
+
+def _same(old: Iterable, new: Iterable, limit: int, differ) -> int:
+    """Number of items at the start of both iterables, at most `limit`, that do not `differ`, counted without a
+    Python loop."""
+    return next(itertools.compress(itertools.count(), map(differ, itertools.islice(old, limit), new)), limit)
+
+
+def _common_prefix(old: List, new: List, differ=operator.ne) -> int:
+    return _same(old, new, min(len(old), len(new)), differ)
+
+
+def _common_suffix(old: List, new: List, limit: int, differ=operator.ne) -> int:
+    return _same(reversed(old), reversed(new), limit, differ)
+
+
+def _size(lines: List[LineTokens]) -> int:
+    return sum(map(len, map(DATA, lines)))
+
+
+def _encode(lines: List[LineTokens], start: int, end: int, last: int) -> List[int]:
+    """Tokens of lines `start` to `end`, the last line with tokens before them being `last`."""
+    data = []
+    for line in range(start, end):
+        tokens = lines[line].data
+        if tokens:
+            position = len(data)
+            data += tokens
+            data[position] = line - last
+            last = line
+    return data
+
+
+def _last_with_tokens(lines: List[LineTokens], end: int) -> int:
+    for line in range(end - 1, -1, -1):
+        if lines[line].data:
+            return line
+    return 0
+
+
+class DocumentTokens:
+    """Semantic tokens and folding ranges of an open document.
+
+    On each version, the lines of the text that changed since the previous one are found by comparing both versions
+    from the start and from the end, and only those are lexed again, along with the lines after them whose starting
+    state changed. Results keep the tokens of every line, so that deltas are found the same way: unchanged lines keep
+    the same `LineTokens`."""
+    lines: List[str]
+    tokens: List[LineTokens]
+    results: List[Result]
+
+    def __init__(self):
+        self.version = None
+        self.lines = []
+        self.tokens = []
+        self.results = []
+        self.lexed = 0
+        self.folding = None
+        self._ids = itertools.count(1)
+
+    def update(self, text: str, version: int):
+        if version == self.version:
+            return
+        lines = text.split('\n')
+        old, tokens = self.lines, self.tokens
+        prefix = _common_prefix(old, lines)
+        suffix = _common_suffix(old, lines, min(len(old), len(lines)) - prefix)
+        offset = len(old) - len(lines)
+        state = tokens[prefix - 1].end if prefix else START
+        lexed = []
+        line = prefix
+        while line < len(lines):
+            # Lines after the edit only need lexing again if they now start in another state
+            if line >= len(lines) - suffix and state == (tokens[line + offset - 1].end if line + offset else START):
+                break
+            entry = LineTokens(lines[line][:-1] if lines[line].endswith('\r') else lines[line], state)
+            lexed.append(entry)
+            state = entry.end
+            line += 1
+        replaced = tokens[prefix:line + offset]
+        # Typing within lines seldom changes the folding ranges
+        if len(replaced) != len(lexed) or not all(map(LineTokens.folds, replaced, lexed)):
+            self.folding = None
+        self.lexed += len(lexed)
+        self.lines = lines
+        self.tokens = tokens[:prefix] + lexed + tokens[line + offset:]
+        self.version = version
+
+    def full(self) -> dict:
+        result = self._result()
+        return dict(resultId=result.result_id, data=_encode(result.lines, 0, len(result.lines), 0))
+
+    def delta(self, previous_id: str) -> dict:
+        """The edit turning the result `previous_id` into the current one, replacing the tokens of the lines between
+        the unchanged ones at the start and at the end; the full result if `previous_id` is not known."""
+        previous = next((result for result in self.results if result.result_id == previous_id), None)
+        result = self._result()
+        if previous is None:
+            return self.full()
+        old, new = previous.lines, result.lines
+        prefix = _common_prefix(old, new, operator.is_not)
+        if prefix == len(old) == len(new):
+            return dict(resultId=result.result_id, edits=[])
+        suffix = _common_suffix(old, new, min(len(old), len(new)) - prefix, operator.is_not)
+        # The first token after the edit is placed relative to the last one before it, which may have moved
+        while suffix and not new[len(new) - suffix].data:
+            suffix -= 1
+        suffix = max(suffix - 1, 0)
+        start = _size(old[:prefix])
+        deleted = _size(old[prefix:len(old) - suffix])
+        data = _encode(new, prefix, len(new) - suffix, _last_with_tokens(new, prefix))
+        return dict(resultId=result.result_id, edits=[dict(start=start, deleteCount=deleted, data=data)])
+
+    def _result(self) -> Result:
+        if self.results and self.results[-1].lines is self.tokens:
+            return self.results[-1]
+        result = Result(f'{self.version}.{next(self._ids)}', self.tokens)
+        self.results = self.results[1 - KEPT_RESULTS:] + [result]
+        return result
+
+    def folding_ranges(self) -> List[dict]:
+        """Ranges of blocks, of brackets spanning lines, of multiline strings and of runs of comment lines; each ends
+        on the line before the one closing it."""
+        if self.folding is not None:
+            return self.folding
+        ranges = []
+        opened = []
+        comments = None
+        in_string = None
+        for line, entry in enumerate(self.tokens):
+            if entry.comment:
+                comments = line if comments is None else comments
+                continue
+            if comments is not None:
+                if line - 1 > comments:
+                    ranges.append(dict(startLine=comments, endLine=line - 1, kind=consts.FoldingRangeKind.Comment))
+                comments = None
+            for tid in entry.structure:
+                if tid in OPENING:
+                    opened.append((tid, line))
+                elif tid in ('elif', 'else'):
+                    if opened and opened[-1][0] == 'if':
+                        ranges.append(dict(startLine=opened.pop()[1], endLine=line - 1))
+                        opened.append(('if', line))
+                elif opened and OPENING[opened[-1][0]] == tid:
+                    ranges.append(dict(startLine=opened.pop()[1], endLine=line - 1))
+            if entry.end.in_string != (in_string is not None):
+                if in_string is None:
+                    in_string = line
+                else:
+                    ranges.append(dict(startLine=in_string, endLine=line))
+                    in_string = None
+        self.folding = [r for r in ranges if r['endLine'] > r['startLine']]
+        return self.folding
@@ -1,7 +1,7 @@
-from typing import List
+from typing import List, Set, Tuple
 
 from mesonbuild import mparser
-from mesonbuild.ast import AstVisitor
+from mesonbuild.ast import AstVisitor, AstIDGenerator
 
 
 class VariablesVisitor(AstVisitor):
@@ -13,3 +13,99 @@ class VariablesVisitor(AstVisitor):
 
     def visit_AssignmentNode(self, node: mparser.AssignmentNode):
         self.variables.append(node)
+
+
+class FileIDGenerator(AstIDGenerator):
+    """Stamps `ast_id`s that stay unique across files, as required by `AstInterpreter.resolve_node`."""
+
+    def __init__(self, prefix: str):
+        super().__init__()
+        self.prefix = prefix
+
+    def visit_default_func(self, node: mparser.BaseNode):
+        super().visit_default_func(node)
+        node.ast_id = f"{self.prefix}:{node.ast_id}"
+
+
+class SubdirsVisitor(AstVisitor):
+    """Collects the literal arguments of `subdir()` calls."""
+    subdirs: List[str]
+
+    def __init__(self):
+        super().__init__()
+        self.subdirs = []
+
+    def visit_FunctionNode(self, node: mparser.FunctionNode):
+        if node.func_name == 'subdir' and node.args.arguments and isinstance(node.args.arguments[0], mparser.StringNode):
+            self.subdirs.append(node.args.arguments[0].value)
+        super().visit_FunctionNode(node)
+
+
+class NamesVisitor(AstVisitor):
+    """Collects the variable names a build file assigns and the ones it reads."""
+    defined: Set[str]
+    used: Set[str]
+
+    def __init__(self):
+        super().__init__()
+        self.defined = set()
+        self.used = set()
+
+    def visit_AssignmentNode(self, node: mparser.AssignmentNode):
+        self.defined.add(node.var_name)
+        super().visit_AssignmentNode(node)
+
+    def visit_PlusAssignmentNode(self, node: mparser.PlusAssignmentNode):
+        self.defined.add(node.var_name)
+        self.used.add(node.var_name)
+        super().visit_PlusAssignmentNode(node)
+
+    def visit_ForeachClauseNode(self, node: mparser.ForeachClauseNode):
+        self.defined.update(token.value for token in node.varnames)
+        super().visit_ForeachClauseNode(node)
+
+    def visit_IdNode(self, node: mparser.IdNode):
+        self.used.add(node.value)
+
+
+def describe(node: mparser.BaseNode) -> str:
+    """Short description of the value of an expression, as shown next to the variable it is assigned to."""
+    if isinstance(node, mparser.FunctionNode):
+        return f'{node.func_name}()'
+    if isinstance(node, mparser.MethodNode):
+        return f'{describe(node.source_object)}.{node.name}()'
+    if isinstance(node, mparser.IdNode):
+        return node.value
+    if isinstance(node, mparser.ArithmeticNode):
+        return describe(node.left)
+    return {
+        mparser.StringNode: 'str',
+        mparser.NumberNode: 'int',
+        mparser.BooleanNode: 'bool',
+        mparser.ArrayNode: 'array',
+        mparser.DictNode: 'dict',
+    }.get(type(node), '')
+
+
+class SymbolsVisitor(AstVisitor):
+    """Collects every variable assignment and read as `(name, line, column, is_definition, detail)`."""
+    symbols: List[Tuple[str, int, int, bool, str]]
+
+    def __init__(self):
+        super().__init__()
+        self.symbols = []
+
+    def visit_AssignmentNode(self, node: mparser.AssignmentNode):
+        self.symbols.append((node.var_name, node.lineno, node.colno, True, describe(node.value)))
+        super().visit_AssignmentNode(node)
+
+    def visit_PlusAssignmentNode(self, node: mparser.PlusAssignmentNode):
+        self.symbols.append((node.var_name, node.lineno, node.colno, True, describe(node.value)))
+        super().visit_PlusAssignmentNode(node)
+
+    def visit_ForeachClauseNode(self, node: mparser.ForeachClauseNode):
+        self.symbols.extend((token.value, token.lineno, token.colno, True, 'foreach') for token in node.varnames)
+        super().visit_ForeachClauseNode(node)
+
+    def visit_IdNode(self, node: mparser.IdNode):
+        self.symbols.append((node.value, node.lineno, node.colno, False, ''))
@@ -1,17 +1,36 @@
 import logging
-import pkgutil
-from importlib import import_module
+import os
+import threading
+import time
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, Set, Tuple
+from urllib import parse
 
+from mesonbuild import environment
 from mesonbuild.ast import AstVisitor
-from mesonbuild.mparser import ParseException, Lexer
-from pyls_jsonrpc.endpoint import Endpoint
+from mesonbuild.mesonlib import MesonException
 
 from mlsp import consts
-from mlsp.ast import LSPInterpreter
+from mlsp.ast import SUBPROJECT_DIR, LSPInterpreter
+from mlsp.cache import LRUCache, ParseCache, content_hash
+from mlsp.completion import (CompletionIndex, CompletionItem, FilteredIndex, complete, kwargs_index, methods_index,
+                             static_index)
+from mlsp.context import ARGUMENTS, METHOD, NOTHING, VALUE_KEYWORDS, context_at
+from mlsp.diagnostics import DiagnosticsPublisher, diagnostic, from_exception as diagnostics_from_exception
 from mlsp.document import Document
-from mlsp.visitors import VariablesVisitor
+from mlsp.endpoint import AsyncEndpoint
+from mlsp.fs import FileSystem
+from mlsp.graph import DependencyGraph
+from mlsp.index import WorkspaceIndex
+from mlsp.parallel import ParallelParser
+from mlsp.progress import Progress
+from mlsp.rope import Rope
+from mlsp.scheduler import AnalysisScheduler, BuildCancelled
+from mlsp.signatures import type_of
+from mlsp.snapshot import Snapshot
+from mlsp.stats import STATS
+from mlsp.symbols import Symbol
+from mlsp.tokens import DocumentTokens
 
 logger = logging.getLogger(__name__)
 
@@ -20,139 +39,471 @@ KEYWORDS_BLOCK_END = [f"end{v}" for v in KEYWORDS_BLOCK]
 KEYWORDS_LOGIC = ["and", "or", "not"]
 KEYWORDS_OTHER = ["else", "elif"]
 KEYWORDS_ALL = KEYWORDS_BLOCK + KEYWORDS_BLOCK_END + KEYWORDS_LOGIC + KEYWORDS_OTHER
-
-MODULES = [
-    dict(
-        name=m.name.replace('unstable_', ''),
-        deprecated=m.name.startswith('unstable')
-    ) for m in pkgutil.iter_modules(
-        import_module('mesonbuild.modules').__path__
-    )
-]
-
+# Minimum delay, in seconds, between two partial results of a first analysis
+STREAM_INTERVAL = 0.1
+# Lines above the cursor looked at to find out what can be completed
+CONTEXT_LINES = 200
 
 class Workspace:
     documents: Dict[str, Document]
-    LSPInterpreter: Optional[LSPInterpreter]
-    symbols: List[dict]
+    texts: Mapping[str, Tuple[int, Rope]]
+    snapshot: Snapshot
     visitors: Dict[str, AstVisitor]
+    tokens: Dict[str, Tuple[Document, DocumentTokens]]
+    closed: LRUCache
 
-    def __init__(self, root_uri: str, endpoint: Endpoint):
+    def __init__(self, root_uri: str, endpoint: AsyncEndpoint, debounce: float = 0.2, cache_dir: Optional[Path] = None,
+                 jobs: int = 1, watch_files: bool = False, progress: bool = False, max_closed_documents: int = 32):
         logger.debug('Workspace(%s, %s)', root_uri, endpoint)
         self.root_uri = root_uri
+        self.source_root = self.path_for(root_uri)
         self.endpoint = endpoint
         self.documents = dict()
-        self.interpreter = None
-        self.symbols = list()
-        self.last_update_version = 0
-        self.visitors = dict(variables=VariablesVisitor())
-        self.build_ast()
+        # Versions and texts of the open documents, replaced as a whole on every edit so that builds read a
+        # consistent set while the documents keep changing
+        self.texts = dict()
+        self.snapshot = Snapshot.empty(LSPInterpreter(self, ''))
+        self._completions = (None, dict())
+        self.tokens = dict()
+        # Tokens of recently closed documents, by URI
+        self.closed = LRUCache(max_closed_documents)
+        self.parse_cache = ParseCache(max_closed_documents)
+        self.fs = FileSystem(watched=watch_files)
+        self.index = WorkspaceIndex(root_uri, cache_dir)
+        self.index.load()
+        self.parser = ParallelParser(self, jobs)
+        # Bumped whenever something a build reads changes: the text of an open document, the set of open documents
+        # or a file on the disk
+        self.generation = 0
+        self.diagnostics = DiagnosticsPublisher(endpoint)
+        self.progress = Progress(endpoint, progress)
+        self.changed_files = set()
+        # Subprojects asked for by requests, on top of the ones with an open file
+        self.requested_subprojects = set()
+        # Whether `workspace/symbol` had the known subprojects analysed already, which it only does once
+        self.symbol_subprojects = False
+        self._lock = threading.Lock()
+        self.visitors = dict()
+        # Until the first build has finished, completion is answered from the persisted index
+        self.scheduler = AnalysisScheduler(self.build_ast, debounce)
+        self.scheduler.schedule(delay=0)
+
+    def close(self):
+        self.scheduler.shutdown()
+        self.parser.shutdown()
+
+    def mark_changed(self, uri: str):
+        """Records that a file changed on the disk."""
+        path = self.path_for(uri)
+        self.fs.invalidate(path)
+        with self._lock:
+            self.changed_files.add(path)
+            self.generation += 1
 
     @property
-    def version(self):
-        v = 0
-        for i, doc in enumerate(self.documents.values()):
-            v += doc.version * 10 ** i
-        return v
-
-    def build_ast(self):
-        logger.debug('Rebuilding AST')
-        diagnostics = list()
+    def subproject_dir(self) -> str:
+        return os.path.join(self.source_root, SUBPROJECT_DIR)
+
+    def subproject_of(self, path: str) -> Optional[str]:
+        """Name of the subproject a file belongs to, if any."""
+        relative = os.path.relpath(path, self.subproject_dir)
+        if relative.startswith(os.pardir) or os.sep not in relative:
+            return None
+        return relative.split(os.sep, 1)[0]
+
+    def known_subprojects(self) -> Set[str]:
+        """Subprojects called by the projects analysed so far."""
+        return {name for project in self.snapshot.projects() for name in project.interpreter.subprojects}
+
+    def request_subprojects(self, names: Iterable[str]) -> bool:
+        """Has subprojects analysed from now on; returns whether any of them was not already."""
+        with self._lock:
+            names = set(names) - self.requested_subprojects
+            if names:
+                self.requested_subprojects |= names
+                self.generation += 1
+        return bool(names)
+
+    def build_ast(self, cancelled: Optional[Callable[[], bool]] = None, full: bool = False):
+        with self._lock:
+            changed_files, self.changed_files = self.changed_files, set()
+            texts, generation = self.texts, self.generation
+            requested = set(self.requested_subprojects)
+        previous = self.snapshot
+        if not full and generation == previous.inputs:
+            logger.debug('Nothing changed since the last build')
+            STATS.build_skipped()
+            return
+        self.fs.revalidate()
+        documents = {uri: str(rope) for uri, (_, rope) in texts.items()}
+        versions = {uri: version for uri, (version, _) in texts.items()}
+        open_files = {self.path_for(uri) for uri in texts}
+        # Subprojects are only analysed once asked for, or while one of their files is open
+        wanted = {name for name in requested | {self.subproject_of(path) for path in open_files} if name is not None
+                  and self.fs.isfile(os.path.join(self.subproject_dir, name, environment.build_filename))}
+        # Changed files by project, None standing for the workspace's own
+        changed = dict()
+        for path in changed_files | self._changed_documents(previous, texts, documents):
+            name = self.subproject_of(path)
+            project = previous.subprojects.get(name) if name is not None else previous
+            if project is None or self._affects(project, path):
+                changed.setdefault(name, set()).add(path)
+        stale = sorted(name for name in wanted if name not in previous.subprojects or name in changed)
+        analyse = full or previous.inputs < 0 or None in changed
+        if not analyse and not stale and wanted == previous.subprojects.keys():
+            logger.debug('No change affects the last build')
+            STATS.build_skipped()
+            self.snapshot = previous._replace(inputs=generation, versions=versions)
+            return
+        subprojects = {name: previous.subprojects[name] for name in wanted if name not in stale}
+        misses, files_parsed = self.parse_cache.misses, 0
         try:
-            self.interpreter = LSPInterpreter(self, '', visitors=list(self.visitors.values()))
-            self.interpreter.load_root_meson_file()
-            self.interpreter.parse_project()
-            self.interpreter.run()
-        except ParseException as pe:
-            diagnostics.append({
-                'source': 'meson',
-                'range': {
-                    'start': {
-                        'line': pe.lineno,
-                        'character': 1
-                    },
-                    'end': {
-                        'line': pe.lineno,
-                        'character': pe.colno
-                    }
-                },
-                'message': str(pe).split('\n')[0],
-                'severity': consts.DiagnosticSeverity.Error,
-                'code': '-1'
-            })
+            if analyse:
+                def stream(partial: Snapshot):
+                    self.snapshot = partial._replace(inputs=-1, subprojects=subprojects)
+
+                # Until a first analysis has gone through, whatever it has seen so far beats what there is; later ones
+                # leave the last finished snapshot in place, as they may be cancelled before they finish
+                first = not previous.generation
+                if first:
+                    self.progress.begin('Analysing build files')
+                project, parsed = self._analyse(previous, self.source_root, documents, changed.get(None, set()),
+                                                open_files, full, cancelled, stream if first else None)
+                files_parsed += parsed
+            else:
+                project = previous
+            snapshot = project._replace(generation=previous.generation + 1, inputs=generation, versions=versions,
+                                        subprojects=subprojects)
+            if any(name not in previous.subprojects for name in stale):
+                self.progress.begin('Analysing subprojects')
+            for name in stale:
+                self.snapshot = snapshot
+                self.diagnostics.publish(snapshot.all_diagnostics())
+                self.progress.report(f'Subproject {name}')
+                source_root = os.path.join(self.subproject_dir, name)
+                subproject = previous.subprojects.get(name) or Snapshot.empty(
+                    LSPInterpreter(self, '', source_root=source_root))
+                subprojects[name], parsed = self._analyse(subproject, source_root, documents, changed.get(name, set()),
+                                                          open_files, full, cancelled)
+                files_parsed += parsed
+                snapshot = snapshot._replace(subprojects=dict(subprojects))
+        except BuildCancelled:
+            # Documents are compared to the published snapshot again next time, only disk changes need keeping
+            with self._lock:
+                self.changed_files |= changed_files
+            raise
+        finally:
+            self.progress.end()
+        self.snapshot = snapshot
+        STATS.build_finished(self.parse_cache.misses - misses + files_parsed)
+        with STATS.phase('index_save'):
+            try:
+                self.index.save()
+            except OSError:
+                logger.exception('Could not save workspace index')
+        with STATS.phase('publish_diagnostics'):
+            self.diagnostics.publish(snapshot.all_diagnostics())
+
+    def _analyse(self, previous: Snapshot, source_root: str, documents: Mapping[str, str], changed: Set[str],
+                 open_files: Set[str], full: bool, cancelled: Optional[Callable[[], bool]],
+                 stream: Optional[Callable[[Snapshot], None]] = None) -> Tuple[Snapshot, int]:
+        """Analyses the project at `source_root` again after its `changed` files, starting from its previous analysis;
+        returns it along with the number of files it parsed from the disk, ahead of evaluation or during it.
+
+        When given, `stream` is handed what has been analysed so far, every time a subtree of the root build file has
+        been evaluated and at most every `STREAM_INTERVAL` seconds."""
+        # Only the changed files and what depends on them need evaluating again, as long as the previous build
+        # went through and saw all of them
+        incremental = (not full and previous.complete and changed and previous.interpreter.root_file not in changed
+                       and changed <= previous.files.keys())
+        logger.debug('Rebuilding AST of %s (%s)', source_root, 'incremental' if incremental else 'full')
+        diagnostics = dict()
+        graph = previous.graph
+        symbols = previous.symbols
+        # Readers keep using the previous snapshot until this build has finished
+        if incremental:
+            interpreter = previous.interpreter.fork(documents, cancelled)
+        else:
+            interpreter = LSPInterpreter(self, '', visitors=list(self.visitors.values()), documents=documents,
+                                         cancelled=cancelled, source_root=source_root)
+        if stream is not None:
+            streamed = time.perf_counter()
+
+            def subtree_done():
+                nonlocal symbols, streamed
+                if time.perf_counter() - streamed < STREAM_INTERVAL:
+                    return
+                with STATS.phase('stream'):
+                    files = dict(interpreter.files)
+                    symbols = symbols.updated(files)
+                    stream(previous._replace(files=files, symbols=symbols, diagnostics=dict(), complete=False))
+                self.progress.report(f'{len(files)} build files')
+                streamed = time.perf_counter()
+
+            interpreter.subtree_done = subtree_done
+        complete = False
+        prefetched = 0
+        try:
+            if incremental:
+                with STATS.phase('reevaluate'):
+                    graph = self._reevaluate(graph, interpreter, changed)
+            else:
+                with STATS.phase('prefetch'):
+                    prefetched = self.parser.prefetch(source_root, documents, cancelled)
+                with STATS.phase('load_root'):
+                    interpreter.load_root_meson_file()
+                with STATS.phase('parse_project'):
+                    interpreter.parse_project()
+                with STATS.phase('run'):
+                    interpreter.run()
+            complete = True
+        except BuildCancelled:
+            raise
+        except MesonException as me:
+            path, found = diagnostics_from_exception(interpreter.source_root, me)
+            diagnostics.setdefault(self.uri_for(path), []).append(found)
         except:
             logger.exception('AST parsing failed')
-        self.symbols = self._get_symbols()
+        interpreter.subtree_done = None
+        for path, errors in interpreter.statement_errors.items():
+            diagnostics.setdefault(self.uri_for(path), []).extend(
+                diagnostic(error.lineno, error.colno, error.message) for error in errors)
+        with STATS.phase('graph'):
+            graph = graph.updated(interpreter.files)
+        with STATS.phase('symbol_table'):
+            symbols = symbols.updated(interpreter.files)
+        with STATS.phase('compact'):
+            # Trees of open documents are kept, as they are the ones about to change
+            interpreter.compact(open_files)
+            self.parse_cache.retain(open_files)
+        return previous._replace(
+            files=interpreter.files,
+            interpreter=interpreter,
+            graph=graph,
+            symbols=symbols,
+            diagnostics=diagnostics,
+            complete=complete,
+            subprojects=dict()
+        ), prefetched + interpreter.files_parsed
+
+    def _changed_documents(self, previous: Snapshot, texts: Mapping[str, Tuple[int, Rope]],
+                           documents: Mapping[str, str]) -> Set[str]:
+        """Files whose open document differs from what the previous build read, including closed ones; a document
+        whose version moved on but whose text is the one the build parsed did not change."""
+        changed = set()
+        for uri in texts.keys() | previous.versions.keys():
+            version, _ = texts.get(uri, (None, None))
+            if version is not None and version == previous.versions.get(uri):
+                continue
+            path = self.path_for(uri)
+            build_file = previous.for_path(path).files.get(path)
+            if build_file is not None and uri in documents and content_hash(documents[uri]) == build_file.digest:
+                continue
+            changed.add(path)
+        return changed
+
+    @staticmethod
+    def _affects(previous: Snapshot, path: str) -> bool:
+        """Whether a change to a file matters to a build: not if the build did not try to enter it, as nothing reads it
+        until some `subdir()` call does, which is a change of its own. That holds for builds that stopped short too,
+        since they stopped in a file they entered; snapshots streamed before that are analysed again anyway."""
+        interpreter = previous.interpreter
+        return path == interpreter.root_file or path in interpreter.visited_subdirs
+
+    @staticmethod
+    def path_for(uri: str) -> str:
+        return parse.unquote(parse.urlparse(uri).path)
+
+    def search_symbols(self, query: str, limit: int) -> List[Symbol]:
+        """Definitions whose name contains `query`, ignoring case: from the projects analysed so far, then from the
+        assignments the index holds for other files, like those of subprojects not loaded in this run."""
+        snapshot = self.snapshot
+        found = []
+        for project in snapshot.projects():
+            found += project.symbols.search(query, limit - len(found))
+        analysed = {path for project in snapshot.projects() for path in project.files}
+        names = {symbol.name for symbol in found}
+        query = query.lower()
+        for path, entry in sorted(dict(self.index.entries).items()):
+            if path in analysed:
+                continue
+            for name, line, column in entry.assignments:
+                if len(found) >= limit:
+                    return found
+                if name not in names and query in name.lower():
+                    names.add(name)
+                    found.append(Symbol(name, path, line - 1, column, column + len(name), True, ''))
+        return found
 
-        # TODO: Other error reporting
+    def location(self, symbol: Symbol) -> dict:
+        return dict(uri=self.uri_for(symbol.path), range=dict(
+            start=dict(line=symbol.line, character=symbol.start),
+            end=dict(line=symbol.line, character=symbol.end)))
 
-        self.endpoint.notify('textDocument/publishDiagnostics',
-                             params={
-                                 'uri': str((Path(self.root_uri) / 'meson.build').absolute()),
-                                 'diagnostics': diagnostics
-                             })
+    def uri_for(self, path: str) -> str:
+        """URI of a file, as the client knows it if the file is open."""
+        for uri in list(self.documents):
+            if self.path_for(uri) == path:
+                return uri
+        return Path(path).as_uri()
+
+    @staticmethod
+    def _reevaluate(graph: DependencyGraph, interpreter: LSPInterpreter, changed: Set[str]) -> DependencyGraph:
+        evaluated = set()
+        pending = graph.dependents(changed)
+        while pending:
+            logger.debug('Evaluating %d of %d build files again', len(pending), len(graph.order))
+            interpreter.reevaluate(pending)
+            evaluated |= pending
+            # Variables a file now assigns may be read further down, which the previous graph could not know about
+            graph = graph.updated(interpreter.files)
+            pending = graph.dependents(pending) - evaluated
+        return graph
 
     def update(self, document: dict, changes=None):
         if document.get('uri') in self.documents:
             self.documents.get(document.get('uri')).update(changes)
-        else:
+        elif document.get('text') is not None:
             self.documents[document.get('uri')] = Document(
                 document.get('uri'),
                 document.get('text')
             )
-        # Optimization to only update symbols on document update
-        if self.version > self.last_update_version:
-            self.build_ast()
-            self.last_update_version = self.version
+        else:
+            # Only `didOpen` gives the text, a change to a document that was never opened has nothing to apply to
+            logger.warning('Ignoring change to %s, which is not open', document.get('uri'))
+            return
+        self._publish_text(self.documents[document.get('uri')])
+
+    def put_document(self, document: Document):
+        """Takes over a document opened in another workspace."""
+        self.documents[document.uri] = document
+        self._publish_text(document)
+
+    def refresh(self, uri: str) -> bool:
+        """Reads an open document again from the disk, after the client saved it; returns whether its text changed."""
+        document = self.documents.get(uri)
+        if document is None or not document.refresh():
+            return False
+        self._publish_text(document)
+        return True
+
+    def _publish_text(self, document: Document):
+        with self._lock:
+            texts = dict(self.texts)
+            texts[document.uri] = (document.version, document.rope)
+            self.texts = texts
+            self.generation += 1
 
     def get_document(self, uri: str):
         return self.documents.get(uri)
 
-    def pop_document(self, document: Document):
-        return self.documents.pop(document.get_position_character_count('uri'))
-
-    def _get_symbols(self):
-        visitor = VariablesVisitor()
-        self.interpreter.visit([visitor])
-
-        keywords = [
-                       dict(label=k, kind=consts.CompletionItemKind.Keyword)
-                       for k in Lexer("").keywords
-                   ] + [
-                       dict(
-                           label=k,
-                           kind=consts.CompletionItemKind.Keyword,
-                           deprecated=True) for k in Lexer("").future_keywords
-                   ]
-        modules = [
-            dict(
-                label=k['name'],
-                detail=f"{k['name']} module (unstable)"
-                if k['deprecated'] else f"{k['name']} module",
-                deprecated=k['deprecated'],
-                insertText=f"import('{k['name']}')",
-                kind=consts.CompletionItemKind.Module) for k in MODULES
-        ]
+    def pop_document(self, uri: str) -> Optional[Document]:
+        """Closes a document, which builds read from the disk from then on; its tokens and tree are kept among those of
+        the recently closed documents."""
+        document = self.documents.pop(uri, None)
+        if document is None:
+            return None
+        with self._lock:
+            texts = dict(self.texts)
+            texts.pop(uri, None)
+            self.texts = texts
+            self.generation += 1
+        entry = self.tokens.pop(uri, None)
+        if entry is not None:
+            self.closed.put(uri, entry[1])
+        return document
+
+    def evictions(self) -> Dict[str, int]:
+        return dict(documents=self.closed.evictions, trees=self.parse_cache.evictions)
+
+    def document_tokens(self, uri: str) -> Optional[DocumentTokens]:
+        """Tokens of the current version of an open document."""
+        document = self.documents.get(uri)
+        if document is None:
+            return None
+        entry = self.tokens.get(uri)
+        if entry is None or entry[0] is not document:
+            tokens = self.closed.pop(uri)
+            if tokens is None:
+                tokens = DocumentTokens()
+            else:
+                # Versions start over with the document, the lines that did not change are kept all the same
+                tokens.version = None
+            entry = self.tokens[uri] = (document, tokens)
+        entry[1].update(document.contents, document.version)
+        return entry[1]
+
+    def complete(self, uri: str, line: int, character: int, limit: int) -> dict:
+        """Completion items for a position in a document, depending on what the text before it is."""
+        document = self.documents.get(uri)
+        if document is None:
+            return complete(self.completion_indexes(uri), '', limit)
+        context = context_at(document.text_before(line, character, CONTEXT_LINES))
+        if context.kind == NOTHING:
+            return dict(isIncomplete=False, items=[])
+        path = self.path_for(uri)
+        symbols = self.snapshot.for_path(path).symbols
+
+        def resolve(name: str) -> Optional[str]:
+            definition = symbols.defined_before(name, path, line, character)
+            return definition.detail if definition is not None else None
+
+        if context.kind == METHOD:
+            return complete([methods_index(type_of(context.receiver, resolve))], context.prefix, limit)
+        indexes = self.completion_indexes(uri)
+        if path in symbols.files:
+            indexes[0] = FilteredIndex(indexes[0], lambda item: item.kind != consts.CompletionItemKind.Variable or
+                                       symbols.defined_before(item.label, path, line, character) is not None)
+        if context.kind == ARGUMENTS:
+            indexes[1] = FilteredIndex(indexes[1], lambda item: item.kind != consts.CompletionItemKind.Keyword or
+                                       item.label in VALUE_KEYWORDS)
+            method = context.receiver is not None
+            kwargs = kwargs_index(context.function, type_of(context.receiver, resolve) if method else None, method)
+            indexes.insert(0, FilteredIndex(kwargs, lambda item: item.label not in context.used))
+        return complete(indexes, context.prefix, limit)
+
+    def completion_indexes(self, uri: Optional[str] = None) -> List[CompletionIndex]:
+        """Indexes to answer completion from in a document; the dynamic part is rebuilt at most once per snapshot and
+        project."""
+        snapshot = self.snapshot
+        project = snapshot.for_path(self.path_for(uri)) if uri is not None else snapshot
+        source, completions = self._completions
+        if source is not snapshot:
+            completions = dict()
+            self._completions = (snapshot, completions)
+        indexes = completions.get(project.interpreter.source_root)
+        if indexes is None:
+            with STATS.phase('symbols'):
+                indexes = completions[project.interpreter.source_root] = (
+                    self._get_symbols(project, self.known_subprojects()) if snapshot.generation else
+                    self._get_index_symbols(),
+                    static_index(tuple(sorted(snapshot.interpreter.funcs.keys())))
+                )
+        return list(indexes)
+
+    @staticmethod
+    def _get_symbols(project: Snapshot, subprojects: Iterable[str]) -> CompletionIndex:
         variables = [
-            dict(
-                label=v.var_name,
-                detail=str(type(v.value)),
-                kind=consts.CompletionItemKind.Variable
-            ) for v in visitor.variables
-        ]
-        functions = [
-            dict(
-                label=k,
-                kind=consts.CompletionItemKind.Function,
-                documentation="TODO",
-                detail='Function') for k in self.interpreter.funcs.keys()
+            CompletionItem(label=name, detail=symbol.detail, kind=consts.CompletionItemKind.Variable)
+            for name, symbol in project.symbols.variables()
         ]
-        subdirs = [
-            dict(
-                label=f"{k} (subproject)",
-                kind=consts.CompletionItemKind.Reference,
-                detail=f"subproject('{k}')",
-                insertText=f"subproject('{k}')")
-            for k in self.interpreter.visited_subdirs.keys()
-        ]
-        return keywords + modules + variables + functions + subdirs
+        return CompletionIndex(variables + _subproject_symbols(sorted(subprojects)), project.generation)
+
+    def _get_index_symbols(self) -> CompletionIndex:
+        entries = dict(self.index.entries)
+        variables = {
+            name: CompletionItem(label=name, kind=consts.CompletionItemKind.Variable)
+            for entry in entries.values() for name, _, _ in entry.assignments
+        }
+        return CompletionIndex(list(variables.values()), 0)
+
+
+def _subproject_symbols(names: Iterable[str]) -> List[CompletionItem]:
+    return [
+        CompletionItem(
+            label=f"{k} (subproject)",
+            kind=consts.CompletionItemKind.Reference,
+            detail=f"subproject('{k}')",
+            insert_text=f"subproject('{k}')")
+        for k in names
+    ]
@@ -4,6 +4,7 @@ setup(
     name='mlsp',
     version='0.1',
     packages=['mlsp'],
+    python_requires='>=3.7',
     install_requires=[
         "meson>=0.52, <1.0",
         "python-jsonrpc-server>=0.2.0,<1.0.0"
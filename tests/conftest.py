@@ -0,0 +1,25 @@
+from pathlib import Path
+
+import pytest
+
+from mlsp.server import MesonLanguageServer
+
+
+@pytest.fixture
+def project(tmp_path: Path) -> Path:
+    """A project with a build file in a subdirectory."""
+    (tmp_path / 'meson.build').write_text("project('p', 'c')\nsources = ['main.c']\nsubdir('sub')\n")
+    (tmp_path / 'sub').mkdir()
+    (tmp_path / 'sub' / 'meson.build').write_text("lib_sources = sources + ['lib.c']\n")
+    return tmp_path
+
+
+@pytest.fixture
+def server(project: Path):
+    """A server initialized on `project`, its first analysis done, handling notifications without a client."""
+    server = MesonLanguageServer()
+    server.m_initialize(rootUri=project.as_uri(), capabilities={},
+                        initializationOptions=dict(analysisDebounce=100, cacheDirectory=None, jobs=1))
+    server.workspace.scheduler.wait(30)
+    yield server
+    server.close()
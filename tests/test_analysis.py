@@ -0,0 +1,28 @@
+from pathlib import Path
+
+import pytest
+
+
+@pytest.fixture
+def project(tmp_path: Path) -> Path:
+    """A project whose second subdir has an assignment left unfinished, as while its value is being typed."""
+    (tmp_path / 'meson.build').write_text("project('p', 'c')\nsubdir('a')\nsubdir('b')\nsubdir('c')\nlast = 1\n")
+    for name, code in (('a', "a_sources = ['a.c']\n"), ('b', "b_sources = ['b.c']\nfoo = \nbar = 1\n"),
+                       ('c', "c_sources = ['c.c']\n")):
+        (tmp_path / name).mkdir()
+        (tmp_path / name / 'meson.build').write_text(code)
+    return tmp_path
+
+
+def test_evaluation_error_only_skips_its_statement(server, project):
+    snapshot = server.workspace.snapshot
+    assert snapshot.complete
+    assert len(snapshot.files) == 4
+    assert {name for name, _ in snapshot.symbols.variables()} >= {'a_sources', 'b_sources', 'bar', 'c_sources', 'last'}
+
+
+def test_evaluation_error_is_reported_on_its_statement(server, project):
+    diagnostics = server.workspace.snapshot.all_diagnostics()
+    assert list(diagnostics) == [(project / 'b' / 'meson.build').as_uri()]
+    [found] = diagnostics[(project / 'b' / 'meson.build').as_uri()]
+    assert found['range']['start']['line'] == 1
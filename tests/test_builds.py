@@ -0,0 +1,106 @@
+from pathlib import Path
+
+# Far longer than the time between the notifications of a test, so that they all fall within one debounce window
+TIMEOUT = 30
+
+
+def builds(server) -> int:
+    """Analyses that went through so far; skipped ones leave the generation as it was."""
+    return server.workspace.snapshot.generation
+
+
+def settle(server):
+    assert server.workspace.scheduler.wait(TIMEOUT)
+
+
+def open_document(server, path: Path) -> str:
+    uri = path.as_uri()
+    server.m_text_document__did_open(dict(uri=uri, languageId='meson', version=1, text=path.read_text()))
+    settle(server)
+    return uri
+
+
+def end_of(text: str) -> dict:
+    lines = text.split('\n')
+    return dict(line=len(lines) - 1, character=len(lines[-1]))
+
+
+def insert(position: dict, text: str) -> dict:
+    return dict(range=dict(start=position, end=position), text=text)
+
+
+def test_first_analysis_runs_once(server):
+    assert builds(server) == 1
+
+
+def test_opening_unmodified_file_does_not_build(server, project):
+    before = builds(server)
+    open_document(server, project / 'sub' / 'meson.build')
+    assert builds(server) == before
+
+
+def test_typing_burst_builds_once(server, project):
+    path = project / 'sub' / 'meson.build'
+    uri = open_document(server, path)
+    text = path.read_text()
+    before = builds(server)
+    for version, char in enumerate('x = 1', start=2):
+        server.m_text_document__did_change(dict(uri=uri, version=version), [insert(end_of(text), char)])
+        text += char
+    settle(server)
+    assert builds(server) == before + 1
+    assert server.workspace.snapshot.symbols.defined_before('x', str(path), 2, 0) is not None
+
+
+def test_unchanged_save_does_not_build(server, project):
+    path = project / 'sub' / 'meson.build'
+    uri = open_document(server, path)
+    text = path.read_text() + 'y = 2\n'
+    server.m_text_document__did_change(dict(uri=uri, version=2), [insert(end_of(path.read_text()), 'y = 2\n')])
+    settle(server)
+    before = builds(server)
+    # Saving writes the buffer to the disk, which the server reads again: the text is the one analysed
+    path.write_text(text)
+    server.m_text_document__did_save(dict(uri=uri))
+    settle(server)
+    assert builds(server) == before
+
+
+def test_no_op_edit_does_not_build(server, project):
+    path = project / 'sub' / 'meson.build'
+    uri = open_document(server, path)
+    before = builds(server)
+    end = end_of(path.read_text())
+    after = dict(line=end['line'], character=end['character'] + 1)
+    # Typing a character and deleting it again gives the text the last analysis read
+    server.m_text_document__did_change(dict(uri=uri, version=2), [
+        insert(end, 'x'), dict(range=dict(start=end, end=after), text='')])
+    settle(server)
+    assert builds(server) == before
+
+
+def test_no_op_edit_of_broken_buffer_does_not_build(server, project):
+    path = project / 'sub' / 'meson.build'
+    uri = open_document(server, path)
+    # The value of an assignment being typed, which cannot be evaluated
+    server.m_text_document__did_change(dict(uri=uri, version=2), [insert(end_of(path.read_text()), 'x = ')])
+    settle(server)
+    assert server.workspace.snapshot.all_diagnostics()
+    before = builds(server)
+    end = end_of(path.read_text() + 'x = ')
+    after = dict(line=end['line'], character=end['character'] + 1)
+    server.m_text_document__did_change(dict(uri=uri, version=3), [
+        insert(end, 'y'), dict(range=dict(start=end, end=after), text='')])
+    settle(server)
+    assert builds(server) == before
+
+
+def test_edit_of_file_not_entered_does_not_build(server, project):
+    path = project / 'unused' / 'meson.build'
+    path.parent.mkdir()
+    path.write_text("unused = 1\n")
+    uri = open_document(server, path)
+    before = builds(server)
+    server.m_text_document__did_change(dict(uri=uri, version=2), [insert(end_of(path.read_text()), 'x = ')])
+    settle(server)
+    assert builds(server) == before
@@ -0,0 +1,87 @@
+import pytest
+
+from mlsp import consts
+from mlsp.completion import CompletionIndex, CompletionItem, complete, kwargs_index
+from mlsp.context import ARGUMENTS, EXPRESSION, METHOD, NOTHING, context_at
+from tests.test_builds import end_of, insert, open_document, settle
+
+VARIABLE = consts.CompletionItemKind.Variable
+
+
+@pytest.mark.parametrize('code, kind, prefix', [
+    ("x = li", EXPRESSION, 'li'),
+    ("x = 'li", NOTHING, ''),
+    ("x = 1 # li", NOTHING, ''),
+    ("executable('a', 'b.c', ", ARGUMENTS, ''),
+    ("foo.st", METHOD, 'st'),
+])
+def test_context_kind(code, kind, prefix):
+    context = context_at(code)
+    assert (context.kind, context.prefix) == (kind, prefix)
+
+
+def test_context_of_arguments():
+    context = context_at("executable('a', install: true,\n  ")
+    assert context.function == 'executable'
+    assert context.receiver is None
+    assert context.used == {'install'}
+
+
+def test_context_of_method():
+    assert context_at("meson.get_compiler('c').").receiver == 'meson.get_compiler()'
+
+
+def labels(result: dict):
+    return [item['label'] for item in result['items']]
+
+
+def test_complete_keeps_the_order_of_indexes():
+    first = CompletionIndex([CompletionItem('b1', VARIABLE), CompletionItem('c1', VARIABLE)])
+    second = CompletionIndex([CompletionItem('a2', VARIABLE), CompletionItem('b2', VARIABLE)])
+    result = complete([first, second], 'b', 10)
+    assert labels(result) == ['b1', 'b2']
+    assert [item['sortText'] for item in result['items']] == sorted(item['sortText'] for item in result['items'])
+    assert not result['isIncomplete']
+
+
+def test_complete_fills_the_limit_from_the_first_indexes():
+    first = CompletionIndex([CompletionItem(f'a{i}', VARIABLE) for i in range(3)])
+    second = CompletionIndex([CompletionItem('a', VARIABLE)])
+    result = complete([first, second], 'a', 2)
+    assert labels(result) == ['a0', 'a1']
+    assert result['isIncomplete']
+
+
+def test_kwargs_of_function():
+    assert labels(complete([kwargs_index('executable')], 'inst', 10)) == [
+        'install', 'install_dir', 'install_mode', 'install_rpath']
+
+
+def completion_at(server, project, line: str):
+    """Labels offered at the end of `line`, added to the root build file right before its `subdir()` call and again
+    right after it."""
+    path = project / 'meson.build'
+    uri = open_document(server, path)
+    text = path.read_text()
+    before = text.replace("subdir('sub')\n", line + "\nsubdir('sub')\n")
+    server.m_text_document__did_change(dict(uri=uri, version=2), [dict(text=before + line)])
+    settle(server)
+    position = end_of(before.split("\nsubdir('sub')")[0])
+    results = [server.m_text_document__completion(dict(uri=uri), position), server.m_text_document__completion(
+        dict(uri=uri), end_of(before + line))]
+    return [labels(result) for result in results]
+
+
+def test_variables_of_subdir_are_offered_after_its_call(server, project):
+    before, after = completion_at(server, project, 'x = li')
+    assert 'library' in before and 'lib_sources' not in before
+    assert 'lib_sources' in after
+
+
+def test_arguments_offer_kwargs_first_and_no_block_keywords(server, project):
+    kwargs = labels(complete([kwargs_index('executable')], 'e', 100))
+    _, after = completion_at(server, project, "executable('t', 'a.c', e")
+    assert kwargs and after[:len(kwargs)] == kwargs
+    assert 'endif' not in after and 'else' not in after
+    _, after = completion_at(server, project, "executable('t', 'a.c', tr")
+    assert 'true' in after
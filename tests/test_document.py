@@ -0,0 +1,109 @@
+import random
+
+import pytest
+
+from mlsp.document import Document, utf16_length, utf16_to_index
+
+
+def span(start_line, start_character, end_line, end_character, text) -> dict:
+    return dict(range=dict(start=dict(line=start_line, character=start_character),
+                           end=dict(line=end_line, character=end_character)), text=text)
+
+
+def edited(text: str, *changes: dict) -> str:
+    document = Document('file:///meson.build', text)
+    for change in changes:
+        document.update(change)
+    return document.contents
+
+
+def test_edit_across_lines():
+    assert edited('one\ntwo\nthree\n', span(0, 1, 2, 2, 'X\nY')) == 'oX\nYree\n'
+
+
+def test_joining_lines():
+    assert edited('one\ntwo\n', span(0, 3, 1, 0, ' ')) == 'one two\n'
+
+
+def test_edit_past_the_end():
+    assert edited('one\ntwo', span(1, 3, 5, 0, '!')) == 'one\ntwo!'
+
+
+def test_successive_edits():
+    assert edited('a\nb\n', span(1, 1, 1, 1, 'c'), span(0, 0, 1, 0, ''), span(1, 0, 1, 0, 'd')) == 'bc\nd'
+
+
+def test_full_replacement():
+    document = Document('file:///meson.build', 'old')
+    document.update(dict(text='new\ntext'))
+    assert document.contents == 'new\ntext'
+    assert document.version == 1
+
+
+def test_crlf_line_ends_before_carriage_return():
+    document = Document('file:///meson.build', 'ab\r\ncd\r\n')
+    assert document.line_span(0) == (0, 2)
+    # Columns past the end of a line stop before its terminator
+    assert document.get_position_character_count(0, 10) == 2
+    assert document.get_position_character_count(1, 1) == 5
+    assert document.get_char_count_position(5) == (1, 1)
+
+
+def test_crlf_edits():
+    assert edited('ab\r\ncd\r\n', span(0, 2, 1, 0, '')) == 'abcd\r\n'
+    assert edited('ab\r\ncd\r\n', span(0, 2, 0, 2, '\r\nxy')) == 'ab\r\nxy\r\ncd\r\n'
+
+
+def test_lone_carriage_return_is_not_a_line_end():
+    document = Document('file:///meson.build', 'a\rb\nc')
+    assert document.line_span(0) == (0, 3)
+    assert document.get_position_character_count(0, 2) == 2
+    assert document.get_position_character_count(1, 0) == 4
+    assert edited('a\rb\nc', span(0, 1, 0, 2, '')) == 'ab\nc'
+
+
+def test_utf16_columns_of_astral_characters():
+    # '😀' is one character, but two UTF-16 code units
+    assert utf16_length('a😀b') == 4
+    assert utf16_to_index('a😀b', 3) == 2
+    document = Document('file:///meson.build', "x = '😀😀'\ny = 1\n")
+    assert document.get_position_character_count(0, 7) == 6
+    assert document.get_char_count_position(7) == (0, 9)
+    assert edited("x = '😀😀'\n", span(0, 5, 0, 7, '')) == "x = '😀'\n"
+    assert edited('é😀b', span(0, 3, 0, 3, 'X')) == 'é😀Xb'
+
+
+def position_of(text: str, offset: int) -> dict:
+    """LSP position of an offset, computed on the whole string."""
+    line = text.count('\n', 0, offset)
+    line_start = text.rfind('\n', 0, offset) + 1
+    return dict(line=line, character=utf16_length(text[line_start:offset]))
+
+
+def boundary(text: str, offset: int) -> int:
+    """Moves an offset between a '\\r' and the '\\n' after it in front of both, where positions can point."""
+    if 0 < offset < len(text) and text[offset - 1] == '\r' and text[offset] == '\n':
+        return offset - 1
+    return offset
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_random_edits_match_string(seed):
+    rng = random.Random(seed)
+    alphabet = 'ab =\n\r😀é'
+    model = ''.join(rng.choice(alphabet) for _ in range(3000))
+    document = Document('file:///meson.build', model)
+    for version in range(1, 301):
+        start = boundary(model, rng.randint(0, len(model)))
+        end = boundary(model, rng.randint(start, min(start + 80, len(model))))
+        text = ''.join(rng.choice(alphabet) for _ in range(rng.choice((0, 1, 2, 20))))
+        start_position, end_position = position_of(model, start), position_of(model, end)
+        assert document.get_char_count_position(start) == (start_position['line'], start_position['character'])
+        document.update(dict(range=dict(start=start_position, end=end_position), text=text))
+        model = model[:start] + text + model[end:]
+        assert document.version == version
+        assert len(document.rope) == len(model)
+        if version % 25 == 0:
+            assert document.contents == model
+    assert document.contents == model
+    assert document.lines == model.splitlines(True)
@@ -0,0 +1,56 @@
+import pickle
+
+import pytest
+
+from mlsp import index
+from mlsp.cache import parse_code
+from mlsp.fs import FileSystem
+from mlsp.index import WorkspaceIndex
+
+CODE = "project('p', 'c')\nsources = ['main.c']\nsubdir('sub')\n"
+
+
+@pytest.fixture
+def saved(tmp_path):
+    """Cache directory holding the index of a one-file workspace."""
+    build_file = tmp_path / 'project' / 'meson.build'
+    build_file.parent.mkdir()
+    build_file.write_text(CODE)
+    workspace_index = WorkspaceIndex(build_file.parent.as_uri(), tmp_path / 'cache')
+    workspace_index.record(str(build_file), FileSystem().stat(str(build_file)), CODE,
+                           parse_code(str(build_file), CODE, ''))
+    workspace_index.save()
+    return build_file
+
+
+def reloaded(build_file) -> WorkspaceIndex:
+    workspace_index = WorkspaceIndex(build_file.parent.as_uri(), build_file.parent.parent / 'cache')
+    workspace_index.load()
+    return workspace_index
+
+
+def test_round_trip(saved):
+    entry = reloaded(saved).lookup(str(saved), FileSystem().stat(str(saved)))
+    assert entry is not None
+    assert [name for name, line, column in entry.assignments] == ['sources']
+    assert entry.subdirs == ['sub']
+    assert len(entry.codeblock().lines) == 3
+
+
+@pytest.mark.parametrize('header', [
+    (index.FORMAT_VERSION, '0.0.1', index.HEADER[2]),
+    (index.FORMAT_VERSION, index.HEADER[1], (2, 7)),
+    (index.FORMAT_VERSION - 1, index.HEADER[1], index.HEADER[2]),
+])
+def test_other_versions_are_discarded(saved, monkeypatch, header):
+    monkeypatch.setattr(index, 'HEADER', header)
+    assert not reloaded(saved).load()
+    assert reloaded(saved).entries == dict()
+
+
+def test_entries_of_other_versions_are_not_loaded(saved):
+    workspace_index = reloaded(saved)
+    with workspace_index.path.open('wb') as f:
+        pickle.dump((index.FORMAT_VERSION, '0.0.1', index.HEADER[2]), f)
+        f.write(b'entries that no longer unpickle')
+    assert not reloaded(saved).load()
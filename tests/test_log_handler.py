@@ -0,0 +1,125 @@
+import contextvars
+import logging
+import threading
+
+import pytest
+
+from mlsp import setup_arguments, setup_logging
+from mlsp.log_handler import LanguageServerLoggingHandler, current_server
+from mlsp.scheduler import AnalysisScheduler
+
+
+class RecordingEndpoint:
+    def __init__(self):
+        self.messages = []
+
+    def notify(self, method, params=None):
+        self.messages.append(params['message'])
+
+
+@pytest.fixture
+def handlers():
+    """Handlers of two clients sharing the process, each forwarding only what is logged for its own server."""
+    owners = [object(), object()]
+    handlers = [LanguageServerLoggingHandler(RecordingEndpoint(), interval=60, owner=owner) for owner in owners]
+    logger = logging.getLogger('mlsp.test')
+    logger.setLevel(logging.INFO)
+    for handler in handlers:
+        logger.addHandler(handler)
+    yield logger, owners, handlers
+    for handler in handlers:
+        logger.removeHandler(handler)
+        handler.close()
+
+
+def forwarded(handler: LanguageServerLoggingHandler):
+    handler.flush()
+    return handler.endpoint.messages
+
+
+def on_behalf_of(owner, function, *args):
+    context = contextvars.copy_context()
+    context.run(current_server.set, owner)
+    return context.run(function, *args)
+
+
+def test_records_reach_their_client_only(handlers):
+    logger, owners, (first, second) = handlers
+    on_behalf_of(owners[0], logger.info, 'first')
+    on_behalf_of(owners[1], logger.info, 'second')
+    logger.info('neither')
+    assert forwarded(first) == ['first']
+    assert forwarded(second) == ['second']
+
+
+def test_records_of_builds_reach_their_client(handlers):
+    logger, owners, (first, second) = handlers
+    scheduler = AnalysisScheduler(lambda cancelled: logger.info('built on %s', threading.current_thread().name), 0)
+    try:
+        on_behalf_of(owners[1], scheduler.schedule)
+        assert scheduler.wait(10)
+    finally:
+        scheduler.shutdown()
+    assert forwarded(first) == []
+    assert [message.startswith('built on analysis') for message in forwarded(second)] == [True]
+
+
+def test_failed_builds_reach_their_client(handlers):
+    _, owners, (first, second) = handlers
+    scheduler_logger = logging.getLogger('mlsp.scheduler')
+    for handler in (first, second):
+        scheduler_logger.addHandler(handler)
+
+    def build():  # Missing the `cancelled` argument
+        pass
+
+    scheduler = AnalysisScheduler(build, 0)
+    try:
+        on_behalf_of(owners[0], scheduler.schedule)
+        assert scheduler.wait(10)
+        # Logged once the future is done, right after the scheduler is idle
+        for _ in range(100):
+            if forwarded(first):
+                break
+            threading.Event().wait(.01)
+    finally:
+        scheduler.shutdown()
+        for handler in (first, second):
+            scheduler_logger.removeHandler(handler)
+    # Errors are shown to the user as well as logged
+    messages = forwarded(first)
+    assert len(messages) == 2 and all('Build failed' in message and 'TypeError' in message for message in messages)
+    assert forwarded(second) == []
+
+
+def test_without_owner_everything_is_forwarded():
+    handler = LanguageServerLoggingHandler(RecordingEndpoint(), interval=60)
+    handler.setLevel(logging.INFO)
+    try:
+        for owner in (object(), None):
+            on_behalf_of(owner, handler.handle, logging.makeLogRecord(dict(msg='record', levelno=logging.INFO)))
+        # Sent as one batch
+        assert forwarded(handler) == ['record\nrecord']
+    finally:
+        handler.close()
+
+
+@pytest.fixture
+def root_logger():
+    logger = logging.getLogger()
+    level, handlers = logger.level, list(logger.handlers)
+    yield logger
+    logger.setLevel(level)
+    logger.handlers[:] = handlers
+
+
+@pytest.mark.parametrize('args, root_level, stderr_level', [
+    ([], logging.INFO, logging.WARNING),
+    (['--client-log-level', 'DEBUG'], logging.DEBUG, logging.WARNING),
+    (['--client-log-level', 'ERROR'], logging.WARNING, logging.WARNING),
+    (['--debug', '--client-log-level', 'ERROR'], logging.DEBUG, logging.DEBUG),
+])
+def test_root_level_lets_through_what_either_handler_wants(root_logger, args, root_level, stderr_level):
+    stderr = setup_logging(setup_arguments().parse_args(args))
+    assert root_logger.level == root_level
+    assert stderr.level == stderr_level
@@ -0,0 +1,85 @@
+from mesonbuild import mparser
+from mesonbuild.ast import AstVisitor
+
+from mlsp.cache import parse_code
+from mlsp.parser import ErrorNode, IncrementalParser, errors, mask, split_statements
+
+
+class IdCollector(AstVisitor):
+    def __init__(self):
+        super().__init__()
+        self.ids = []
+
+    def visit_default_func(self, node: mparser.BaseNode):
+        self.ids.append(node.ast_id)
+
+
+def assigned(codeblock: mparser.CodeBlockNode):
+    """Variables assigned by the top-level statements, with the line each one is on."""
+    return [(node.var_name, node.lineno) for node in codeblock.lines if isinstance(node, mparser.AssignmentNode)]
+
+
+def test_mask_keeps_positions():
+    code = "a = 'x # (' # ) comment\nb = '''[\n]'''\n"
+    masked = mask(code)
+    assert len(masked) == len(code)
+    assert [i for i, c in enumerate(masked) if c == '\n'] == [i for i, c in enumerate(code) if c == '\n']
+    assert '(' not in masked and '[' not in masked and '#' not in masked
+
+
+def test_split_statements():
+    code = "a = 1\nif a\n  b = [1,\n    2]\nendif\nc = foo(\nd = 'x'\n"
+    statements = [(line, text) for line, text in split_statements(code) if text]
+    # An assignment cannot be inside brackets, so the one left open ends before it
+    assert statements == [(0, 'a = 1\n'), (1, 'if a\n  b = [1,\n    2]\nendif\n'), (5, 'c = foo(\n'), (6, "d = 'x'\n")]
+
+
+def test_valid_file_has_no_errors():
+    codeblock = parse_code('meson.build', "a = 1\nif a\n  b = 2\nendif\n", '')
+    assert errors(codeblock) == []
+    assert assigned(codeblock) == [('a', 1)]
+
+
+def test_errors_only_lose_their_statement():
+    codeblock = parse_code('meson.build', "a = 1\nb = (\nc = 2\nd = 'it''s'\ne = 3\n", '')
+    found = errors(codeblock)
+    assert len(found) == 2
+    assert all(isinstance(error, ErrorNode) and error.message for error in found)
+    assert assigned(codeblock) == [('a', 1), ('c', 3), ('e', 5)]
+
+
+def test_unfinished_assignment_parses():
+    codeblock = parse_code('meson.build', "a = 1\nfoo = \nb = 2\n", '')
+    assert [name for name, _ in assigned(codeblock)] == ['a', 'foo', 'b']
+
+
+def test_unclosed_string_ends_with_its_line():
+    codeblock = parse_code('meson.build', "a = 'x\nb = 2\n", '')
+    assert len(errors(codeblock)) == 1
+    assert assigned(codeblock) == [('b', 2)]
+
+
+def test_edits_reuse_unchanged_runs():
+    parser = IncrementalParser('meson.build', '')
+    code = ''.join(f"v{i} = {i}\n" for i in range(40))
+    parser.parse(code)
+    parsed = parser.parsed
+    codeblock = parser.parse("x = 0\n" + code)
+    # Only the run holding the new statement is parsed, the others are moved down a line
+    assert parser.parsed - parsed == 1
+    assert parser.reused > 0
+    assert assigned(codeblock)[:2] == [('x', 1), ('v0', 2)]
+    assert assigned(codeblock)[-1] == ('v39', 41)
+    codeblock = parser.parse("x = (\n" + code)
+    assert isinstance(codeblock.lines[0], ErrorNode)
+    assert assigned(codeblock)[0] == ('v0', 2)
+    assert assigned(codeblock)[-1] == ('v39', 41)
+    collector = IdCollector()
+    codeblock.accept(collector)
+    assert len(set(collector.ids)) == len(collector.ids)
+
+
+def test_fixed_file_parses_whole():
+    parser = IncrementalParser('meson.build', '')
+    parser.parse("a = [\nb = 1\n")
+    assert errors(parser.parse("a = []\nb = 1\n")) == []
@@ -0,0 +1,51 @@
+from pathlib import Path
+
+import pytest
+
+from mlsp.server import MesonLanguageServer
+from tests.test_builds import TIMEOUT, end_of, insert
+
+
+@pytest.fixture
+def folders(tmp_path: Path):
+    """Two projects, opened as the folders of one workspace."""
+    found = []
+    for name in ('first', 'second'):
+        (tmp_path / name).mkdir()
+        (tmp_path / name / 'meson.build').write_text(f"project('{name}', 'c')\n{name}_sources = ['main.c']\n")
+        found.append(tmp_path / name)
+    return found
+
+
+@pytest.fixture
+def server(folders):
+    server = MesonLanguageServer()
+    server.m_initialize(rootUri=folders[0].as_uri(), capabilities={},
+                        workspaceFolders=[dict(uri=folder.as_uri(), name=folder.name) for folder in folders],
+                        initializationOptions=dict(analysisDebounce=100, cacheDirectory=None, jobs=1))
+    for workspace in server.roots.workspaces():
+        assert workspace.scheduler.wait(TIMEOUT)
+    yield server
+    server.close()
+
+
+def test_open_documents_move_when_their_folder_is_removed(server, folders):
+    path = folders[1] / 'meson.build'
+    uri = path.as_uri()
+    text = path.read_text()
+    server.m_text_document__did_open(dict(uri=uri, languageId='meson', version=1, text=text))
+    server.m_workspace__did_change_workspace_folders(dict(removed=[dict(uri=folders[1].as_uri(), name='second')]))
+    server.m_text_document__did_change(dict(uri=uri, version=2), [insert(end_of(text), 'x = 1\n')])
+    workspace = server.workspace_for(dict(uri=uri))
+    assert workspace.root_uri == folders[0].as_uri()
+    assert workspace.get_document(uri).contents == text + 'x = 1\n'
+    assert workspace.document_tokens(uri) is not None
+    assert list(server.roots.active) == [folders[0].as_uri()]
+
+
+def test_change_to_unopened_document_is_ignored(server, folders):
+    uri = (folders[0] / 'meson.build').as_uri()
+    server.m_text_document__did_change(dict(uri=uri, version=2), [insert(dict(line=0, character=0), 'x')])
+    workspace = server.workspace_for(dict(uri=uri))
+    assert workspace.get_document(uri) is None
+    assert workspace.document_tokens(uri) is None
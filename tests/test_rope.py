@@ -0,0 +1,86 @@
+import math
+import random
+
+import pytest
+
+from mlsp import rope
+from mlsp.rope import Rope
+
+
+@pytest.fixture(autouse=True)
+def small_leaves(monkeypatch):
+    # Small leaves give deep trees out of short texts
+    monkeypatch.setattr(rope, 'LEAF_SIZE', 8)
+
+
+def check_invariants(node: Rope):
+    """Checks the cached lengths, line counts and depths of every node, and that the tree is AVL-balanced."""
+    if node.text is not None:
+        assert (node.length, node.newlines, node.depth) == (len(node.text), node.text.count('\n'), 0)
+        return
+    check_invariants(node.left)
+    check_invariants(node.right)
+    assert node.length == node.left.length + node.right.length
+    assert node.newlines == node.left.newlines + node.right.newlines
+    assert node.depth == max(node.left.depth, node.right.depth) + 1
+    assert abs(node.left.depth - node.right.depth) <= 1
+
+
+def random_text(rng: random.Random, size: int) -> str:
+    return ''.join(rng.choice('ab \n\r😀é') for _ in range(size))
+
+
+def test_from_text():
+    text = 'line\n' * 50
+    tree = Rope.from_text(text)
+    check_invariants(tree)
+    assert str(tree) == text
+    assert len(tree) == len(text)
+    assert tree.newlines == 50
+
+
+def test_empty():
+    tree = Rope.from_text('')
+    assert str(tree) == ''
+    assert tree.line_start(0) == 0
+    assert tree.line_of(0) == 0
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_random_edits_match_string(seed):
+    rng = random.Random(seed)
+    model = random_text(rng, 200)
+    tree = Rope.from_text(model)
+    for _ in range(300):
+        start = rng.randint(0, len(model))
+        end = rng.randint(start, min(start + 40, len(model)))
+        text = random_text(rng, rng.choice((0, 1, 3, 30)))
+        old, previous = tree, model
+        tree = tree.replace(start, end, text)
+        model = model[:start] + text + model[end:]
+        check_invariants(tree)
+        assert str(tree) == model
+        assert len(tree) == len(model)
+        assert tree.newlines == model.count('\n')
+        # Edits leave the rope they were made on untouched
+        assert str(old) == previous
+    lines = model.split('\n')
+    offset = 0
+    for line, content in enumerate(lines):
+        assert tree.line_start(line) == offset
+        assert tree.line_of(offset) == line
+        offset += len(content) + 1
+    assert tree.line_start(len(lines)) == len(model)
+    for _ in range(50):
+        start = rng.randint(0, len(model))
+        end = rng.randint(start, len(model))
+        assert tree.slice(start, end) == model[start:end]
+
+
+def test_depth_is_logarithmic():
+    tree = Rope.from_text('')
+    for _ in range(2000):
+        tree = tree.replace(len(tree), len(tree), 'x' * 8)
+    check_invariants(tree)
+    # An AVL tree of n leaves is at most about 1.44 log2(n) deep
+    assert tree.depth <= 1.45 * math.log2(2000) + 2
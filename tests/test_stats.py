@@ -0,0 +1,36 @@
+import pytest
+
+from mlsp.server import MesonLanguageServer
+from mlsp.stats import STATS
+from tests.test_builds import TIMEOUT, end_of, insert, open_document, settle
+
+
+@pytest.fixture
+def stats(monkeypatch):
+    monkeypatch.setattr(STATS, 'enabled', True)
+    STATS.reset()
+    yield STATS
+    STATS.reset()
+
+
+def start(project, jobs: int) -> MesonLanguageServer:
+    server = MesonLanguageServer()
+    server.m_initialize(rootUri=project.as_uri(), capabilities={},
+                        initializationOptions=dict(analysisDebounce=100, cacheDirectory=None, jobs=jobs))
+    assert server.workspace.scheduler.wait(TIMEOUT)
+    return server
+
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_every_parsed_file_is_counted_once(stats, project, jobs):
+    server = start(project, jobs)
+    try:
+        assert stats.to_dict()['files_parsed'] == 2
+        path = project / 'sub' / 'meson.build'
+        uri = open_document(server, path)
+        server.m_text_document__did_change(dict(uri=uri, version=2), [insert(end_of(path.read_text()), 'x = 1\n')])
+        settle(server)
+        assert stats.to_dict()['files_parsed'] == 3
+        assert stats.to_dict()['last_files_parsed'] == 1
+    finally:
+        server.close()
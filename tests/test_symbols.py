@@ -0,0 +1,42 @@
+from pathlib import Path
+
+import pytest
+
+
+@pytest.fixture
+def project(tmp_path: Path) -> Path:
+    """A project assigning `x` before a `subdir()` call, in the subdir, and after the call."""
+    (tmp_path / 'meson.build').write_text("project('p', 'c')\nx = 1\nsubdir('sub')\ny = x\nx = 3\n")
+    (tmp_path / 'sub').mkdir()
+    (tmp_path / 'sub' / 'meson.build').write_text("z = x\nx = 2\n")
+    return tmp_path
+
+
+def locations(server, path: Path, line: int, character: int):
+    found = server.m_text_document__definition(dict(uri=path.as_uri()), dict(line=line, character=character))
+    return [(location['uri'], location['range']['start']['line'])
+            for location in found]
+
+
+def test_read_after_subdir_sees_its_definitions(server, project):
+    assert locations(server, project / 'meson.build', 3, 4) == [
+        ((project / 'meson.build').as_uri(), 1), ((project / 'sub' / 'meson.build').as_uri(), 1)]
+
+
+def test_read_in_subdir_sees_definitions_before_the_call_only(server, project):
+    assert locations(server, project / 'sub' / 'meson.build', 0, 4) == [((project / 'meson.build').as_uri(), 1)]
+
+
+def test_last_definition_before_a_position(server, project):
+    symbols = server.workspace.snapshot.symbols
+    root, sub = str(project / 'meson.build'), str(project / 'sub' / 'meson.build')
+    assert (symbols.defined_before('x', root, 2, 0).path, symbols.defined_before('x', root, 2, 0).line) == (root, 1)
+    assert (symbols.defined_before('x', root, 3, 4).path, symbols.defined_before('x', root, 3, 4).line) == (sub, 1)
+    assert (symbols.defined_before('x', root, 5, 0).path, symbols.defined_before('x', root, 5, 0).line) == (root, 4)
+
+
+def test_references_are_in_evaluation_order(server, project):
+    root, sub = (project / 'meson.build').as_uri(), (project / 'sub' / 'meson.build').as_uri()
+    found = server.m_text_document__references(dict(uri=root), dict(line=1, character=0))
+    assert [(location['uri'], location['range']['start']['line']) for location in found] == [
+        (root, 1), (sub, 0), (sub, 1), (root, 3), (root, 4)]
@@ -0,0 +1,84 @@
+from pathlib import Path
+
+import pytest
+
+from mlsp.server import MesonLanguageServer
+
+
+@pytest.fixture
+def project(tmp_path: Path) -> Path:
+    """A project calling a subproject."""
+    root = tmp_path / 'project'
+    (root / 'subprojects' / 'dep').mkdir(parents=True)
+    (root / 'meson.build').write_text("project('p', 'c')\nmain_sources = ['main.c']\ndep = subproject('dep')\n")
+    (root / 'subprojects' / 'dep' / 'meson.build').write_text("project('dep', 'c')\ndep_sources = ['dep.c']\n")
+    return root
+
+
+def start(project: Path, **options) -> MesonLanguageServer:
+    server = MesonLanguageServer()
+    server.m_initialize(rootUri=project.as_uri(), capabilities={}, initializationOptions=dict(
+        analysisDebounce=100, cacheDirectory=str(project.parent / 'cache'), jobs=1, **options))
+    assert server.workspace.scheduler.wait(30)
+    return server
+
+
+def names(server: MesonLanguageServer, query: str):
+    return sorted(symbol['name'] for symbol in server.m_workspace__symbol(query))
+
+
+def test_queries_do_not_load_subprojects(project):
+    server = start(project)
+    try:
+        assert names(server, 'sources') == ['main_sources']
+        assert server.workspace.scheduler.wait(30)
+        assert names(server, 'sources') == ['main_sources']
+        assert server.workspace.requested_subprojects == set()
+        assert list(server.workspace.snapshot.subprojects) == []
+    finally:
+        server.close()
+
+
+def test_subprojects_are_loaded_once_when_asked(project):
+    server = start(project, workspaceSymbolSubprojects=True)
+    try:
+        names(server, 'sources')
+        assert server.workspace.scheduler.wait(30)
+        assert names(server, 'sources') == ['dep_sources', 'main_sources']
+        generation = server.workspace.snapshot.generation
+        names(server, 'sources')
+        assert server.workspace.scheduler.wait(30)
+        assert server.workspace.snapshot.generation == generation
+    finally:
+        server.close()
+
+
+def test_subprojects_are_searched_in_the_index(project):
+    server = start(project, workspaceSymbolSubprojects=True)
+    try:
+        names(server, 'sources')
+        assert server.workspace.scheduler.wait(30)
+    finally:
+        server.close()
+    server = start(project)
+    try:
+        symbols = server.m_workspace__symbol('dep_')
+        assert [symbol['name'] for symbol in symbols] == ['dep_sources']
+        assert symbols[0]['location']['range']['start'] == dict(line=1, character=0)
+        assert symbols[0]['containerName'] == str(Path('subprojects', 'dep', 'meson.build'))
+        assert list(server.workspace.snapshot.subprojects) == []
+    finally:
+        server.close()
+
+
+def test_results_are_capped_by_their_own_limit(project):
+    server = start(project, workspaceSymbolLimit=1, completionLimit=10)
+    try:
+        assert len(server.m_workspace__symbol('')) == 1
+    finally:
+        server.close()
+    server = start(project, completionLimit=1)
+    try:
+        assert len(server.m_workspace__symbol('')) > 1
+    finally:
+        server.close()